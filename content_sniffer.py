@@ -0,0 +1,123 @@
+# Classifies a response body from its Content-Type header and its first few hundred
+# bytes, so non-html responses can be rejected without parsing the whole document.
+
+HTML = "html"
+TEXT = "text"
+DATA = "data"
+PDF = "pdf"
+ZIP = "zip"
+IMAGE = "image"
+BINARY = "binary"
+
+# Number of leading bytes inspected
+SNIFF_BYTES = 512
+
+# Leading bytes of common file formats. Checked before the header because servers
+# frequently label downloads as text/html.
+MAGIC_NUMBERS = [
+    (b"%PDF-", PDF),
+    (b"PK\x03\x04", ZIP),
+    (b"PK\x05\x06", ZIP),
+    (b"PK\x07\x08", ZIP),
+    (b"\x89PNG\r\n\x1a\n", IMAGE),
+    (b"GIF87a", IMAGE),
+    (b"GIF89a", IMAGE),
+    (b"\xff\xd8\xff", IMAGE),
+    (b"II*\x00", IMAGE),
+    (b"MM\x00*", IMAGE),
+    (b"\x00\x00\x01\x00", IMAGE),
+    (b"\x1f\x8b", BINARY),                  # gzip
+    (b"7z\xbc\xaf\x27\x1c", BINARY),
+    (b"Rar!\x1a\x07", BINARY),
+    (b"\x7fELF", BINARY),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", BINARY),  # legacy office documents
+]
+
+# Signatures short and printable enough to start a text page, only trusted when the
+# header does not say what the body is
+WEAK_MAGIC_NUMBERS = [
+    (b"BZh", BINARY),                       # bzip2
+    (b"MZ", BINARY),                        # windows executable
+]
+
+HTML_CONTENT_TYPES = {"text/html", "application/xhtml+xml"}
+PDF_CONTENT_TYPES = {"application/pdf", "application/x-pdf"}
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed", "application/x-zip"}
+TEXT_CONTENT_TYPES = {"text/plain"}
+DATA_CONTENT_TYPES = {"application/xml", "application/json", "application/javascript", "application/rss+xml", "application/atom+xml"}
+
+# Markup that starts an html document, checked in lower case after leading whitespace
+HTML_PREFIXES = (b"<!doctype html", b"<html", b"<head", b"<body", b"<!--", b"<?xml", b"<title", b"<meta", b"<div", b"<p", b"<a ")
+
+def _sniff_magic(prefix: bytes) -> str | None:
+    for magic, kind in MAGIC_NUMBERS:
+        if prefix.startswith(magic):
+            return kind
+    # RIFF container holding a WEBP image
+    if prefix.startswith(b"RIFF") and prefix[8:12] == b"WEBP":
+        return IMAGE
+    return None
+
+def _looks_binary(prefix: bytes) -> bool:
+    """
+    Text rarely contains NUL bytes or a large share of control characters
+    """
+    if b"\x00" in prefix:
+        return True
+    control = sum(1 for byte in prefix if byte < 32 and byte not in b"\t\n\r\f\x1b")
+    return control > len(prefix) // 10
+
+def sniff_content_kind(content_type: str, prefix: bytes) -> str:
+    """
+    Returns HTML, TEXT, DATA, PDF, ZIP, IMAGE or BINARY for a Content-Type header value
+    and the first bytes of the body. TEXT is plain prose, DATA is text meant for programs:
+    json, xml, scripts, stylesheets, ...
+    """
+    kind = _sniff_magic(prefix)
+    if kind:
+        return kind
+
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type in HTML_CONTENT_TYPES:
+        return HTML
+    if media_type in PDF_CONTENT_TYPES:
+        return PDF
+    if media_type in ZIP_CONTENT_TYPES:
+        return ZIP
+    if media_type.startswith("image/"):
+        return IMAGE
+    if media_type in TEXT_CONTENT_TYPES:
+        return TEXT
+    if media_type.startswith("text/") or media_type in DATA_CONTENT_TYPES or media_type.endswith("+xml"):
+        return DATA
+    if media_type and media_type != "application/octet-stream":
+        # audio, video, fonts, office documents, ...
+        return BINARY
+
+    # No usable header, decide from the bytes themselves
+    for magic, kind in WEAK_MAGIC_NUMBERS:
+        if prefix.startswith(magic):
+            return kind
+    if _looks_binary(prefix):
+        return BINARY
+    stripped = prefix.lstrip(b"\xef\xbb\xbf \t\r\n\f").lower()
+    if stripped.startswith(HTML_PREFIXES):
+        return HTML
+    return TEXT
+
+def body_prefix(content, size: int = SNIFF_BYTES) -> bytes:
+    """
+    Returns the first size bytes of a body without copying the rest of it
+    """
+    if content is None:
+        return b""
+    if isinstance(content, str):
+        return content[:size].encode("utf-8", errors="replace")
+    return bytes(memoryview(content)[:size])
+
+def classify_response(resp) -> str:
+    """
+    Classifies resp.raw_response from its Content-Type header and first SNIFF_BYTES bytes
+    """
+    content_type = resp.raw_response.headers.get("Content-Type", "") or ""
+    return sniff_content_kind(content_type, body_prefix(resp.raw_response.content))
@@ -1,6 +1,9 @@
+import utils.download
 from utils import get_logger
 from crawler.frontier import Frontier
 from crawler.worker import Worker
+import scraper
+import simhash
 
 class Crawler(object):
     def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker):
@@ -23,4 +26,19 @@ class Crawler(object):
 
     def join(self):
         for worker in self.workers:
-            worker.join()
\ No newline at end of file
+            worker.join()
+        self.logger.info(
+            f"Seen url filter: {self.frontier.seen_urls.stats()}, host health: {self.frontier.host_health.stats()}, "
+            f"cache server requests: {utils.download.client.stats()}, "
+            f"ingestion budget: {scraper.ingestion_budget.stats()}, "
+            f"token hash cache: {simhash.token_hash_cache_stats()}, "
+            f"url validation cache: {scraper.url_validator.stats()}")
+
+from crawler.sharded import ShardedCrawler
+from crawler.async_crawler import AsyncCrawler
+from crawler.pipeline import PipelineCrawler
+
+THREADS = "threads"
+ASYNCIO = "asyncio"
+PIPELINE = "pipeline"
+ENGINES = {THREADS, ASYNCIO, PIPELINE}
\ No newline at end of file
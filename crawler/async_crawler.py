@@ -0,0 +1,94 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+
+import utils.download
+from utils import get_logger
+from crawler.frontier import Frontier
+import scraper
+import simhash
+
+class AsyncCrawler(object):
+    """
+    Crawls from a single event loop instead of one thread per worker. Up to
+    config.async_fetches downloads from the cache server are awaited at once, while
+    scraping and frontier updates, which parse pages and write the save files, run
+    on a pool of config.threads_count threads.
+
+    The frontier's HostScheduler keeps the per-host politeness: urls are only taken
+    from hosts that may be fetched now, and the loop awaits the next ready host with
+    asyncio.sleep rather than blocking in time.sleep.
+    """
+
+    def __init__(self, config, restart, frontier_factory=Frontier):
+        self.config = config
+        self.logger = get_logger("CRAWLER")
+        self.frontier = frontier_factory(config, restart)
+        self.thread = None
+
+    async def crawl(self):
+        loop = asyncio.get_running_loop()
+        fetches = asyncio.Semaphore(self.config.async_fetches)
+        tasks: set[asyncio.Task] = set()
+
+        with ThreadPoolExecutor(self.config.threads_count) as executor:
+            while True:
+                await fetches.acquire()
+                # Validating a resumed url can fetch robots.txt
+                url = await loop.run_in_executor(executor, self.frontier.try_get_url)
+                if url is None:
+                    fetches.release()
+                    wait = self.frontier.seconds_until_ready()
+                    if wait is None and not tasks:
+                        break
+                    # Wake for the next ready host or for a page that may add urls
+                    if tasks:
+                        await asyncio.wait(tasks, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                    else:
+                        await asyncio.sleep(wait)
+                    continue
+
+                task = loop.create_task(self._crawl_url(url, executor))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                task.add_done_callback(lambda task: fetches.release())
+
+        self.logger.info(f"Frontier is empty. Stopping Crawler. Seen url filter: {self.frontier.seen_urls.stats()}, "
+                         f"host health: {self.frontier.host_health.stats()}, "
+                         f"cache server requests: {utils.download.client.stats()}, "
+                         f"cache server connections: {utils.download.async_pool().stats()}, "
+                         f"ingestion budget: {scraper.ingestion_budget.stats()}, "
+                         f"token hash cache: {simhash.token_hash_cache_stats()}, "
+                         f"url validation cache: {scraper.url_validator.stats()}")
+        utils.download.close_async_pool()
+
+    async def _crawl_url(self, url: str, executor: ThreadPoolExecutor) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            resp = await utils.download.download_async(url, self.config, self.logger)
+            self.logger.info(
+                f"Downloaded {url}, status <{resp.status}>, "
+                f"using cache {self.config.cache_server}.")
+            if self.frontier.retry_later(url, resp.status):
+                return
+            await loop.run_in_executor(executor, self._process, url, resp)
+        except Exception as e:
+            # The url stays pending in the save file and is retried when the crawl is resumed
+            self.logger.error(f"Failed to crawl {url}: {e}")
+            self.frontier.release_url(url)
+
+    def _process(self, url, resp) -> None:
+        scraped_urls = scraper.scraper(url, resp)
+        self.frontier.add_urls(scraped_urls, parent=url)
+        self.frontier.mark_url_complete(url)
+
+    def start_async(self):
+        self.thread = Thread(target=asyncio.run, args=(self.crawl(),), daemon=True)
+        self.thread.start()
+
+    def start(self):
+        asyncio.run(self.crawl())
+
+    def join(self):
+        if self.thread is not None:
+            self.thread.join()
@@ -1,34 +1,305 @@
-import os
-import shelve
-import re
+import time
+import heapq
 
-from threading import Thread, RLock
-from queue import Queue, Empty
+from threading import RLock, Condition, current_thread
+from urllib.parse import urlparse
 
-from utils import get_logger, get_urlhash, normalize
-from scraper import is_valid, seed_frontier_from_sitemap
+from utils import get_logger, canonicalize
+from utils.fingerprint import url_fingerprint
+from frontier_store import open_frontier_store, remove_frontier_store, detect_backend
+from seen_filter import SeenURLFilter
+from url_priority import URLScorer, parse_weights
+from spill_queue import SegmentedQueue
+from host_health import HostHealth, is_transient_failure
+from scraper import is_valid, seed_frontier_from_sitemap, sitemap_priorities
 
 
+# Orders of the urls of a host
+LIFO = "lifo"          # last discovered is crawled first
+PRIORITY = "priority"  # best URLScorer score is crawled first
+FRONTIER_ORDERS = {LIFO, PRIORITY}
+
+class HostScheduler(object):
+    """
+    Queue of urls to be downloaded that enforces politeness per host.
+
+    Every host has its own heap of urls and hosts wait in a min-heap ordered by the
+    earliest time they may be fetched again. Once that time passes a host moves to the
+    ready heap, ordered by the score of its best url plus a penalty for the pages already
+    fetched from it. pop() hands out the best url of the best ready host, so concurrent
+    workers fetch different hosts while each host sees at most one request per interval.
+
+    Without a scorer every url scores the same and each host hands out its urls last in,
+    first out. Push, pop and re-prioritization are O(log n).
+
+    With a spill queue at most max_resident urls are kept in the heaps. Urls appended
+    beyond that wait in the spill queue, mostly on disk, and are moved into the heaps
+    first in, first out as urls are popped. They gain no inlinks while spilled.
+    """
+
+    def __init__(self, politeness_delay: float, scorer: URLScorer = None,
+                 spill: SegmentedQueue = None, max_resident: int = 0):
+        self.politeness_delay = politeness_delay
+        self.scorer = scorer
+        self.spill = spill
+        self.max_resident = max_resident
+        self.host_queues: dict[str, list[list]] = dict()  # host -> heap of [score, -sequence, url] entries
+        self.entries: dict[str, list] = dict()            # queued url -> its live heap entry
+        self.inlinks: dict[str, int] = dict()             # queued url -> links to it found since it was queued
+        self.sitemap_priorities: dict[str, float] = dict()  # queued url -> its sitemap <priority>
+        self.next_fetch: dict[str, float] = dict()        # host -> earliest time.monotonic() of the next fetch
+        self.fetched: dict[str, int] = dict()             # host -> urls handed out
+        self.waiting_heap: list[tuple[float, str]] = []   # (next fetch time, host) of queued hosts not yet ready
+        self.ready_heap: list[tuple[float, str]] = []     # (host score, host) of hosts that may be fetched now
+        self.ready_scores: dict[str, float] = dict()      # ready host -> its current score, older heap entries are stale
+        self._lock = RLock()
+        self._sequence = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def stats(self) -> dict[str, int]:
+        """
+        Urls held in memory and urls spilled to disk
+        """
+        with self._lock:
+            spilled = self.spill.spilled if self.spill is not None else 0
+            return {"resident": self._count - spilled, "spilled": spilled}
+
+    def _spill_full(self) -> bool:
+        return self.spill is not None and len(self.entries) + len(self.spill) >= self.max_resident
+
+    def _refill(self) -> None:
+        """
+        Moves spilled urls into the heaps while there is room
+        """
+        while self.spill and len(self.entries) < self.max_resident:
+            url, _, priority = self.spill.popleft().partition("\t")
+            self._push_url(url, float(priority) if priority else None)
+
+    def _score(self, url: str) -> float:
+        if self.scorer is None:
+            return 0.0
+        return self.scorer.score(url, self.inlinks.get(url, 0), self.sitemap_priorities.get(url))
+
+    def _host_score(self, host: str) -> float:
+        best = self.host_queues[host][0][0]
+        if self.scorer is None:
+            return best
+        return best + self.scorer.host_score(self.fetched.get(host, 0))
+
+    def _push_entry(self, host: str, entry: list) -> None:
+        heapq.heappush(self.host_queues[host], entry)
+        self.entries[entry[2]] = entry
+        if host in self.ready_scores:
+            # A ready host whose best url improved moves up in the ready heap
+            self._drop_tombstones(host)
+            score = self._host_score(host)
+            if score < self.ready_scores[host]:
+                self.ready_scores[host] = score
+                heapq.heappush(self.ready_heap, (score, host))
+
+    def _push_url(self, url: str, sitemap_priority: float = None) -> None:
+        host = urlparse(url).netloc
+        if sitemap_priority is not None:
+            self.sitemap_priorities[url] = sitemap_priority
+        if host not in self.host_queues:
+            self.host_queues[host] = []
+            heapq.heappush(self.waiting_heap, (self.next_fetch.get(host, 0.0), host))
+        self._sequence += 1
+        self._push_entry(host, [self._score(url), -self._sequence, url])
+
+    def append(self, url: str, sitemap_priority: float = None) -> None:
+        with self._lock:
+            if url in self.entries:
+                return
+            if self._spill_full():
+                self.spill.append(url if sitemap_priority is None else f"{url}\t{sitemap_priority}")
+            else:
+                self._push_url(url, sitemap_priority)
+            self._count += 1
+
+    def extend(self, items: list[tuple[str, float]]) -> None:
+        """
+        Appends (url, sitemap priority) pairs under a single lock acquisition
+        """
+        with self._lock:
+            for url, sitemap_priority in items:
+                self.append(url, sitemap_priority)
+
+    def add_inlink(self, url: str) -> bool:
+        """
+        Counts another link to a queued url and re-prioritizes it, keeping its place
+        among urls of equal score. Returns False if url is not queued.
+        """
+        with self._lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                return False
+            self.inlinks[url] = self.inlinks.get(url, 0) + 1
+            score = self._score(url)
+            if score == entry[0]:
+                return True
+
+            # The old entry stays in the heap as a tombstone and is skipped when popped
+            entry[2] = None
+            self._push_entry(urlparse(url).netloc, [score, entry[1], url])
+            return True
+
+    def _pop_host_url(self, host: str) -> str:
+        queue = self.host_queues[host]
+        while True:
+            score, sequence, url = heapq.heappop(queue)
+            if url is not None:
+                del self.entries[url]
+                self.inlinks.pop(url, None)
+                self.sitemap_priorities.pop(url, None)
+                return url
+
+    def _drop_tombstones(self, host: str) -> None:
+        queue = self.host_queues[host]
+        while queue and queue[0][2] is None:
+            heapq.heappop(queue)
+
+    def defer(self, host: str, until: float) -> None:
+        """
+        Holds back the urls of host until time.monotonic() reaches until
+        """
+        with self._lock:
+            if until <= self.next_fetch.get(host, 0.0):
+                return
+            self.next_fetch[host] = until
+            if host in self.host_queues:
+                # A ready host's entry in the ready heap goes stale
+                self.ready_scores.pop(host, None)
+                heapq.heappush(self.waiting_heap, (until, host))
+
+    def _promote_ready(self, now: float) -> None:
+        """
+        Moves hosts whose next fetch time has passed from the waiting heap to the ready heap
+        """
+        self._refill()
+        while self.waiting_heap and self.waiting_heap[0][0] <= now:
+            ready_time, host = heapq.heappop(self.waiting_heap)
+            if host not in self.host_queues or host in self.ready_scores or self.next_fetch.get(host, 0.0) > now:
+                continue  # stale entry of a drained, already ready or deferred host
+            self._drop_tombstones(host)
+            self.ready_scores[host] = self._host_score(host)
+            heapq.heappush(self.ready_heap, (self.ready_scores[host], host))
+
+    def _pop_ready(self, now: float) -> str:
+        """
+        Returns the best url of the best ready host, or None if no host is ready
+        """
+        self._promote_ready(now)
+        while self.ready_heap:
+            score, host = heapq.heappop(self.ready_heap)
+            if self.ready_scores.get(host) != score:
+                continue  # stale entry of a host whose score changed
+            del self.ready_scores[host]
+
+            url = self._pop_host_url(host)
+            self._count -= 1
+            self.fetched[host] = self.fetched.get(host, 0) + 1
+            self.next_fetch[host] = now + self.politeness_delay
+
+            self._drop_tombstones(host)
+            if self.host_queues[host]:
+                heapq.heappush(self.waiting_heap, (self.next_fetch[host], host))
+            else:
+                del self.host_queues[host]
+            return url
+        return None
+
+    def pop(self) -> str:
+        """
+        Returns the best url whose host may be fetched now, sleeping until the earliest
+        host is ready if necessary. Raises IndexError if no urls are queued.
+        """
+        while True:
+            with self._lock:
+                if not self._count:
+                    raise IndexError("pop from empty HostScheduler")
+                now = time.monotonic()
+                url = self._pop_ready(now)
+                if url is not None:
+                    return url
+                wait = self.waiting_heap[0][0] - now
+
+            # Sleep without holding the lock so other workers can take urls of ready hosts
+            time.sleep(wait)
+
+    def pop_ready(self) -> str:
+        """
+        Non-blocking pop, returns None if no url is queued or no host may be fetched now
+        """
+        with self._lock:
+            if not self._count:
+                return None
+            return self._pop_ready(time.monotonic())
+
+    def seconds_until_ready(self) -> float:
+        """
+        Seconds until some host may be fetched, 0 if one may be now, None if no urls are queued
+        """
+        with self._lock:
+            if not self._count:
+                return None
+            now = time.monotonic()
+            self._promote_ready(now)
+            if self.ready_scores:
+                return 0.0
+            return max(0.0, self.waiting_heap[0][0] - now)
+
 class Frontier(object):
     def __init__(self, config, restart):
         self.logger = get_logger("FRONTIER")
         self.config = config
-        self.to_be_downloaded = list()
+        self.to_be_downloaded = HostScheduler(
+            self.config.time_delay, self._make_scorer(), self._make_spill_queue(), self.config.max_resident_urls)
+
+        # Guards the save file and the in-flight bookkeeping. Waiters on url_available
+        # are woken when urls are added or a peer finishes a url.
+        self.lock = RLock()
+        self.url_available = Condition(self.lock)
+        # thread ident, or url if taken with try_get_url -> (thread, url being crawled, its depth, its fingerprint)
+        self.in_flight: dict = dict()
+        self._dispatching = 0  # urls popped from the queue but not yet recorded as in flight
 
-        # Resumes or Restarts based on args and existing save file
-        if not os.path.exists(self.config.save_file) and not restart:
+        # Retries urls whose download failed transiently and parks hosts that keep failing
+        self.host_health = HostHealth(
+            self.config.max_retries, self.config.retry_delay,
+            self.config.breaker_failures, self.config.breaker_cooldown)
+
+        # Resumes or Restarts based on args and existing save file.
+        # A shelve may be stored in files next to save_file rather than in save_file itself.
+        save_exists = detect_backend(self.config.save_file) is not None
+        if not save_exists and not restart:
             # Save file does not exist, but request to load save.
             self.logger.info(
                 f"Did not find save file {self.config.save_file}, "
                 f"starting from seed.")
-        elif os.path.exists(self.config.save_file) and restart:
-            # Save file does exists, but request to start from seed.
-            self.logger.info(
-                f"Found save file {self.config.save_file}, deleting it.")
-            os.remove(self.config.save_file)
+        elif restart:
+            # Request to start from seed, whatever is left of an earlier crawl is deleted
+            if save_exists:
+                self.logger.info(
+                    f"Found save file {self.config.save_file}, deleting it.")
+            remove_frontier_store(self.config.save_file)
 
         # Load existing save file, or create one if it does not exist.
-        self.save = shelve.open(self.config.save_file)
+        self.save = open_frontier_store(self.config.save_file, self.config.frontier_backend)
+
+        # Save files keyed by sha256 url hashes are re-keyed by url fingerprint once
+        self.save.upgrade_legacy_keys()
+
+        # Fingerprints of urls queued from the save file on resume, validated when they are dispatched
+        self.unvalidated: set[int] = set()
+
+        # Answers most "was this url seen before" checks without a lookup in the save file
+        self.seen_urls = SeenURLFilter(self.config.seen_filter, self.config.seen_filter_error)
+        self.seen_urls.update(self.save.keys())
+        self.logger.info(f"Loaded {len(self.seen_urls)} url fingerprints into the {self.seen_urls.kind} seen url filter.")
         
         if restart:
             # Start from seed urls
@@ -40,49 +311,300 @@ class Frontier(object):
                 sitemap_urls = seed_frontier_from_sitemap(seed_url, self.config, self.logger)
                 for site_url in sitemap_urls:
                     self.add_url(site_url)
+            self.save.sync()
 
         else:
             # Set the frontier state with contents of save file.
             self._parse_save_file()
-            if not self.save:
+            if not len(self.seen_urls):
                 for url in self.config.seed_urls:
                     self.add_url(url)
+                self.save.sync()
+
+    def _make_scorer(self):
+        """
+        URLScorer for best-first order, or None to crawl each host last in, first out
+        """
+        if self.config.frontier_order not in FRONTIER_ORDERS:
+            raise ValueError(f"Unknown frontier order {self.config.frontier_order}, expected one of {sorted(FRONTIER_ORDERS)}")
+        if self.config.frontier_order == LIFO:
+            return None
+        return URLScorer(parse_weights(self.config.priority_weights) or None)
+
+    def _make_spill_queue(self):
+        """
+        Queue that spills pending urls beyond max_resident_urls to disk, None to keep all in memory
+        """
+        if self.config.max_resident_urls <= 0:
+            return None
+        return SegmentedQueue(self.config.save_file + ".spill", compress=self.config.spill_compress)
 
     def _parse_save_file(self):
         ''' This function can be overridden for alternate saving techniques. '''
-        total_count = len(self.save)
+        start = time.perf_counter()
+        # The seen url filter was just loaded from every key, so it already holds the total
+        total_count = len(self.seen_urls)
         tbd_count = 0
-        for url, completed in self.save.values():
-            if not completed and is_valid(url):
-                self.to_be_downloaded.append(url)
-                tbd_count += 1
+        queued = set()
+        for saved_fingerprint, url in self.save.pending():
+            # Entries saved before canonicalization may be duplicates of each other
+            # or of a page that has since been downloaded under its canonical url
+            url = canonicalize(url)
+            fingerprint = url_fingerprint(url, canonical=True)
+            if fingerprint in queued:
+                continue
+            if fingerprint != saved_fingerprint:
+                if fingerprint in self.save:
+                    if self.save[fingerprint][1]:
+                        continue
+                else:
+                    self.save[fingerprint] = (url, False)
+                    self.seen_urls.add(fingerprint)
+
+            # Validation can fetch robots.txt, so it waits until the url is dispatched
+            self.to_be_downloaded.append(url, sitemap_priorities.get(url))
+            self.unvalidated.add(fingerprint)
+            queued.add(fingerprint)
+            tbd_count += 1
+        self.save.sync()
         self.logger.info(
             f"Found {tbd_count} urls to be downloaded from {total_count} "
-            f"total urls discovered.")
+            f"total urls discovered, resumed in {time.perf_counter() - start:.3f}s.")
 
-    def get_tbd_url(self):
-        try:
-            self.logger.info(f"Uncrawled URLS: {len(self.to_be_downloaded)}.")
+    def in_flight_count(self) -> int:
+        with self.lock:
+            return len(self.in_flight) + self._dispatching
 
-            return self.to_be_downloaded.pop()
-        except IndexError:
-            return None
+    def _peers_in_flight(self, thread) -> bool:
+        """
+        True if a url is being crawled by a live thread other than thread, i.e. more urls may still be added
+        """
+        if self._dispatching:
+            return True
+        return any(
+            ident != thread.ident and owner.is_alive()
+            for ident, (owner, url, depth, fingerprint) in self.in_flight.items())
 
-    def add_url(self, url):
-        url = normalize(url)
-        urlhash = get_urlhash(url)
-               
-        if urlhash not in self.save:
-            self.save[urlhash] = (url, False)
+    def get_tbd_url(self, timeout: float = None):
+        """
+        Returns the next url to crawl, blocking while the queue is empty but other
+        workers are still crawling urls that may add more, and sleeping until the
+        host of a queued url may politely be fetched. Returns None once the queue is
+        empty and no urls are in flight, or when timeout seconds pass.
+
+        Calling it again means the calling thread is done with its previous url.
+        """
+        thread = current_thread()
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            with self.lock:
+                self.in_flight.pop(thread.ident, None)
+
+                while not len(self.to_be_downloaded):
+                    if not self._peers_in_flight(thread):
+                        return None
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return None
+                    self.url_available.wait(remaining)
+
+                url = self.to_be_downloaded.pop_ready()
+                if url is None:
+                    # Every queued host was fetched too recently or is parked
+                    wait = self.to_be_downloaded.seconds_until_ready() or 0.0
+                else:
+                    queue_stats = self.to_be_downloaded.stats()
+                    self.logger.info(
+                        f"Uncrawled URLS: {len(self.to_be_downloaded)} ({queue_stats['resident']} in memory, "
+                        f"{queue_stats['spilled']} spilled to disk), in flight: {len(self.in_flight)}.")
+                    self._dispatching += 1
+
+            if url is None:
+                # Sleeps without the lock and without counting as dispatching, then checks the queue again.
+                # The queue stays non-empty meanwhile, so no peer mistakes the crawl for finished.
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    wait = min(wait, remaining)
+                time.sleep(wait)
+                continue
+
+            fingerprint = url_fingerprint(url, canonical=True)
+            if not self._validate_resumed(url, fingerprint):
+                url = None
+
+            with self.lock:
+                self._dispatching -= 1
+                if url is not None:
+                    self.in_flight[thread.ident] = (thread, url, self.save.depth(fingerprint), fingerprint)
+                    return url
+                self.url_available.notify_all()
+
+    def try_get_url(self):
+        """
+        Non-blocking get_tbd_url for callers crawling many urls from one thread, like
+        the asyncio crawler. Returns the best url whose host may be fetched now, or None
+        if no such url is queued. The url is in flight until it is passed to
+        mark_url_complete or release_url, or queued again by retry_later.
+        """
+        while True:
+            with self.lock:
+                url = self.to_be_downloaded.pop_ready()
+                if url is None:
+                    return None
+                self._dispatching += 1
+
+            # Validating a resumed url can fetch robots.txt, so it happens outside the lock
+            fingerprint = url_fingerprint(url, canonical=True)
+            valid = self._validate_resumed(url, fingerprint)
+
+            with self.lock:
+                self._dispatching -= 1
+                if valid:
+                    self.in_flight[url] = (current_thread(), url, self.save.depth(fingerprint), fingerprint)
+                    return url
+                self.url_available.notify_all()
+
+    def release_url(self, url: str) -> None:
+        """
+        Gives up on a url taken with try_get_url without completing it, it stays
+        pending in the save file and is crawled again when the crawl is resumed
+        """
+        with self.lock:
+            if self.in_flight.pop(url, None) is not None:
+                self.url_available.notify_all()
+
+    def seconds_until_ready(self) -> float:
+        """
+        Seconds until try_get_url may return a url, None if no urls are queued
+        """
+        return self.to_be_downloaded.seconds_until_ready()
+
+    def _validate_resumed(self, url: str, fingerprint: int) -> bool:
+        """
+        Checks a url queued from the save file with is_valid the first time it is dispatched
+        """
+        with self.lock:
+            if fingerprint not in self.unvalidated:
+                return True
+            self.unvalidated.discard(fingerprint)
+
+        if is_valid(url):
+            return True
+        self.logger.info(f"Skipping resumed url {url}, it is no longer valid.")
+        with self.lock:
+            # Done with rather than pending, so the next resume does not queue it again
+            self.save[fingerprint] = (url, True)
             self.save.sync()
-            self.to_be_downloaded.append(url)
+        return False
+
+    def retry_later(self, url: str, status: int) -> bool:
+        """
+        Records the status of the download of url with the host health tracker. Returns
+        True if the download failed transiently and url was queued again to be retried
+        after a backoff, in which case the caller must not complete it.
+        """
+        host = urlparse(url).netloc
+        if not is_transient_failure(status):
+            self.host_health.record_success(host, url)
+            return False
+
+        retry, hold, opened = self.host_health.record_failure(host, url)
+        if opened:
+            self.logger.warning(f"Host {host} keeps failing, parking its urls for {hold:.0f}s.")
+        with self.lock:
+            if hold:
+                self.to_be_downloaded.defer(host, time.monotonic() + hold)
+            if not retry:
+                self.logger.warning(f"Giving up on {url} after status <{status}>.")
+                return False
+            # A url taken with try_get_url is queued instead of in flight
+            self.in_flight.pop(url, None)
+            self.to_be_downloaded.append(url, sitemap_priorities.get(url))
+            self.logger.info(f"Retrying {url} after status <{status}>, its host is held back {hold:.1f}s.")
+            self.url_available.notify()
+            return True
+
+    def add_url(self, url):
+        """
+        Queues url if it was never seen before. Urls added while a worker crawls a page are
+        one level deeper than that page, and are committed together with it by mark_url_complete.
+        """
+        self.add_urls([url])
+
+    def add_urls(self, urls, parent: str = None) -> int:
+        """
+        Queues the urls that were never seen before and returns how many there were.
+        They are one level deeper than parent, by default the page the calling worker
+        is crawling, and are committed together with it by mark_url_complete.
+
+        Canonicalizing and fingerprinting happen before the lock is taken, then the
+        batch is checked against the seen url filter, saved and queued in one pass each.
+        """
+        batch: dict[int, str] = dict()
+        for url in urls:
+            url = canonicalize(url)
+            batch.setdefault(url_fingerprint(url, canonical=True), url)
+        if not batch:
+            return 0
+
+        with self.lock:
+            new_fingerprints = self.seen_urls.unseen(list(batch), self.save)
+            new = set(new_fingerprints)
+
+            # Another link to a url that may still be queued raises its priority
+            for fingerprint, url in batch.items():
+                if fingerprint not in new:
+                    self.to_be_downloaded.add_inlink(url)
+            if not new_fingerprints:
+                return 0
+
+            depth = self._depth_below(parent)
+            self.seen_urls.update(new_fingerprints)
+            self.save.add_many([(fingerprint, batch[fingerprint], depth) for fingerprint in new_fingerprints])
+            self.to_be_downloaded.extend(
+                [(batch[fingerprint], sitemap_priorities.get(batch[fingerprint])) for fingerprint in new_fingerprints])
+            self.url_available.notify(len(new_fingerprints))
+            return len(new_fingerprints)
+
+    def _depth_below(self, parent: str = None) -> int:
+        """
+        Depth of urls found on parent, or on the page the calling worker is crawling
+        """
+        in_flight = self.in_flight.get(current_thread().ident)
+        if parent is None:
+            return in_flight[2] + 1 if in_flight else 0
+        if in_flight is None or in_flight[1] != parent:
+            in_flight = self.in_flight.get(parent)
+        if in_flight is not None and in_flight[1] == parent:
+            return in_flight[2] + 1
+        return self.save.depth(url_fingerprint(parent)) + 1
     
     def mark_url_complete(self, url):
-        urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            # This should not happen.
-            self.logger.error(
-                f"Completed url {url}, but have not seen it before.")
+        with self.lock:
+            # Urls from get_tbd_url are in flight under the thread crawling them, from try_get_url under the url
+            key = current_thread().ident
+            in_flight = self.in_flight.get(key)
+            if in_flight is None or in_flight[1] != url:
+                key = url
+                in_flight = self.in_flight.get(key)
+            if in_flight is not None and in_flight[1] == url:
+                # The url came from the frontier, so it is saved and its fingerprint is known
+                fingerprint = in_flight[3]
+                del self.in_flight[key]
+            else:
+                fingerprint = url_fingerprint(url)
+                if fingerprint not in self.save:
+                    # This should not happen.
+                    self.logger.error(
+                        f"Completed url {url}, but have not seen it before.")
+                    self.seen_urls.add(fingerprint)
 
-        self.save[urlhash] = (url, True)
-        self.save.sync()
+            self.save[fingerprint] = (url, True)
+            # Commits the urls discovered on this page along with it
+            self.save.sync()
+
+            # Waiting workers may now be able to stop
+            self.url_available.notify_all()
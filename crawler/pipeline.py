@@ -0,0 +1,213 @@
+import time
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from queue import Queue
+from threading import Thread, Lock
+
+import utils.download
+from utils import get_logger
+from crawler.frontier import Frontier
+import scraper
+import simhash
+import page_analysis
+
+# Seconds a fetcher waits for a url before checking whether the crawl is done
+POLL_INTERVAL = 0.5
+
+# Counters of the token hash cache sent back from the parsing processes
+TOKEN_HASH_HITS = "token_hash_hits"
+TOKEN_HASH_MISSES = "token_hash_misses"
+
+class StageQueue(Queue):
+    """
+    Bounded queue between two pipeline stages. A full queue blocks the stage feeding
+    it, and the time spent blocked is recorded along with the deepest the queue got.
+    """
+
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize)
+        self.high_water = 0
+        self.blocked_seconds = 0.0
+        self._stats_lock = Lock()
+
+    def put(self, item, block=True, timeout=None):
+        start = time.perf_counter()
+        super().put(item, block, timeout)
+        waited = time.perf_counter() - start
+        with self._stats_lock:
+            self.blocked_seconds += waited
+            self.high_water = max(self.high_water, self.qsize())
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {"depth": self.qsize(), "high_water": self.high_water, "blocked_seconds": round(self.blocked_seconds, 3)}
+
+def _init_parser(config) -> None:
+    # Parsing processes are spawned, so they set up the scraper's module state themselves
+    simhash.configure_token_hasher(config.token_hasher, config.token_hash_cache_size)
+    page_analysis.configure_engine(config.page_parser)
+    scraper.configure_ingestion_budget(
+        config.max_page_bytes, config.skip_page_bytes, config.max_page_tokens, config.max_page_links)
+
+def _parse(url, resp) -> scraper.ParsedPage:
+    """
+    scraper.parse_response in a parsing process. The ingestion budget and token hash
+    cache only count within that process, so what parsing the page added to them is
+    sent back with it.
+    """
+    budget = Counter(scraper.ingestion_budget.stats())
+    token_hashes = simhash.token_hash_cache_stats()
+    parsed = scraper.parse_response(url, resp)
+    after = simhash.token_hash_cache_stats()
+
+    counters = Counter(scraper.ingestion_budget.stats())
+    counters.subtract(budget)
+    counters[TOKEN_HASH_HITS] = after["hits"] - token_hashes["hits"]
+    counters[TOKEN_HASH_MISSES] = after["misses"] - token_hashes["misses"]
+    parsed.counters = {reason: count for reason, count in counters.items() if count}
+    return parsed
+
+class PipelineCrawler(object):
+    """
+    Crawls in three stages joined by bounded queues, so downloads and parsing overlap:
+        fetch: config.threads_count threads take urls from the frontier and download them
+        parse: a pool of config.parse_processes processes runs scraper.parse_response
+        write: one thread applies each parsed page to the summary statistics,
+               the near-duplicate index and the frontier, in the order it was fetched
+    Each queue holds at most config.pipeline_queue_size pages, so a slow stage holds
+    back the stages feeding it.
+    """
+
+    def __init__(self, config, restart, frontier_factory=Frontier):
+        self.config = config
+        self.logger = get_logger("CRAWLER")
+        self.frontier = frontier_factory(config, restart)
+        self.responses = StageQueue(config.pipeline_queue_size)  # (url, response) waiting to be parsed
+        self.parsed = StageQueue(config.pipeline_queue_size)     # (url, future of its ParsedPage) waiting to be written
+        self.threads = list()
+        # Urls taken from the frontier whose pages are not yet written
+        self.pending = 0
+        # Counters of the parsing processes, added up by the writer
+        self.parse_counters = Counter()
+
+    def stats(self) -> dict:
+        """
+        Depth, high water mark and time the feeding stage was blocked of each stage queue
+        """
+        return {"responses": self.responses.stats(), "parsed": self.parsed.stats(), "pending": self.pending}
+
+    def parse_stats(self) -> dict:
+        """
+        Ingestion budget counts by reason and token hash cache hits and misses of every parsing process
+        """
+        budget = dict(self.parse_counters)
+        hits, misses = budget.pop(TOKEN_HASH_HITS, 0), budget.pop(TOKEN_HASH_MISSES, 0)
+        return {
+            "ingestion_budget": budget,
+            "token_hash_cache": {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else 0.0},
+        }
+
+    def _crawl_done(self) -> bool:
+        # Under the frontier lock a url is always queued, in flight or pending in the pipeline
+        with self.frontier.lock:
+            return not self.pending and not self.frontier.in_flight_count() and not len(self.frontier.to_be_downloaded)
+
+    def _fetch(self, fetcher_id: int) -> None:
+        logger = get_logger(f"Fetcher-{fetcher_id}", "Worker")
+        while True:
+            url = self.frontier.get_tbd_url(timeout=POLL_INTERVAL)
+            if url is None:
+                if self._crawl_done():
+                    logger.info("Frontier is empty. Stopping fetcher.")
+                    return
+                with self.frontier.lock:
+                    # The frontier only knows about urls being downloaded, pages still being parsed or
+                    # written may add more. The writer notifies once it has applied each of them.
+                    if self.pending and not len(self.frontier.to_be_downloaded):
+                        self.frontier.url_available.wait(POLL_INTERVAL)
+                continue
+            with self.frontier.lock:
+                self.pending += 1
+            try:
+                resp = utils.download.download(url, self.config, logger)
+            except Exception as e:
+                # The url stays pending in the save file and is retried when the crawl is resumed
+                logger.error(f"Failed to download {url}: {e}")
+                with self.frontier.lock:
+                    self.pending -= 1
+                    self.frontier.url_available.notify_all()
+                continue
+            logger.info(
+                f"Downloaded {url}, status <{resp.status}>, "
+                f"using cache {self.config.cache_server}.")
+            if self.frontier.retry_later(url, resp.status):
+                # Requeued before it stops counting as pending, so the crawl can not look done in between
+                with self.frontier.lock:
+                    self.pending -= 1
+                continue
+            self.responses.put((url, resp))
+
+    def _dispatch(self, executor: ProcessPoolExecutor) -> None:
+        while True:
+            item = self.responses.get()
+            if item is None:
+                self.parsed.put(None)
+                return
+            url, resp = item
+            self.parsed.put((url, executor.submit(_parse, url, resp)))
+
+    def _write(self) -> None:
+        while True:
+            item = self.parsed.get()
+            if item is None:
+                return
+            url, future = item
+            try:
+                parsed = future.result()
+                self.parse_counters.update(parsed.counters)
+                scraped_urls = scraper.apply_parsed_page(url, parsed)
+                self.frontier.add_urls(scraped_urls, parent=url)
+                self.frontier.mark_url_complete(url)
+            except Exception as e:
+                # The url stays pending in the save file and is retried when the crawl is resumed
+                self.logger.error(f"Failed to process {url}: {e}")
+            finally:
+                with self.frontier.lock:
+                    self.pending -= 1
+                    # Fetchers waiting on an empty frontier re-check whether the crawl is done
+                    self.frontier.url_available.notify_all()
+            self.logger.info(f"Pipeline stages: {self.stats()}")
+
+    def _run(self) -> None:
+        # Spawned rather than forked, a forked process could inherit a lock held by a fetcher thread
+        with ProcessPoolExecutor(
+                self.config.parse_processes, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_parser, initargs=(self.config,)) as executor:
+            fetchers = [Thread(target=self._fetch, args=(fetcher_id,), daemon=True)
+                        for fetcher_id in range(self.config.threads_count)]
+            dispatcher = Thread(target=self._dispatch, args=(executor,), daemon=True)
+            writer = Thread(target=self._write, daemon=True)
+            for thread in fetchers + [dispatcher, writer]:
+                thread.start()
+
+            for fetcher in fetchers:
+                fetcher.join()
+            self.responses.put(None)
+            dispatcher.join()
+            writer.join()
+        self.logger.info(
+            f"Pipeline finished: {self.stats()}, seen url filter: {self.frontier.seen_urls.stats()}, "
+            f"host health: {self.frontier.host_health.stats()}, cache server requests: {utils.download.client.stats()}, "
+            f"parsing: {self.parse_stats()}, url validation cache: {scraper.url_validator.stats()}")
+
+    def start_async(self):
+        self.threads = [Thread(target=self._run, daemon=True)]
+        self.threads[0].start()
+
+    def start(self):
+        self._run()
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
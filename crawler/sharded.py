@@ -0,0 +1,197 @@
+import copy
+import multiprocessing
+from queue import Empty
+from threading import Thread, Event
+
+from utils import get_logger, shard_path
+from utils.fingerprint import url_fingerprint, fingerprint_host
+from crawler.frontier import Frontier
+from crawler.worker import Worker
+import utils.download
+import summary
+import scraper
+import simhash
+import page_analysis
+
+# Seconds between checks of the shared work count and the inbox
+POLL_INTERVAL = 0.5
+
+def shard_of(url: str, shards: int) -> int:
+    """
+    Shard that owns url, every url of a host belongs to the same shard
+    """
+    return fingerprint_host(url_fingerprint(url)) % shards
+
+def shard_config(config, shard: int, shards: int):
+    """
+    Copy of config with its own save files and only the seed urls of shard
+    """
+    config = copy.copy(config)
+    config.save_file = shard_path(config.save_file, shard)
+    config.simhash_save_file = shard_path(config.simhash_save_file, shard)
+    config.seed_urls = [url for url in config.seed_urls if shard_of(url, shards) == shard]
+    return config
+
+class ShardFrontier(Frontier):
+    """
+    Frontier of one shard of a multi-process crawl. It only queues urls of the hosts
+    hash-partitioned to its shard, links to other hosts are sent in one batch per
+    shard to the inbox of the shard that owns them.
+
+    work counts the urls queued or being crawled in every shard plus the batches in
+    transit, and is raised before it is lowered, so all shards stop once it reaches 0.
+    """
+
+    def __init__(self, config, restart, shard: int, inboxes: list, work):
+        self.shard = shard
+        self.inboxes = inboxes
+        self.work = work
+        # Urls queued while loading are counted once the queue is built
+        self._counting = False
+        super().__init__(config, restart)
+        self._add_work(len(self.to_be_downloaded))
+        self._counting = True
+
+    def _add_work(self, delta: int) -> None:
+        with self.work.get_lock():
+            self.work.value += delta
+
+    def add_urls(self, urls, parent: str = None) -> int:
+        local = list()
+        remote: dict[int, list[str]] = dict()
+        for url in urls:
+            shard = shard_of(url, len(self.inboxes))
+            if shard == self.shard:
+                local.append(url)
+            else:
+                remote.setdefault(shard, list()).append(url)
+
+        for shard, batch in remote.items():
+            # Counted until the owning shard has queued the batch
+            self._add_work(1)
+            self.inboxes[shard].put(batch)
+
+        added = super().add_urls(local, parent)
+        if self._counting:
+            self._add_work(added)
+        return added
+
+    def receive(self, batch: list[str]) -> int:
+        """
+        Queues a batch of urls sent by another shard
+        """
+        added = super().add_urls(batch)
+        self._add_work(added - 1)
+        return added
+
+    def _validate_resumed(self, url: str, fingerprint: int) -> bool:
+        if super()._validate_resumed(url, fingerprint):
+            return True
+        self._add_work(-1)
+        return False
+
+    def mark_url_complete(self, url):
+        super().mark_url_complete(url)
+        self._add_work(-1)
+
+    def get_tbd_url(self, timeout: float = None):
+        """
+        Like Frontier.get_tbd_url, but an empty shard keeps waiting for urls from
+        other shards until no shard has urls queued or in flight
+        """
+        while True:
+            url = super().get_tbd_url(timeout)
+            if url is not None or timeout is not None:
+                return url
+            if self.work.value <= 0:
+                return None
+            with self.lock:
+                self.url_available.wait(POLL_INTERVAL)
+
+def _drain_inbox(frontier: ShardFrontier, inbox, stopped: Event) -> None:
+    while not stopped.is_set():
+        try:
+            batch = inbox.get(timeout=POLL_INTERVAL)
+        except Empty:
+            continue
+        frontier.receive(batch)
+
+def run_shard(config, restart: bool, shard: int, inboxes: list, work, ready) -> None:
+    """
+    Crawls one shard with config.threads_count workers, the target of each shard process
+    """
+    logger = get_logger(f"SHARD-{shard}", "SHARD")
+    config = shard_config(config, shard, len(inboxes))
+
+    # Module state is set up again in case the process was spawned rather than forked,
+    # a forked process also needs its own connections to the cache server
+    utils.download.configure_client(config.threads_count, config.connect_timeout, config.read_timeout)
+    simhash.configure_token_hasher(config.token_hasher, config.token_hash_cache_size)
+    page_analysis.configure_engine(config.page_parser)
+    scraper.configure_ingestion_budget(
+        config.max_page_bytes, config.skip_page_bytes, config.max_page_tokens, config.max_page_links)
+    scraper.configure_summary(shard_path("summary.shelve", shard))
+    summary.restart_summary_stats(scraper.summary_save_path, restart)
+    scraper.load_content_simhashes(config.simhash_save_file, restart)
+
+    frontier = ShardFrontier(config, restart, shard, inboxes, work)
+    stopped = Event()
+    receiver = Thread(target=_drain_inbox, args=(frontier, inboxes[shard], stopped), daemon=True)
+    receiver.start()
+
+    # No shard may see an empty crawl before every shard has counted its queue
+    ready.wait()
+    logger.info(f"Shard {shard} of {len(inboxes)} starting with {len(frontier.to_be_downloaded)} urls.")
+
+    workers = [Worker(f"{shard}.{worker_id}", config, frontier) for worker_id in range(config.threads_count)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    stopped.set()
+    receiver.join()
+    frontier.save.close()
+    logger.info(
+        f"Seen url filter: {frontier.seen_urls.stats()}, host health: {frontier.host_health.stats()}, "
+        f"cache server requests: {utils.download.client.stats()}, "
+        f"ingestion budget: {scraper.ingestion_budget.stats()}, "
+        f"token hash cache: {simhash.token_hash_cache_stats()}, "
+        f"url validation cache: {scraper.url_validator.stats()}")
+
+class ShardedCrawler(object):
+    """
+    Crawls with config.process_count processes, each owning the hosts hash-partitioned
+    to it along with their frontier, politeness and duplicate detection state.
+    """
+
+    def __init__(self, config, restart):
+        self.config = config
+        self.restart = restart
+        self.logger = get_logger("CRAWLER")
+        self.processes = list()
+
+    def start_async(self):
+        shards = self.config.process_count
+        context = multiprocessing.get_context()
+        inboxes = [context.Queue() for _ in range(shards)]
+        work = context.Value("q", 0)
+        ready = context.Barrier(shards)
+        self.processes = [
+            context.Process(
+                target=run_shard, name=f"Shard-{shard}",
+                args=(self.config, self.restart, shard, inboxes, work, ready))
+            for shard in range(shards)]
+        for process in self.processes:
+            process.start()
+        self.logger.info(f"Started {shards} crawler processes.")
+
+    def start(self):
+        self.start_async()
+        self.join()
+
+    def join(self):
+        for process in self.processes:
+            process.join()
+        summary.merge_summaries(
+            [shard_path("summary.shelve", shard) for shard in range(len(self.processes))], "summary.shelve")
@@ -4,7 +4,6 @@ import utils.download
 # from utils.download import download
 from utils import get_logger
 import scraper
-import time
 
 
 class Worker(Thread):
@@ -27,12 +26,11 @@ class Worker(Thread):
             self.logger.info(
                 f"Downloaded {tbd_url}, status <{resp.status}>, "
                 f"using cache {self.config.cache_server}.")
+            if self.frontier.retry_later(tbd_url, resp.status):
+                continue
             scraped_urls = scraper.scraper(tbd_url, resp)
-            for scraped_url in scraped_urls:
-                self.frontier.add_url(scraped_url)
+            self.frontier.add_urls(scraped_urls, parent=tbd_url)
             self.frontier.mark_url_complete(tbd_url)
-            
-            # enforces politeness. Puts worker to sleep to avoid hitting
-            # same domain too quickly. This method will not work for a
-            # multithreaded crawler implementation
-            time.sleep(self.config.time_delay)  
\ No newline at end of file
+
+            # Politeness is enforced per host by the frontier, get_tbd_url only
+            # hands out urls whose host has not been fetched within time_delay.
@@ -0,0 +1,359 @@
+import os
+import sys
+import dbm
+import shelve
+import sqlite3
+from threading import RLock
+from urllib.parse import urlparse
+
+from utils import get_logger
+from utils.fingerprint import url_fingerprint, fingerprint_key
+
+store_logger = get_logger("FRONTIER")
+
+SHELVE = "shelve"
+SQLITE = "sqlite"
+FRONTIER_BACKENDS = {SHELVE, SQLITE}
+
+# First bytes of every sqlite database file
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+PENDING = 0
+COMPLETED = 1
+
+FINGERPRINT_KEY_LENGTH = len(fingerprint_key(0))
+
+# Sqlite integers are signed, fingerprints are stored shifted into that range
+SIGNED_OFFSET = 1 << 63
+
+def _to_signed(fingerprint: int) -> int:
+    return fingerprint - SIGNED_OFFSET
+
+def _from_signed(value: int) -> int:
+    return value + SIGNED_OFFSET
+
+# Suffix of the journal of pending urls kept next to a shelve save file
+PENDING_JOURNAL_SUFFIX = ".pending"
+
+class ShelveFrontierStore(shelve.DbfilenameShelf):
+    """
+    The original frontier save file, a shelve of url fingerprint -> (url, completed),
+    keyed by the fixed width hex form of each fingerprint. Discovery depth is not recorded.
+
+    Next to it an append-only journal records urls as they are added ("+key url")
+    and completed ("-key"), so resuming reads the pending urls from the journal
+    instead of unpickling every entry of the shelve.
+    """
+
+    def __init__(self, filename: str, flag: str = "c"):
+        self._journal = None
+        super().__init__(filename, flag)
+        self.journal_path = filename + PENDING_JOURNAL_SUFFIX
+        self._has_journal = os.path.exists(self.journal_path)
+        if flag != "r":
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def _raw_keys(self):
+        return (key.decode(self.keyencoding) for key in self.dict.keys())
+
+    def __contains__(self, fingerprint: int) -> bool:
+        return super().__contains__(fingerprint_key(fingerprint))
+
+    def __getitem__(self, fingerprint: int) -> tuple[str, bool]:
+        return super().__getitem__(fingerprint_key(fingerprint))
+
+    def __setitem__(self, fingerprint: int, value: tuple[str, bool]) -> None:
+        key = fingerprint_key(fingerprint)
+        super().__setitem__(key, value)
+        if self._journal is not None:
+            url, completed = value
+            self._journal.write(f"-{key}\n" if completed else f"+{key} {url}\n")
+
+    def __delitem__(self, fingerprint: int) -> None:
+        super().__delitem__(fingerprint_key(fingerprint))
+
+    def __iter__(self):
+        return (int(key, 16) for key in self._raw_keys())
+
+    def keys(self) -> list[int]:
+        return list(iter(self))
+
+    def items(self) -> list[tuple[int, tuple[str, bool]]]:
+        return [(int(key, 16), shelve.Shelf.__getitem__(self, key)) for key in self._raw_keys()]
+
+    def values(self) -> list[tuple[str, bool]]:
+        return [shelve.Shelf.__getitem__(self, key) for key in self._raw_keys()]
+
+    def upgrade_legacy_keys(self) -> int:
+        """
+        Re-keys entries saved under 64 character sha256 url hashes by their url fingerprint
+        and returns how many were re-keyed. The journal is dropped afterwards, so the
+        next pending() rebuilds it from the shelve.
+        """
+        legacy_keys = [key for key in self._raw_keys() if len(key) != FINGERPRINT_KEY_LENGTH]
+        if legacy_keys and self._journal is None:
+            raise ValueError(f"Can not re-key the legacy urls of {self.journal_path[:-len(PENDING_JOURNAL_SUFFIX)]}, "
+                             f"it is open read-only")
+        for key in legacy_keys:
+            url, completed = shelve.Shelf.__getitem__(self, key)
+            fingerprint = url_fingerprint(url)
+            if completed or fingerprint not in self:
+                self[fingerprint] = (url, completed)
+            shelve.Shelf.__delitem__(self, key)
+
+        if legacy_keys:
+            store_logger.info(f"Re-keyed {len(legacy_keys)} urls saved under sha256 url hashes by their fingerprint")
+            self._journal.close()
+            os.remove(self.journal_path)
+            self._has_journal = False
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        return len(legacy_keys)
+
+    def add(self, fingerprint: int, url: str, depth: int = 0, known_new: bool = False) -> bool:
+        """
+        Records a newly discovered url, returns False if it was already known.
+        known_new skips the lookup when the caller already knows url is not saved.
+        """
+        if not known_new and fingerprint in self:
+            return False
+        self[fingerprint] = (url, False)
+        return True
+
+    def add_many(self, entries: list[tuple[int, str, int]]) -> None:
+        """
+        Records (fingerprint, url, depth) of urls the caller knows are not saved
+        """
+        for fingerprint, url, depth in entries:
+            self[fingerprint] = (url, False)
+
+    def depth(self, fingerprint: int) -> int:
+        return 0
+
+    def pending(self) -> list[tuple[int, str]]:
+        """
+        Returns (fingerprint, url) of every url not yet completed, replaying the journal.
+        Save files written before the journal existed are scanned once instead.
+        Unless the store is open read-only, the journal is then rewritten to hold only
+        the pending urls.
+        """
+        if self._has_journal:
+            pending: dict[int, str] = dict()
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.rstrip("\n")
+                    try:
+                        if line.startswith("+"):
+                            key, _, url = line[1:].partition(" ")
+                            pending[int(key, 16)] = url
+                        elif line.startswith("-"):
+                            pending.pop(int(line[1:], 16), None)
+                    except ValueError:
+                        # a crash mid-write leaves a partial last line, which is skipped
+                        continue
+        else:
+            pending = {fingerprint: url for fingerprint, (url, completed) in self.items() if not completed}
+        if self._journal is None:
+            return list(pending.items())
+
+        self._journal.close()
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(f"+{fingerprint_key(fingerprint)} {url}\n" for fingerprint, url in pending.items())
+        os.replace(tmp_path, self.journal_path)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+        return list(pending.items())
+
+    def sync(self) -> None:
+        super().sync()
+        if self._journal is not None:
+            self._journal.flush()
+
+    def close(self) -> None:
+        super().close()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+class SQLiteFrontierStore(object):
+    """
+    Frontier save file in a sqlite database in WAL mode, with indexed columns for
+    the url fingerprint, host, state and discovery depth of every url. The fingerprint
+    is the integer primary key, so it is also the rowid and needs no separate index.
+
+    Behaves like the shelve of fingerprint -> (url, completed) it replaces. Writes are
+    collected in an open transaction until sync() commits them, so the frontier
+    commits once per crawled page instead of once per discovered url.
+    """
+
+    def __init__(self, save_path: str, readonly: bool = False):
+        self.save_path = save_path
+        self._lock = RLock()
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{save_path}?mode=ro", uri=True, check_same_thread=False)
+            return
+
+        self._conn = sqlite3.connect(save_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL only fsyncs at checkpoints and stays consistent after a crash
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS urls (
+                fingerprint INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                host TEXT NOT NULL,
+                state INTEGER NOT NULL DEFAULT 0,
+                depth INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS urls_host ON urls (host);
+            CREATE INDEX IF NOT EXISTS urls_state ON urls (state);
+            CREATE INDEX IF NOT EXISTS urls_depth ON urls (depth);
+        """)
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+    def __contains__(self, fingerprint: int) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM urls WHERE fingerprint = ?", (_to_signed(fingerprint),)).fetchone() is not None
+
+    def __getitem__(self, fingerprint: int) -> tuple[str, bool]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, state FROM urls WHERE fingerprint = ?", (_to_signed(fingerprint),)).fetchone()
+        if row is None:
+            raise KeyError(fingerprint)
+        return row[0], row[1] == COMPLETED
+
+    def __setitem__(self, fingerprint: int, value: tuple[str, bool]) -> None:
+        url, completed = value
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO urls (fingerprint, url, host, state) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (fingerprint) DO UPDATE SET url = excluded.url, host = excluded.host, state = excluded.state",
+                (_to_signed(fingerprint), url, urlparse(url).netloc, COMPLETED if completed else PENDING))
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self) -> list[int]:
+        with self._lock:
+            return [_from_signed(row[0]) for row in self._conn.execute("SELECT fingerprint FROM urls")]
+
+    def values(self) -> list[tuple[str, bool]]:
+        with self._lock:
+            return [(url, state == COMPLETED) for url, state in self._conn.execute("SELECT url, state FROM urls")]
+
+    def items(self) -> list[tuple[int, tuple[str, bool]]]:
+        with self._lock:
+            return [(_from_signed(fingerprint), (url, state == COMPLETED))
+                    for fingerprint, url, state in self._conn.execute("SELECT fingerprint, url, state FROM urls")]
+
+    def add(self, fingerprint: int, url: str, depth: int = 0, known_new: bool = False) -> bool:
+        """
+        Records a newly discovered url, returns False if it was already known.
+        The primary key makes the insert its own membership check, so known_new is not needed.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO urls (fingerprint, url, host, state, depth) VALUES (?, ?, ?, ?, ?)",
+                (_to_signed(fingerprint), url, urlparse(url).netloc, PENDING, depth))
+            return cursor.rowcount == 1
+
+    def add_many(self, entries: list[tuple[int, str, int]]) -> None:
+        """
+        Records (fingerprint, url, depth) of newly discovered urls with one statement
+        """
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO urls (fingerprint, url, host, state, depth) VALUES (?, ?, ?, ?, ?)",
+                [(_to_signed(fingerprint), url, urlparse(url).netloc, PENDING, depth)
+                 for fingerprint, url, depth in entries])
+
+    def pending(self) -> list[tuple[int, str]]:
+        """
+        Returns (fingerprint, url) of every url not yet completed, read through the state index
+        """
+        with self._lock:
+            return [(_from_signed(fingerprint), url) for fingerprint, url in self._conn.execute(
+                "SELECT fingerprint, url FROM urls WHERE state = ?", (PENDING,))]
+
+    def upgrade_legacy_keys(self) -> int:
+        return 0
+
+    def depth(self, fingerprint: int) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT depth FROM urls WHERE fingerprint = ?", (_to_signed(fingerprint),)).fetchone()
+        return row[0] if row else 0
+
+    def sync(self) -> None:
+        with self._lock:
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Files a dbm module may store a shelve in: dbm.dumb writes .dat/.dir/.bak, dbm.ndbm .db or .pag/.dir
+DBM_SUFFIXES = (".dat", ".dir", ".bak", ".db", ".pag")
+
+def detect_backend(save_path: str) -> str | None:
+    """
+    Returns SQLITE or SHELVE for an existing frontier save file, None if there is none
+    """
+    if os.path.isfile(save_path):
+        with open(save_path, "rb") as f:
+            if f.read(len(SQLITE_HEADER)) == SQLITE_HEADER:
+                return SQLITE
+    if dbm.whichdb(save_path):
+        return SHELVE
+    return None
+
+def open_frontier_store(save_path: str, backend: str = SHELVE, readonly: bool = False):
+    if backend not in FRONTIER_BACKENDS:
+        raise ValueError(f"Unknown frontier backend {backend}, expected one of {sorted(FRONTIER_BACKENDS)}")
+    if backend == SQLITE:
+        return SQLiteFrontierStore(save_path, readonly)
+    return ShelveFrontierStore(save_path, "r" if readonly else "c")
+
+def remove_frontier_store(save_path: str) -> None:
+    """
+    Deletes a save file whichever dbm layout wrote it, along with the pending url
+    journal or sqlite write-ahead log files next to it
+    """
+    paths = [save_path + suffix for suffix in DBM_SUFFIXES]
+    paths += [save_path, save_path + PENDING_JOURNAL_SUFFIX, save_path + "-wal", save_path + "-shm"]
+    for path in paths:
+        if os.path.isfile(path):
+            os.remove(path)
+
+def migrate_shelve_to_sqlite(shelve_path: str, sqlite_path: str) -> int:
+    """
+    Copies every entry of a shelve frontier save file into a sqlite one in a single
+    transaction and returns the number of entries copied. Entries are keyed by the
+    fingerprint of their url, whatever key the shelve used. Depths are unknown and saved as 0.
+    """
+    count = 0
+    with shelve.open(shelve_path, "r") as source, SQLiteFrontierStore(sqlite_path) as target:
+        for url, completed in source.values():
+            fingerprint = url_fingerprint(url)
+            if completed or fingerprint not in target:
+                target[fingerprint] = (url, completed)
+            count += 1
+    store_logger.info(f"Migrated {count} urls from {shelve_path} to {sqlite_path}")
+    return count
+
+if __name__ == "__main__":
+    # Usage: python frontier_store.py frontier.shelve frontier.sqlite
+    source_path, target_path = sys.argv[1:3]
+    print(f"Migrated {migrate_shelve_to_sqlite(source_path, target_path)} urls")
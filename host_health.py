@@ -0,0 +1,80 @@
+import time
+from collections import Counter
+from threading import Lock
+
+from utils.download import NO_RESPONSE_STATUS
+
+# Defaults for retries and the circuit breaker
+MAX_RETRIES = 3         # times a url is retried after a transient failure
+RETRY_DELAY = 2.0       # seconds before the first retry, doubled for every further one
+BREAKER_FAILURES = 5    # consecutive failures of a host that park all of its urls
+BREAKER_COOLDOWN = 300.0  # seconds a host stays parked, also the longest retry delay
+
+def is_transient_failure(status: int) -> bool:
+    """
+    True for statuses worth retrying: no response at all or a server error
+    """
+    return status == NO_RESPONSE_STATUS or 500 <= status < 600
+
+class HostHealth(object):
+    """
+    Tracks consecutive download failures per host and failed attempts per url.
+
+    A url that fails transiently is retried up to max_retries times, holding its host
+    back retry_delay, 2 * retry_delay, 4 * retry_delay, ... seconds before each retry.
+    After breaker_failures consecutive failures the host's circuit opens and it is held
+    back breaker_cooldown seconds. The next download after that is a probe: a success
+    closes the circuit, another failure opens it again.
+    """
+
+    def __init__(self, max_retries: int = MAX_RETRIES, retry_delay: float = RETRY_DELAY,
+                 breaker_failures: int = BREAKER_FAILURES, breaker_cooldown: float = BREAKER_COOLDOWN):
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self.failures: dict[str, int] = dict()      # host -> consecutive failed downloads
+        self.attempts: dict[str, int] = dict()      # url -> failed downloads so far
+        self.open_until: dict[str, float] = dict()  # host -> time.monotonic() its circuit closes again
+        self.counters = Counter()
+        self._lock = Lock()
+
+    def record_success(self, host: str, url: str) -> None:
+        with self._lock:
+            self.failures.pop(host, None)
+            self.attempts.pop(url, None)
+            if self.open_until.pop(host, None) is not None:
+                self.counters["closed_circuits"] += 1
+
+    def record_failure(self, host: str, url: str) -> tuple[bool, float, bool]:
+        """
+        Returns whether url should be retried, how many seconds its host should be held
+        back, and whether this failure opened the host's circuit
+        """
+        with self._lock:
+            failures = self.failures[host] = self.failures.get(host, 0) + 1
+            attempts = self.attempts[url] = self.attempts.get(url, 0) + 1
+
+            retry = attempts <= self.max_retries
+            if retry:
+                self.counters["retries"] += 1
+                hold = min(self.retry_delay * 2 ** (attempts - 1), self.breaker_cooldown)
+            else:
+                self.counters["gave_up"] += 1
+                del self.attempts[url]
+                hold = 0.0
+
+            opened = self.breaker_failures > 0 and failures >= self.breaker_failures
+            if opened:
+                self.counters["opened_circuits"] += 1
+                hold = self.breaker_cooldown
+                self.open_until[host] = time.monotonic() + hold
+            return retry, hold, opened
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            stats = {"retries": 0, "gave_up": 0, "opened_circuits": 0, "closed_circuits": 0}
+            stats.update(self.counters)
+            now = time.monotonic()
+            stats["open_circuits"] = sum(1 for until in self.open_until.values() if until > now)
+            return stats
@@ -0,0 +1,82 @@
+from collections import Counter
+from threading import Lock
+
+from utils import get_logger
+
+budget_logger = get_logger("BUDGET")
+
+# Reasons counted by IngestionBudget
+SKIPPED_SIZE = "skipped_size"
+TRUNCATED_BYTES = "truncated_bytes"
+TRUNCATED_TOKENS = "truncated_tokens"
+TRUNCATED_LINKS = "truncated_links"
+
+# Default limits, 0 disables a limit
+MAX_PAGE_BYTES = 2000000    # bytes of a page that are parsed (2 MB)
+SKIP_PAGE_BYTES = 10000000  # pages larger than this are not parsed at all (10 MB)
+MAX_PAGE_TOKENS = 100000    # tokens of a page used for its simhash fingerprint
+MAX_PAGE_LINKS = 1000       # links extracted from a page
+
+class IngestionBudget(object):
+    """
+    Per-page limits on how much of a response is parsed, fingerprinted and followed,
+    so a single pathological page can not stall a worker or balloon memory.
+    Every truncation or skip is logged and counted by reason.
+    """
+
+    def __init__(self, max_bytes: int = MAX_PAGE_BYTES, skip_bytes: int = SKIP_PAGE_BYTES,
+                 max_tokens: int = MAX_PAGE_TOKENS, max_links: int = MAX_PAGE_LINKS):
+        self.max_bytes = max_bytes
+        self.skip_bytes = skip_bytes
+        self.max_tokens = max_tokens
+        self.max_links = max_links
+        self.counters = Counter()
+        self._lock = Lock()
+
+    def _count(self, reason: str, url: str, detail: str) -> None:
+        with self._lock:
+            self.counters[reason] += 1
+        budget_logger.warning(f"{reason} {url}: {detail}")
+
+    def exceeds_skip_size(self, url: str, size: int) -> bool:
+        """
+        True (and counted) if a page of size bytes should not be parsed at all
+        """
+        if self.skip_bytes and size > self.skip_bytes:
+            self._count(SKIPPED_SIZE, url, f"{size} bytes is greater than {self.skip_bytes} bytes")
+            return True
+        return False
+
+    def limit_content(self, url: str, content):
+        """
+        Returns at most max_bytes of content
+        """
+        if self.max_bytes and len(content) > self.max_bytes:
+            self._count(TRUNCATED_BYTES, url, f"parsing {self.max_bytes} of {len(content)} bytes")
+            if isinstance(content, (bytes, bytearray, memoryview)):
+                # A view of the leading bytes rather than a copy of them
+                return memoryview(content)[:self.max_bytes]
+            return content[:self.max_bytes]
+        return content
+
+    def limit_tokens(self, url: str, tokens: list[str]) -> list[str]:
+        """
+        Returns at most max_tokens of tokens
+        """
+        if self.max_tokens and len(tokens) > self.max_tokens:
+            self._count(TRUNCATED_TOKENS, url, f"fingerprinting {self.max_tokens} of {len(tokens)} tokens")
+            return tokens[:self.max_tokens]
+        return tokens
+
+    def limit_links(self, url: str, links: list[str]) -> list[str]:
+        """
+        Returns at most max_links of links
+        """
+        if self.max_links and len(links) > self.max_links:
+            self._count(TRUNCATED_LINKS, url, f"extracting {self.max_links} of {len(links)} links")
+            return links[:self.max_links]
+        return links
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
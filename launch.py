@@ -2,9 +2,13 @@ from configparser import ConfigParser
 from argparse import ArgumentParser
 
 from utils.server_registration import get_cache_server
+import utils.download
 from utils.config import Config
-from crawler import Crawler
+from crawler import Crawler, ShardedCrawler, AsyncCrawler, PipelineCrawler, ENGINES, ASYNCIO, PIPELINE
 import summary
+import scraper
+import simhash
+import page_analysis
 
 
 def main(config_file, restart):
@@ -12,8 +16,25 @@ def main(config_file, restart):
     cparser.read(config_file)
     config = Config(cparser)
     config.cache_server = get_cache_server(config, restart)
-    crawler = Crawler(config, restart)
-    summary.restart_summary_stats("summary.shelve", restart)
+    utils.download.configure_client(config.threads_count, config.connect_timeout, config.read_timeout)
+    simhash.configure_token_hasher(config.token_hasher, config.token_hash_cache_size)
+    page_analysis.configure_engine(config.page_parser)
+    scraper.configure_ingestion_budget(
+        config.max_page_bytes, config.skip_page_bytes, config.max_page_tokens, config.max_page_links)
+    if config.engine not in ENGINES:
+        raise ValueError(f"Unknown crawl engine {config.engine}, expected one of {sorted(ENGINES)}")
+    if config.process_count > 1:
+        # Each process sets up its own summary and simhash files
+        crawler = ShardedCrawler(config, restart)
+    else:
+        if config.engine == ASYNCIO:
+            crawler = AsyncCrawler(config, restart)
+        elif config.engine == PIPELINE:
+            crawler = PipelineCrawler(config, restart)
+        else:
+            crawler = Crawler(config, restart)
+        summary.restart_summary_stats("summary.shelve", restart)
+        scraper.load_content_simhashes(config.simhash_save_file, restart)
     crawler.start()
 
 if __name__ == "__main__":
@@ -0,0 +1,191 @@
+import sys
+import time
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+from bs4.dammit import UnicodeDammit
+
+# Markup whose text is not human-readable: CSS, JS, metadata, alternate for JS, embedded websites
+NON_TEXT_MARKUP = ["style", "script", "meta", "noscript", "iframe"]
+
+class PageAnalysis(object):
+    """
+    Everything the scraper needs from an html page, taken from a single parse.
+        text:  human-readable text of the page
+        hrefs: href values of every anchor, in document order and not yet resolved against the page url
+        title: contents of the <title> tag, or None
+        meta:  <meta> name / http-equiv / property -> content
+    """
+    def __init__(self, text: str, hrefs: list[str], title: str | None, meta: dict[str, str]):
+        self.text = text
+        self.hrefs = hrefs
+        self.title = title
+        self.meta = meta
+
+def _meta_entry(attrs) -> tuple[str, str] | None:
+    """
+    Returns the (key, content) pair of a <meta> tag, or None if it has no name or content
+    """
+    key = attrs.get("name") or attrs.get("http-equiv") or attrs.get("property")
+    if key and attrs.get("content") is not None:
+        return key.lower(), attrs.get("content")
+    return None
+
+def soup_analyze_page(content) -> PageAnalysis:
+    """
+    Parses content into a BeautifulSoup tree and returns its text, anchors and metadata
+    """
+    if isinstance(content, memoryview):
+        content = bytes(content)  # BeautifulSoup only takes str or bytes
+    soup = BeautifulSoup(content, 'html.parser')
+
+    title = soup.title.string if soup.title and soup.title.string else None
+
+    # One walk over the tree collects the anchors and metadata before
+    # the non-text markup (and any anchors nested in it) is removed
+    hrefs = []
+    meta = {}
+    non_text = []
+    for tag in soup.find_all(["a"] + NON_TEXT_MARKUP):
+        if tag.name == "a":
+            if tag.has_attr("href"):
+                hrefs.append(tag.get("href"))
+            continue
+
+        if tag.name == "meta":
+            entry = _meta_entry(tag.attrs)
+            if entry:
+                meta[entry[0]] = entry[1]
+        non_text.append(tag)
+
+    for markup in non_text:
+        markup.decompose()  # remove all markups stated above
+
+    # soup contains only human-readable texts now to be compared near-duplicate
+    text = soup.get_text(separator=" ", strip=True)
+
+    return PageAnalysis(text, hrefs, title, meta)
+
+class _StreamingPageParser(HTMLParser):
+    """
+    Collects text, anchors and metadata from html.parser events without building a tree.
+    Text inside non-text markup is dropped while streaming; anchors are kept wherever
+    they appear, the same as the soup engine.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.text_chunks = []
+        self.hrefs = []
+        self.meta = {}
+        self.title_chunks = None
+        self._skip_depth = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            for name, value in attrs:
+                if name == "href":
+                    self.hrefs.append(value if value is not None else "")
+                    break
+        elif tag == "meta":
+            entry = _meta_entry(dict(attrs))
+            if entry:
+                self.meta[entry[0]] = entry[1]
+        elif tag in NON_TEXT_MARKUP:
+            self._skip_depth += 1
+        elif tag == "title" and self.title_chunks is None:
+            self.title_chunks = []
+            self._in_title = True
+
+    def handle_startendtag(self, tag, attrs):
+        # Self-closing non-text markup (<iframe/>) has no content to skip
+        if tag in NON_TEXT_MARKUP and tag != "meta":
+            return
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag in NON_TEXT_MARKUP and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if self._in_title:
+            self.title_chunks.append(data)
+        stripped = data.strip()
+        if stripped:
+            self.text_chunks.append(stripped)
+
+def _decode(content) -> str:
+    if isinstance(content, str):
+        return content
+    try:
+        # Decodes bytes and memoryviews alike without copying them first
+        return str(content, "utf-8")
+    except UnicodeDecodeError:
+        return UnicodeDammit(bytes(content)).unicode_markup
+
+def stream_analyze_page(content) -> PageAnalysis:
+    """
+    Streams content through html.parser and returns its text, anchors and metadata
+    """
+    parser = _StreamingPageParser()
+    parser.feed(_decode(content))
+    parser.close()
+
+    title = "".join(parser.title_chunks) if parser.title_chunks else None
+    return PageAnalysis(" ".join(parser.text_chunks), parser.hrefs, title, parser.meta)
+
+def text_page_analysis(content) -> PageAnalysis:
+    """
+    Analysis of a plain text body, its text as is and no anchors, without a parser
+    """
+    return PageAnalysis(_decode(content), [], None, dict())
+
+# Page analysis engines selectable with configure_engine
+ANALYSIS_ENGINES = {
+    "soup": soup_analyze_page,
+    "stream": stream_analyze_page,
+}
+
+_engine = soup_analyze_page
+
+def configure_engine(name: str = "soup") -> None:
+    global _engine
+    if name not in ANALYSIS_ENGINES:
+        raise ValueError(f"Unknown page analysis engine {name}, expected one of {sorted(ANALYSIS_ENGINES)}")
+    _engine = ANALYSIS_ENGINES[name]
+
+def analyze_page(content) -> PageAnalysis:
+    """
+    Parses content once with the configured engine and returns its text, anchors and metadata
+    """
+    return _engine(content)
+
+def benchmark_engines(pages: list, repeat: int = 3) -> dict[str, float]:
+    """
+    Returns the best total seconds each engine takes to analyze all pages
+    """
+    results = {}
+    for name, engine in ANALYSIS_ENGINES.items():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for content in pages:
+                engine(content)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = best
+    return results
+
+if __name__ == "__main__":
+    # Usage: python page_analysis.py page1.html page2.html ...
+    pages = []
+    for path in sys.argv[1:]:
+        with open(path, "rb") as f:
+            pages.append(f.read())
+
+    for name, seconds in benchmark_engines(pages).items():
+        print(f"{name}: {seconds:.4f}s for {len(pages)} pages")
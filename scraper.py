@@ -1,100 +1,167 @@
 import re
 import time
-import io
-import PyPDF2
-import PyPDF2.errors
 
 import summary
 from robots import *
 import simhash
-
-from bs4 import BeautifulSoup
-from utils import get_logger, normalize
+from simhash_index import SimHashIndex
+from simhash_store import SimHashStore
+
+import content_sniffer
+from content_sniffer import classify_response
+from ingestion_budget import IngestionBudget
+from page_analysis import PageAnalysis, analyze_page, text_page_analysis
+from url_validator import URLValidator
+from utils import get_logger, canonicalize
 from urllib.parse import urljoin, urlparse
 
 scrap_logger = get_logger("SCRAPPER")
 
 # Store simhashes of previously visted pages to avoid scraping duplicate content
 # For less than 1 million simhashes storing simhashes in memory is preferred
-# Time complexity of python set in operation is O(1). 
-# For 20,000 SimHashes, the estimated memory usage is: 20,000 × 8 bytes = 160,000 bytes = 160 KB
-visited_content_simhashes = set()
+# Lookups go through a band index so a new page is only compared against fingerprints
+# sharing one of its bit bands, instead of every visited fingerprint.
+# Each fingerprint is stored once and referenced from THRESHOLD + 1 band tables.
+# Until load_content_simhashes is called the fingerprints are only kept in memory.
+visited_content_simhashes = SimHashIndex()
 
 visited_sitemaps = set()
 
-# response content size limit (bytes)
-RESP_SIZE_THRESHOLD = 500000 # (500 kb)
+# <priority> of urls listed in sitemaps, keyed by canonical url, used to order the frontier
+sitemap_priorities: dict[str, float] = dict()
+
+# Shared, memoized is_valid rules
+url_validator = URLValidator()
+
+# Per-page limits on parsed bytes, fingerprinted tokens and extracted links
+ingestion_budget = IngestionBudget()
+
+# Summary statistics of crawled pages, every shard of a multi-process crawl keeps its own
+summary_save_path = "summary.shelve"
+
+def load_content_simhashes(save_path: str, restart: bool) -> None:
+    """
+    Backs visited_content_simhashes with an on-disk store so near-duplicate
+    detection survives crawler restarts
+    """
+    global visited_content_simhashes
+    visited_content_simhashes = SimHashStore(save_path, restart)
+
+def configure_summary(save_path: str) -> None:
+    global summary_save_path
+    summary_save_path = save_path
+
+def configure_ingestion_budget(max_bytes: int, skip_bytes: int, max_tokens: int, max_links: int) -> None:
+    global ingestion_budget
+    ingestion_budget = IngestionBudget(max_bytes, skip_bytes, max_tokens, max_links)
+
+class ParsedPage(object):
+    """
+    What the cpu-bound half of scraping a response produces, small enough to be sent
+    back from a parsing process.
+        links:   links to crawl, not yet checked with is_valid
+        tokens:  tokens of the page text, None if the page was not parsed
+        simhash: simhash of the page text, None if the page was not parsed
+        counters: ingestion budget and token hash cache counts of parsing the page,
+                  filled in when it was parsed in a separate process
+    """
+    def __init__(self, links: list[str], tokens: list[str] | None = None, simhash: int | None = None):
+        self.links = links
+        self.tokens = tokens
+        self.simhash = simhash
+        self.counters: dict[str, int] = dict()
 
 def scraper(url, resp):
+    return apply_parsed_page(url, parse_response(url, resp))
+
+def parse_response(url, resp) -> ParsedPage:
+    """
+    Classifies, parses, tokenizes and fingerprints a response and extracts its links.
+    Reads no crawl state, so it can run in a separate process.
+    """
 
     # Check that the response status is ok and that the raw response has content
     if resp.status != 200 or resp.raw_response is None:
-        if resp.status >= 300 and resp.status < 400:  # HTTP 3xx Redirection
+        if resp.status >= 300 and resp.status < 400 and resp.raw_response is not None:  # HTTP 3xx Redirection
             redirect_url = resp.raw_response.headers.get("Location")
 
             scrap_logger.warning(f"Status {resp.status}: Redirecting {url} -> {redirect_url}")
-            return  [redirect_url] if is_valid(redirect_url) else []
+            return ParsedPage([redirect_url])
         else:
             scrap_logger.warning(f"Skipping URL {url}: Invalid response or status {resp.status}")
-            return []
+            return ParsedPage([])
 
-    # Check header fields for indication of common problematic responses 
-    if is_pdf_resp(url, resp):
+    # Check header fields and leading bytes for indication of common problematic responses 
+    # Only html is parsed, plain text is tokenized as is and everything else is skipped
+    content_kind = classify_response(resp)
+    if content_kind == content_sniffer.PDF:
         scrap_logger.warning(f"Skipping {url}: pdf file")
-        return []
+        return ParsedPage([])
     
-    if is_zip_resp(url, resp):
+    if content_kind == content_sniffer.ZIP:
         scrap_logger.warning(f"Skipping {url}: zip file")
-        return []
+        return ParsedPage([])
 
-    # if is_large_resp(url, resp, RESP_SIZE_THRESHOLD):
-    #     scrap_logger.warning(f"Skipping {url}: Content length greater than {RESP_SIZE_THRESHOLD} bytes")
-    #     return []
+    if content_kind in (content_sniffer.IMAGE, content_sniffer.BINARY, content_sniffer.DATA):
+        scrap_logger.warning(f"Skipping {url}: {content_kind} content")
+        return ParsedPage([])
 
     if is_attachment_resp(url, resp):
         scrap_logger.warning(f"Skipping {url}: downloads attachment")
-        return []
+        return ParsedPage([])
     
-    # parse as html document
+    # Skip responses too large to parse, only parse the first max_bytes of large ones
+    content = resp.raw_response.content
+    if ingestion_budget.exceeds_skip_size(url, len(content)):
+        return ParsedPage([])
+    content = ingestion_budget.limit_content(url, content)
+
+    # parse as html document, the same parse provides the text and the links
     try:
-        # Get the text from the html response
-        soup = BeautifulSoup(resp.raw_response.content, 'html.parser')
-
-        # Remove the text of CSS, JS, metadata, alter for JS, embeded websites
-        for markup in soup.find_all(["style", "script", "meta", "noscript", "iframe"]):  
-            markup.decompose()  # remove all markups stated above
-        
-        # soup contains only human-readable texts now to be compared near-duplicate
-        text = soup.get_text(separator=" ", strip=True)
+        if content_kind == content_sniffer.TEXT:
+            page = text_page_analysis(content)
+        else:
+            page = analyze_page(content)
     except Exception as e:
         scrap_logger.fatal(f"Error parsing {url}: {e}")
+        return ParsedPage([])
 
     # Create a list of tokens(words) in the html text
-    page_tokens = simhash.tokenize(text)
+    page_tokens = simhash.tokenize(page.text)
+    page_hash = simhash.compute_simhash(ingestion_budget.limit_tokens(url, page_tokens))
+
+    # Extract links from the page analysis
+    return ParsedPage(extract_next_links(url, resp, page), page_tokens, page_hash)
+
+def apply_parsed_page(url, parsed: ParsedPage) -> list[str]:
+    """
+    Records a parsed page in the summary statistics and the near-duplicate index,
+    and returns its valid links, none if it duplicates a page already crawled
+    """
+    if parsed.tokens is None:
+        # Redirects are followed, other unparsed responses have no links
+        return [link for link in parsed.links if is_valid(link)]
 
     # Update summary statistics
-    summary.update_token_frequency("summary.shelve",page_tokens)
-    summary.update_page_lengths("summary.shelve", url, page_tokens)
+    summary.update_token_frequency(summary_save_path, parsed.tokens)
+    summary.update_page_lengths(summary_save_path, url, parsed.tokens)
 
 
     # Check for near and exact duplicate content (Simhash); Simhash also covers exact duplicate which has dist == 0
-    current_page_hash = simhash.compute_simhash(page_tokens)
-    for visited_page_hash in visited_content_simhashes:
-        dist = simhash.calculate_hash_distance(current_page_hash, visited_page_hash)
+    current_page_hash = parsed.simhash
+    # Checked and added in one step, so two workers can not both keep near duplicates of each other
+    matches = visited_content_simhashes.add_unless_within(current_page_hash, simhash.THRESHOLD - 1)
+    if matches:
+        dist = matches[0][0]
         if dist == 0:  # Exact-duplicate
             scrap_logger.warning(f"Skipping URL {url}: Exact Duplicate Content Match with Dist={dist}")
-            return []
-        elif dist < simhash.THRESHOLD:  # Near-duplicate
+        else:  # Near-duplicate
             scrap_logger.warning(f"Skipping URL {url}: Near Duplicate Content Match with Dist={dist}")
-            return []
-    visited_content_simhashes.add(current_page_hash)
-
-    # Extract links with another soup
-    links = extract_next_links(url, resp)
+        return []
     
     # Filter out duplicate and invalid urls (message log if needed)
     unique_links = set()
-    for link in links:
+    for link in parsed.links:
         if not link:
             scrap_logger.info("Filtered out an empty or none URL")
         elif link in unique_links:
@@ -106,7 +173,7 @@ def scraper(url, resp):
 
     return list(unique_links)
 
-def extract_next_links(url, resp):
+def extract_next_links(url, resp, page: PageAnalysis = None):
     # Implementation required.
     # url: the URL that was used to get the page
     # resp.url: the actual url of the page
@@ -116,19 +183,20 @@ def extract_next_links(url, resp):
     #         resp.raw_response.url: the url, again
     #         resp.raw_response.content: the content of the page!
     # Return a list with the hyperlinks (as strings) scrapped from resp.raw_response.content   
+    # page: analysis of resp.raw_response.content if the caller already parsed it
     links = []
 
     try:
-        soup = BeautifulSoup(resp.raw_response.content, 'html.parser')
-        for anchor in soup.find_all('a', href=True):
-            link = anchor.get('href')
-            
+        if page is None:
+            page = analyze_page(ingestion_budget.limit_content(url, resp.raw_response.content))
+
+        for link in ingestion_budget.limit_links(url, page.hrefs):
             # convert relative url to absolute url
             abs_url = urljoin(url, link)
             parsed = urlparse(abs_url)
 
             # Strip queries and defragment (remove anything after '#')
-            clean_url = normalize(parsed._replace(query="", fragment="").geturl())
+            clean_url = canonicalize(parsed._replace(query="", fragment="").geturl())
 
             links.append(clean_url)
 
@@ -140,78 +208,8 @@ def extract_next_links(url, resp):
 def is_valid(url: str) -> bool:
     # Decide whether to crawl this url or not. 
     # If you decide to crawl it, return True; otherwise return False.
-    # There are already some conditions that return False.
-    
-    allowed_domains = {"ics.uci.edu", "cs.uci.edu", "informatics.uci.edu", "stat.uci.edu"}
-    
-    try:
-        parsed_url = urlparse(url)
-
-        # Check if url scheme is valid
-        if parsed_url.scheme not in set(["http", "https"]):
-            return False
-        
-        def is_allowed_domain(domain: str) -> bool:
-            for d in allowed_domains: 
-                if domain == d or domain.endswith("." + d):
-                    return True
-            return False
-        
-        # check host is in URL is in allowed domains
-        domain = parsed_url.netloc
-        if domain and not is_allowed_domain(domain):
-            return False
-        
-        # Avoid query strings (potential duplicate content)
-        if parsed_url.query:
-            return False
-
-        # Avoid infinite trap pattern
-        MAX_DEPTH = 8
-        path_segments = [segment for segment in parsed_url.path.split('/') if segment]
-        if len(path_segments) > MAX_DEPTH:
-            return False
-        
-        # Check for unique identifier segment in path 
-        # If segment is alphanumeric and beyond a cut off length 
-        # it is highly likely to be an ID and should be ignored. 
-        MAX_SEGMENT_LENGTH = 20
-        for segment in path_segments: 
-            if segment.isalnum() and len(segment) > MAX_SEGMENT_LENGTH:
-                return False 
-
-        # Filter out "archieve.ics.uci.edu" domain. 
-        # This is the machine learning archieve.
-        if "archive.ics.uci.edu" in parsed_url.netloc:
-            return False
-
-        # Filter out calendar pages which are potentially low-information pages.
-        if "calendar" in parsed_url.path.lower() or "calendar" in parsed_url.netloc.lower():
-            return False
-        
-        # Filter out commit pages (gitlab/github) which are potentially low-information pages.
-        if "commit" in parsed_url.path.lower():
-            return False
-
-        # Check robot.txt rules to follow politeness 
-        # Do not fetch from paths we are not allowed
-        if not can_fetch(url):
-            return False
-       
-        return not re.match(
-            r".*\.(css|js|bmp|gif|jpe?g|ico"
-            + r"|png|tiff?|mid|mp2|mp3|mp4"
-            + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
-            + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
-            + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
-            + r"|epub|dll|cnf|tgz|sha1"
-            + r"|thmx|mso|arff|rtf|jar|csv"
-            + r"|rm|smil|wmv|swf|wma|zip|rar|gz"
-            + r"|img|java|war|sql|mpg|ff|sh|ppsx|py|apk|svg|conf|cpp|fig|cls|ipynb|bam|odp|odc|tsv|nb|bib|z|rpm|ma)$", parsed_url.path.lower())
-
-    except TypeError:
-        print ("TypeError for ", parsed_url)
-        return False
+    # The rules live in url_validator.URLValidator, which memoizes each decision by url.
+    return url_validator(url)
 
 # Sitemap Helper Methods
 def get_sitemap_urls(url: str) -> list[str]: 
@@ -235,6 +233,21 @@ def get_sitemap_urls(url: str) -> list[str]:
     else:
         return []
 
+def record_sitemap_priorities(tree) -> None:
+    """
+    Saves the <priority> of every <url> entry of a parsed sitemap in sitemap_priorities
+    """
+    namespace = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+    for url_element in tree.findall(f".//{namespace}url"):
+        loc = url_element.find(f"{namespace}loc")
+        priority = url_element.find(f"{namespace}priority")
+        if loc is None or priority is None or not loc.text or not priority.text:
+            continue
+        try:
+            sitemap_priorities[canonicalize(loc.text.strip())] = float(priority.text)
+        except ValueError:
+            continue
+
 def fetch_sitemap_urls(sitemap_url: str, config: Config, logger: Logger) -> list[str]: 
 
     time.sleep(config.time_delay)
@@ -250,6 +263,7 @@ def fetch_sitemap_urls(sitemap_url: str, config: Config, logger: Logger) -> list
     # TODO: NEEDS TESTING, the recursive downloading and adding of sitemap content might become unmanagable
     try: 
         tree = ET.fromstring(resp.raw_response.content)
+        record_sitemap_priorities(tree)
         urls = set()
 
         # Gather all URLs in the sitemap
@@ -277,7 +291,9 @@ def fetch_sitemap_urls(sitemap_url: str, config: Config, logger: Logger) -> list
                 if (new_resp.status != 200 or not new_resp.raw_response):
                     logger.warning(f"Failed to download sitemap: {url}, status: {new_resp.status}")
                 else:
-                    url_element_stack.extend([elem.text.strip() for elem in ET.fromstring(new_resp.raw_response.content).findall(".//{http://www.sitemaps.org/schemas/sitemap/0.9}loc")])
+                    new_tree = ET.fromstring(new_resp.raw_response.content)
+                    record_sitemap_priorities(new_tree)
+                    url_element_stack.extend([elem.text.strip() for elem in new_tree.findall(".//{http://www.sitemaps.org/schemas/sitemap/0.9}loc")])
             # If just a site, add
             else:
                 if is_valid(url):
@@ -305,47 +321,22 @@ def seed_frontier_from_sitemap(url: str, config: Config, logger: Logger) -> list
 
 def is_pdf_resp(url, resp):
     """
+    Checks the Content-Type header and the leading bytes of the response for a pdf document
     """
-    
-    content_type = resp.raw_response.headers.get("Content-Type", "").lower()
-    
-    # Check Content-Type header
-    if "application/pdf" is content_type: 
-        return True
-    
-    # 
-    try:
-        with io.BytesIO(resp.raw_response.content) as pdf_stream: 
-            reader = PyPDF2.PdfReader(pdf_stream)
-            return bool(reader.pages)
-    except PyPDF2.errors.PdfReadError:
-        return False
+    return classify_response(resp) == content_sniffer.PDF
 
 def is_zip_resp(url, resp):
     """
-    Checks that the response contains text in html format 
-    and does not contain an attachment that will try and download  
+    Checks the Content-Type header and the leading bytes of the response for a zip archive
     """
-
-    content_type = resp.raw_response.headers.get("Content-Type", "").lower()
-
-    if "application/zip" is content_type: 
-        return True
-    
-    return False
+    return classify_response(resp) == content_sniffer.ZIP
 
 def is_html_resp(url, resp):
     """
     Checks that the response contains text in html format 
     and does not contain an attachment that will try and download  
     """
-
-    content_type = resp.raw_response.headers.get("Content-Type", "").lower()
-
-    if content_type.startswith("text/html"):
-        return True
-    
-    return False
+    return classify_response(resp) == content_sniffer.HTML
 
 def is_attachment_resp(url, resp): 
     content_disposition = resp.raw_response.headers.get("Content-Disposition", "").lower()
@@ -353,16 +344,4 @@ def is_attachment_resp(url, resp):
     if "attachment" in content_disposition:
         return True
 
-    return False
-
-def is_large_resp(url, resp, threshold): 
-    content_length = resp.raw_response.headers.get("Content-Length", "")
-
-    try:
-        content_length = int(content_length)
-        if content_length > threshold: 
-            return True
-    except: 
-        return False
-    
     return False
\ No newline at end of file
@@ -0,0 +1,166 @@
+import math
+from collections import Counter
+from threading import Lock
+
+EXACT = "exact"
+BLOOM = "bloom"
+SEEN_FILTER_KINDS = {EXACT, BLOOM}
+
+# Defaults for the bloom filter
+FALSE_POSITIVE_RATE = 0.001
+INITIAL_CAPACITY = 100000
+GROWTH = 2             # every new slice holds GROWTH times the urls of the previous one
+TIGHTENING_RATIO = 0.5  # and has this fraction of its false positive rate
+
+MASK_64 = (1 << 64) - 1
+
+def _mix64(value: int) -> int:
+    """
+    splitmix64 finalizer, derives a second independent-looking hash from a fingerprint
+    """
+    value = ((value ^ (value >> 30)) * 0xbf58476d1ce4e5b9) & MASK_64
+    value = ((value ^ (value >> 27)) * 0x94d049bb133111eb) & MASK_64
+    return value ^ (value >> 31)
+
+class BloomSlice(object):
+    """
+    Fixed size bloom filter sized for capacity items at false_positive_rate
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float):
+        self.capacity = capacity
+        self.num_bits = max(8, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, fingerprint: int):
+        # Double hashing, the host-prefixed fingerprint is mixed so its bits are uniform
+        h1 = _mix64(fingerprint)
+        h2 = _mix64(h1) | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def __contains__(self, fingerprint: int) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(fingerprint))
+
+    def add(self, fingerprint: int) -> None:
+        for pos in self._positions(fingerprint):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+class ScalableBloomFilter(object):
+    """
+    Bloom filter that adds larger, stricter slices as it fills, so the overall false
+    positive rate stays below false_positive_rate however many urls are added.
+    """
+
+    def __init__(self, false_positive_rate: float = FALSE_POSITIVE_RATE, initial_capacity: int = INITIAL_CAPACITY):
+        self.false_positive_rate = false_positive_rate
+        # The rates of the slices form a geometric series summing to false_positive_rate
+        self._first_rate = false_positive_rate * (1 - TIGHTENING_RATIO)
+        self.slices = [BloomSlice(initial_capacity, self._first_rate)]
+
+    def __len__(self) -> int:
+        return sum(s.count for s in self.slices)
+
+    def __contains__(self, fingerprint: int) -> bool:
+        return any(fingerprint in s for s in self.slices)
+
+    def add(self, fingerprint: int) -> None:
+        current = self.slices[-1]
+        if current.count >= current.capacity:
+            current = BloomSlice(current.capacity * GROWTH, self._first_rate * TIGHTENING_RATIO ** len(self.slices))
+            self.slices.append(current)
+        current.add(fingerprint)
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(len(s.bits) for s in self.slices)
+
+class SeenURLFilter(object):
+    """
+    In-memory record of every url fingerprint in the frontier save file, consulted before
+    it so most repeated links are answered without a disk lookup.
+
+    EXACT keeps a set of the 64-bit fingerprints and answers every lookup from memory.
+    BLOOM keeps a scalable bloom filter: urls it has not seen are answered from memory,
+    possible repeats fall back to the save file.
+    """
+
+    def __init__(self, kind: str = EXACT, false_positive_rate: float = FALSE_POSITIVE_RATE):
+        if kind not in SEEN_FILTER_KINDS:
+            raise ValueError(f"Unknown seen url filter {kind}, expected one of {sorted(SEEN_FILTER_KINDS)}")
+        self.kind = kind
+        self.fingerprints: set[int] = set()
+        self.bloom = ScalableBloomFilter(false_positive_rate) if kind == BLOOM else None
+        self.counters = Counter()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self.bloom) if self.bloom is not None else len(self.fingerprints)
+
+    def add(self, fingerprint: int) -> None:
+        with self._lock:
+            if self.bloom is not None:
+                self.bloom.add(fingerprint)
+            else:
+                self.fingerprints.add(fingerprint)
+
+    def update(self, fingerprints) -> None:
+        """
+        Bulk load, used to rebuild the filter from the save file at startup
+        """
+        with self._lock:
+            if self.bloom is not None:
+                for fingerprint in fingerprints:
+                    self.bloom.add(fingerprint)
+            else:
+                self.fingerprints.update(fingerprints)
+
+    def is_seen(self, fingerprint: int, store) -> bool:
+        """
+        True if fingerprint is already in store, checking store only when the filter can not tell
+        """
+        with self._lock:
+            if self.bloom is None:
+                seen = fingerprint in self.fingerprints
+                self.counters["filter_hits"] += 1
+                return seen
+            if fingerprint not in self.bloom:
+                self.counters["filter_hits"] += 1
+                return False
+            self.counters["disk_fallbacks"] += 1
+
+        seen = fingerprint in store
+        if not seen:
+            with self._lock:
+                self.counters["false_positives"] += 1
+        return seen
+
+    def unseen(self, fingerprints: list[int], store) -> list[int]:
+        """
+        Returns the fingerprints that are not in store, in order, with one pass over the
+        filter and store lookups only for the ones the filter can not tell
+        """
+        with self._lock:
+            if self.bloom is None:
+                self.counters["filter_hits"] += len(fingerprints)
+                return [fingerprint for fingerprint in fingerprints if fingerprint not in self.fingerprints]
+            maybe_seen = {fingerprint for fingerprint in fingerprints if fingerprint in self.bloom}
+            self.counters["filter_hits"] += len(fingerprints) - len(maybe_seen)
+            self.counters["disk_fallbacks"] += len(maybe_seen)
+
+        false_positives = {fingerprint for fingerprint in maybe_seen if fingerprint not in store}
+        if false_positives:
+            with self._lock:
+                self.counters["false_positives"] += len(false_positives)
+        return [fingerprint for fingerprint in fingerprints
+                if fingerprint not in maybe_seen or fingerprint in false_positives]
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            stats = {"filter_hits": 0, "disk_fallbacks": 0, "false_positives": 0}
+            stats.update(self.counters)
+            stats["size"] = len(self)
+            return stats
@@ -1,37 +1,89 @@
 import re
 import hashlib
 from collections import Counter
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, compute_simhash falls back to pure Python
+    np = None
 
 THRESHOLD = 3  # Hyper-parameter (convention for near-dup threshold is 3~10)
+HASH_WIDTH = 128  # Number of bits in a token hash
+TOKEN_HASH_CACHE_SIZE = 100000  # Number of token hashes kept in the LRU cache
 
 def compute_hash_value(content: str) -> str:
     return hashlib.md5(content.encode('utf-8')).hexdigest()
 
 
+def md5_token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.md5(token.encode('utf-8')).digest(), "big")
+
+
+def blake2b_token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=HASH_WIDTH // 8).digest(), "big")
+
+
+# Token hash functions selectable with configure_token_hasher. All of them return HASH_WIDTH bit ints.
+# Switching away from md5 changes every fingerprint, so saved simhashes from a previous crawl no longer match.
+TOKEN_HASHERS = {
+    "md5": md5_token_hash,
+    "blake2b": blake2b_token_hash,
+}
+
+# Shared token -> hash cache, the same vocabulary repeats across the whole crawl
+_token_hash = lru_cache(maxsize=TOKEN_HASH_CACHE_SIZE)(md5_token_hash)
+
+
+def configure_token_hasher(name: str = "md5", cache_size: int = TOKEN_HASH_CACHE_SIZE) -> None:
+    """
+    Selects the token hash function and the capacity of its LRU cache. Clears the cache.
+    """
+    global _token_hash
+    if name not in TOKEN_HASHERS:
+        raise ValueError(f"Unknown token hasher {name}, expected one of {sorted(TOKEN_HASHERS)}")
+    _token_hash = lru_cache(maxsize=cache_size)(TOKEN_HASHERS[name])
+
+
+def token_hash_cache_stats() -> dict[str, float]:
+    """
+    Returns hits, misses, size, capacity and hit rate of the token hash cache
+    """
+    info = _token_hash.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "capacity": info.maxsize,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+    }
+
+
 def tokenize(text: str) -> list[str]:
     return re.findall(r'\b[a-zA-Z0-9]{2,}\b', text.lower())
 
 
 def compute_simhash(tokens: list[str], hashbits: int = 128) -> int: 
     """
-    Constraints: Number of entries in "sumed_weights vector" and "hashbits" must be equal; otherwise, causes Indexerror
+    Constraints: "hashbits" must not exceed the 128 bits of a token hash; otherwise, causes Indexerror
+
+    Bit i of the summed weights vector is taken from the ith most significant bit of each
+    128-bit token hash, so the fingerprint is identical for both the NumPy and pure-Python engines.
     """
+    if hashbits > HASH_WIDTH:
+        raise IndexError(f"hashbits={hashbits} exceeds the {HASH_WIDTH}-bit token hash width")
+
     token_freq_table: dict[str, int] = Counter(tokens)
 
     # Convert all {token: freq} to {token: hash_value}  # hash value is token in binary (O(n) where n is number of unique tokens)
     token_hashed: dict[str, int] = convertToHash(token_freq_table)
 
-    # Vector formed by summing weights
-    summed_weights: list[int] = [0] * hashbits  # ith index is ith bit of vector of summing weights
-
-    # Calculate summed weights
-    for index in range(len(summed_weights)):
-        for tok, hsh in token_hashed.items():
-            weight = token_freq_table[tok]  # weight = freq of token
-            if bin(hsh)[2:].zfill(128)[index] == '0':  # pad upper bits to 0
-                summed_weights[index] -= weight
-            else:  # if bit is 1
-                summed_weights[index] += weight
+    # Vector formed by summing weights, ith index is ith bit of vector of summing weights
+    if np is not None:
+        summed_weights = _summed_weights_numpy(token_hashed, token_freq_table, hashbits)
+    else:
+        summed_weights = _summed_weights_python(token_hashed, token_freq_table, hashbits)
 
     # Convert to 128-bit binary (saved as int type)
     fingerprint = sum((v > 0) << (hashbits - 1 - i) for i, v in enumerate(summed_weights))
@@ -39,12 +91,47 @@ def compute_simhash(tokens: list[str], hashbits: int = 128) -> int:
     return fingerprint
 
 
+def _summed_weights_numpy(token_hashed: dict[str, int], freq_table: dict[str, int], hashbits: int) -> list[int]:
+    """
+    Unpacks every token hash once into a (tokens x 128) bit matrix and sums the
+    +weight / -weight contributions of all tokens in a single matrix product.
+    """
+    if not token_hashed:
+        return [0] * hashbits
+
+    # Big-endian bytes keep the most significant bit first, matching bin(hsh)[2:].zfill(128)
+    hash_bytes = b"".join(hsh.to_bytes(HASH_WIDTH // 8, "big") for hsh in token_hashed.values())
+    bit_matrix = np.unpackbits(np.frombuffer(hash_bytes, dtype=np.uint8).reshape(len(token_hashed), HASH_WIDTH // 8), axis=1)
+
+    # bit 1 -> +1, bit 0 -> -1
+    signs = bit_matrix[:, :hashbits].astype(np.int64) * 2 - 1
+    weights = np.fromiter((freq_table[tok] for tok in token_hashed), dtype=np.int64, count=len(token_hashed))
+
+    return (weights @ signs).tolist()
+
+
+def _summed_weights_python(token_hashed: dict[str, int], freq_table: dict[str, int], hashbits: int) -> list[int]:
+    """
+    Fallback used when NumPy is not installed. Walks each token hash once with bit
+    shifts instead of rebuilding its binary string for every bit position.
+    """
+    summed_weights: list[int] = [0] * hashbits
+    for tok, hsh in token_hashed.items():
+        weight = freq_table[tok]  # weight = freq of token
+        for index in range(hashbits):
+            if (hsh >> (HASH_WIDTH - 1 - index)) & 1:  # if bit is 1
+                summed_weights[index] += weight
+            else:  # pad upper bits to 0
+                summed_weights[index] -= weight
+    return summed_weights
+
+
 def convertToHash(freq_table: dict[str, int]) -> dict[str, int]:
     """ Return: Dict of which keys are tokens
             and values are tokens converted in decimal hash values"""
     toReturn = dict()
     for token in freq_table.keys():
-        toReturn[token] = int(compute_hash_value(token), 16)
+        toReturn[token] = _token_hash(token)
     return toReturn
 
 
@@ -0,0 +1,98 @@
+from threading import RLock
+
+import simhash
+
+class SimHashIndex(object):
+    """
+    Multi-index over simhash fingerprints for near-duplicate lookups.
+
+    The fingerprint is split into max_distance + 1 contiguous bit bands and every band
+    is kept in its own hash table. By the pigeonhole principle two fingerprints that
+    differ in at most max_distance bits agree exactly on at least one band, so a query
+    only needs to compare against the fingerprints sharing one of its band values
+    instead of every fingerprint seen so far.
+    """
+
+    def __init__(self, max_distance: int = simhash.THRESHOLD, hashbits: int = simhash.HASH_WIDTH):
+        self.max_distance = max_distance
+        self.hashbits = hashbits
+        self.num_bands = max_distance + 1
+
+        # (shift, mask) for each band, the last band takes the leftover bits
+        band_width = hashbits // self.num_bands
+        self._bands: list[tuple[int, int]] = []
+        for band in range(self.num_bands):
+            start = band * band_width
+            width = band_width if band < self.num_bands - 1 else hashbits - start
+            self._bands.append((start, (1 << width) - 1))
+
+        self._tables: list[dict[int, list[int]]] = [dict() for _ in range(self.num_bands)]
+        self._hashes: set[int] = set()
+        self._lock = RLock()
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __contains__(self, hsh: int) -> bool:
+        return hsh in self._hashes
+
+    def __iter__(self):
+        return iter(self._hashes)
+
+    def add(self, hsh: int) -> None:
+        with self._lock:
+            if hsh in self._hashes:
+                return
+            self._hashes.add(hsh)
+            for table, (shift, mask) in zip(self._tables, self._bands):
+                table.setdefault((hsh >> shift) & mask, []).append(hsh)
+
+    def add_unless_within(self, hsh: int, k: int) -> list[tuple[int, int]]:
+        """
+        query_within and, if nothing is within k bits, add as one step, so two threads
+        can not both add fingerprints that are near duplicates of each other
+        """
+        with self._lock:
+            matches = self.query_within(hsh, k)
+            if not matches:
+                self.add(hsh)
+            return matches
+
+    def candidates(self, hsh: int) -> set[int]:
+        """
+        Fingerprints that share at least one band with hsh
+        """
+        found = set()
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            found.update(table.get((hsh >> shift) & mask, ()))
+        return found
+
+    def query_within(self, hsh: int, k: int) -> list[tuple[int, int]]:
+        """
+        Returns (distance, fingerprint) pairs for every stored fingerprint within k bits
+        of hsh, closest first. Falls back to a full scan when k is wider than the index.
+        """
+        with self._lock:
+            pool = self.candidates(hsh) if k <= self.max_distance else self._hashes
+
+            matches = []
+            for other in pool:
+                dist = simhash.calculate_hash_distance(hsh, other)
+                if dist <= k:
+                    matches.append((dist, other))
+            matches.sort()
+            return matches
+
+    def nearest(self, hsh: int) -> tuple[int, int] | None:
+        """
+        Returns the (distance, fingerprint) pair closest to hsh, or None if the index is empty
+        """
+        with self._lock:
+            matches = self.query_within(hsh, self.max_distance)
+            if matches:
+                return matches[0]
+
+            # Nothing within the indexed radius, the closest fingerprint can be anywhere
+            return min(
+                ((simhash.calculate_hash_distance(hsh, other), other) for other in self._hashes),
+                default=None)
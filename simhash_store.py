@@ -0,0 +1,104 @@
+import os
+import mmap
+import time
+from threading import Lock
+
+import simhash
+from simhash_index import SimHashIndex
+from utils import get_logger
+
+store_logger = get_logger("SIMHASH")
+
+# Every fingerprint is saved as a fixed-width big-endian record
+RECORD_SIZE = simhash.HASH_WIDTH // 8  # 16 bytes
+
+class SimHashStore(object):
+    """
+    Append-only file of simhash fingerprints backing a SimHashIndex.
+
+    The file is a flat array of RECORD_SIZE byte records, so loading it is a single
+    pass over a memory map with no unpickling. Exposes the same add / query_within /
+    nearest interface as SimHashIndex so it can stand in for it.
+    """
+
+    def __init__(self, save_path: str, restart: bool = False):
+        self.save_path = save_path
+        self.index = SimHashIndex()
+        self.load_time = 0.0
+        self._lock = Lock()
+
+        if restart and os.path.exists(save_path):
+            store_logger.info(f"Found simhash store {save_path}, deleting it.")
+            os.remove(save_path)
+
+        if os.path.exists(save_path):
+            self._load()
+
+        self._file = open(save_path, "ab")
+
+    def _load(self) -> None:
+        start = time.perf_counter()
+
+        with open(self.save_path, "rb") as f:
+            file_size = os.fstat(f.fileno()).st_size
+            usable_size = file_size - file_size % RECORD_SIZE
+
+            # mmap can not map an empty file
+            if usable_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for offset in range(0, usable_size, RECORD_SIZE):
+                        self.index.add(int.from_bytes(mm[offset:offset + RECORD_SIZE], "big"))
+
+        # A crash mid-write can leave a partial record at the end of the file
+        if usable_size != file_size:
+            store_logger.warning(
+                f"Dropping {file_size - usable_size} trailing bytes of a partial record in {self.save_path}")
+            os.truncate(self.save_path, usable_size)
+
+        self.load_time = time.perf_counter() - start
+        store_logger.info(
+            f"Loaded {len(self.index)} fingerprints ({self.size_bytes} bytes) "
+            f"from {self.save_path} in {self.load_time:.3f}s")
+
+    @property
+    def size_bytes(self) -> int:
+        return os.path.getsize(self.save_path) if os.path.exists(self.save_path) else 0
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, hsh: int) -> bool:
+        return hsh in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def _append(self, hsh: int) -> None:
+        if hsh in self.index:
+            return
+        self.index.add(hsh)
+        self._file.write(hsh.to_bytes(RECORD_SIZE, "big"))
+        self._file.flush()
+
+    def add(self, hsh: int) -> None:
+        with self._lock:
+            self._append(hsh)
+
+    def add_unless_within(self, hsh: int, k: int) -> list[tuple[int, int]]:
+        """
+        SimHashIndex.add_unless_within, the fingerprint is also appended to the file
+        """
+        with self._lock:
+            matches = self.index.query_within(hsh, k)
+            if not matches:
+                self._append(hsh)
+            return matches
+
+    def query_within(self, hsh: int, k: int) -> list[tuple[int, int]]:
+        return self.index.query_within(hsh, k)
+
+    def nearest(self, hsh: int) -> tuple[int, int] | None:
+        return self.index.nearest(hsh)
+
+    def close(self) -> None:
+        self._file.close()
@@ -0,0 +1,109 @@
+import os
+import struct
+import zlib
+from collections import deque
+
+# Items per segment file, also the size of the in-memory head and tail
+SEGMENT_SIZE = 10000
+
+# Every record is its utf-8 length followed by its utf-8 bytes
+LENGTH_PREFIX = struct.Struct(">I")
+
+SEGMENT_SUFFIX = ".seg"
+
+def encode_segment(items: list[str], compress: bool = False) -> bytes:
+    data = b"".join(
+        LENGTH_PREFIX.pack(len(encoded)) + encoded
+        for encoded in (item.encode("utf-8") for item in items))
+    return zlib.compress(data) if compress else data
+
+def decode_segment(data: bytes, compress: bool = False) -> list[str]:
+    if compress:
+        data = zlib.decompress(data)
+    items = []
+    offset = 0
+    view = memoryview(data)
+    while offset < len(data):
+        (length,) = LENGTH_PREFIX.unpack_from(data, offset)
+        offset += LENGTH_PREFIX.size
+        items.append(str(view[offset:offset + length], "utf-8"))
+        offset += length
+    return items
+
+class SegmentedQueue(object):
+    """
+    First in, first out queue of strings that keeps a bounded head and tail in memory
+    and spills everything in between to segment files on disk.
+
+    Items are read from the head and appended to the tail. A full tail is written out as
+    one length-prefixed, optionally zlib compressed segment file, and the oldest segment
+    is read back once the head runs empty, so at most two segments are held in memory.
+    """
+
+    def __init__(self, directory: str, segment_size: int = SEGMENT_SIZE, compress: bool = False):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.compress = compress
+        self.head: deque[str] = deque()
+        self.tail: list[str] = []
+        self.segments: deque[tuple[str, int]] = deque()  # (path, item count), oldest first
+        self.spilled = 0
+        self._next_segment = 0
+
+        # Segments of an earlier run are not resumed, the frontier requeues from its save file
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.endswith(SEGMENT_SUFFIX):
+                os.remove(os.path.join(directory, name))
+
+    def __len__(self) -> int:
+        return len(self.head) + len(self.tail) + self.spilled
+
+    @property
+    def resident(self) -> int:
+        return len(self.head) + len(self.tail)
+
+    def append(self, item: str) -> None:
+        if not self.segments and not self.tail and len(self.head) < self.segment_size:
+            self.head.append(item)
+            return
+
+        self.tail.append(item)
+        if len(self.tail) >= self.segment_size:
+            self._spill_tail()
+
+    def _spill_tail(self) -> None:
+        path = os.path.join(self.directory, f"{self._next_segment:08d}{SEGMENT_SUFFIX}")
+        self._next_segment += 1
+        with open(path, "wb") as f:
+            f.write(encode_segment(self.tail, self.compress))
+        self.segments.append((path, len(self.tail)))
+        self.spilled += len(self.tail)
+        self.tail = []
+
+    def popleft(self) -> str:
+        if not self.head:
+            if self.segments:
+                path, count = self.segments.popleft()
+                with open(path, "rb") as f:
+                    self.head.extend(decode_segment(f.read(), self.compress))
+                os.remove(path)
+                self.spilled -= count
+            elif self.tail:
+                self.head.extend(self.tail)
+                self.tail = []
+            else:
+                raise IndexError("pop from empty SegmentedQueue")
+        return self.head.popleft()
+
+    def stats(self) -> dict[str, int]:
+        return {"resident": self.resident, "spilled": self.spilled, "segments": len(self.segments)}
+
+    def clear(self) -> None:
+        for path, count in self.segments:
+            if os.path.exists(path):
+                os.remove(path)
+        self.head.clear()
+        self.tail = []
+        self.segments.clear()
+        self.spilled = 0
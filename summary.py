@@ -7,7 +7,9 @@ from bs4 import BeautifulSoup
 from argparse import ArgumentParser
 from configparser import ConfigParser
 
-from utils import normalize, get_logger
+from utils import normalize, get_logger, shard_path
+from utils.fingerprint import url_fingerprint
+from frontier_store import open_frontier_store, detect_backend, SHELVE
 from utils.config import Config
 from utils.download import download
 from utils.server_registration import get_cache_server
@@ -65,25 +67,69 @@ def update_token_frequency(summary_save_path: str, tokens: list[str]) -> None:
         db["token_frequencies"] = token_frequencies
         db.sync()   # force disk write
 
+def merge_summaries(source_paths: list[str], summary_save_path: str) -> None:
+    """
+    Replaces the statistics in summary_save_path with the combined statistics of
+    source_paths, the per-shard summaries of a multi-process crawl
+    """
+    page_lengths = dict()
+    token_frequencies = Counter()
+    for source_path in source_paths:
+        with shelve.open(source_path) as db:
+            page_lengths.update(db.get("page_lengths", {}))
+            token_frequencies.update(db.get("token_frequencies", Counter()))
+
+    with shelve.open(summary_save_path) as db:
+        db["page_lengths"] = page_lengths
+        db["token_frequencies"] = token_frequencies
+        db.sync()
+
+def _open_frontier(frontier_save_path: str):
+    """
+    Opens a frontier save file read-only, whichever backend wrote it
+    """
+    return open_frontier_store(frontier_save_path, detect_backend(frontier_save_path) or SHELVE, readonly=True)
+
+def _frontier_save_paths(frontier_save_path: str) -> list[str]:
+    """
+    The frontier save file of a crawl along with the save files of the shards of a
+    multi-process crawl, the ones that exist
+    """
+    paths = [frontier_save_path] if detect_backend(frontier_save_path) else []
+    shard = 0
+    while detect_backend(shard_path(frontier_save_path, shard)):
+        paths.append(shard_path(frontier_save_path, shard))
+        shard += 1
+    return paths
+
+def _frontier_values(paths: list[str]):
+    """
+    (url, completed) of every entry of the frontier save files at paths
+    """
+    for path in paths:
+        with _open_frontier(path) as db:
+            yield from db.values()
+
 def unique_pages(frontier_save_path: str) -> int:
     """
     Counts the number of unique urls crawled in the frontier database
     """
     
+    # Fingerprints of the crawled urls, a small int each instead of a whole url string
     unique_urls = set()
 
-    # check first that the path to the frontier save file exist
-    if not os.path.exists(frontier_save_path): 
+    # check first that the frontier save file, or the save files of its shards, exist
+    paths = _frontier_save_paths(frontier_save_path)
+    if not paths: 
         return None
     
-    with shelve.open(frontier_save_path, 'r') as db: 
-        for url, completed in db.values(): 
-            if completed: 
-                # There should not be a need to remove a query or fragment from url.
-                # This should have already been done in extract_next_link method.
-                # Additionally all the urls in the frontier should be uniuqe. Doing a set comparison is 
-                # another level of checking
-                unique_urls.add(url)
+    for url, completed in _frontier_values(paths): 
+        if completed: 
+            # There should not be a need to remove a query or fragment from url.
+            # This should have already been done in extract_next_link method.
+            # Additionally all the urls in the frontier should be uniuqe. Doing a set comparison is 
+            # another level of checking
+            unique_urls.add(url_fingerprint(url))
 
     return len(unique_urls) 
 
@@ -127,28 +173,50 @@ def get_common_words(summary_save_path: str, k: int) -> dict[str, int]:
         
         return filtered_words
 
+def canonical_collapse_report(frontier_save_path: str) -> dict[str, int] | None:
+    """
+    Counts how many frontier entries collapse into the same page once their urls are canonicalized,
+    None if there is no frontier save file
+    """
+    # check first that the frontier save file, or the save files of its shards, exist
+    paths = _frontier_save_paths(frontier_save_path)
+    if not paths:
+        return None
+
+    canonical_fingerprints = set()
+    entries = 0
+    for url, completed in _frontier_values(paths):
+        entries += 1
+        canonical_fingerprints.add(url_fingerprint(url))
+
+    return {
+        "entries": entries,
+        "canonical_urls": len(canonical_fingerprints),
+        "collapsed": entries - len(canonical_fingerprints),
+    }
+
 def ics_subdomains(frontier_save_path: str) -> dict[str, int]:
     """
     Counts all the subdomains of ics.uci.edu
     """
     subdomains = {}
 
-    # check first that the path to the frontier save file exist
-    if not os.path.exists(frontier_save_path): 
+    # check first that the frontier save file, or the save files of its shards, exist
+    paths = _frontier_save_paths(frontier_save_path)
+    if not paths: 
         return None
     
-    with shelve.open(frontier_save_path, 'r') as db: 
-        for url, completed in db.values(): 
-            if completed: 
-                parsed_url = urlparse(url)
-                # base_url = normalize(parsed_url._replace(query="", fragment="").geturl())
-                subdomain = parsed_url.netloc
-                url_key = subdomain.removeprefix("http:").lstrip("\w.")
-                if "ics.uci.edu" in url_key and url_key != "informatics.uci.edu":
-                    if url_key in subdomains:
-                        subdomains[url_key] += 1
-                    else:
-                        subdomains[url_key] = 1
+    for url, completed in _frontier_values(paths): 
+        if completed: 
+            parsed_url = urlparse(url)
+            # base_url = normalize(parsed_url._replace(query="", fragment="").geturl())
+            subdomain = parsed_url.netloc
+            url_key = subdomain.removeprefix("http:").lstrip("\w.")
+            if "ics.uci.edu" in url_key and url_key != "informatics.uci.edu":
+                if url_key in subdomains:
+                    subdomains[url_key] += 1
+                else:
+                    subdomains[url_key] = 1
 
     return dict(sorted(subdomains.items()))
 
@@ -170,6 +238,12 @@ if __name__ == "__main__":
     for word, count in get_common_words('summary.shelve',50):
         print(f"\t{word} - {count}")
 
+    # Canonicalization
+    report = canonical_collapse_report('frontier.shelve')
+    if report:
+        print(f"Canonicalization collapses {report['collapsed']} of {report['entries']} frontier entries "
+              f"into {report['canonical_urls']} urls")
+
     # ICS subdomains
     print(f"ICS Subdomains:")
     for key, value in ics_subdomains('frontier.shelve').items():
@@ -1,21 +1,68 @@
+import asyncio
+import dbm
+import dbm.dumb
+import http.server
+import os
+import pickle
+import queue
+import random
+import shelve
+import tempfile
+import threading
+import time
+import types
+import multiprocessing
 import unittest
 from unittest.mock import patch, MagicMock
+import cbor
 from bs4 import BeautifulSoup
+from collections import Counter
+from urllib.parse import urlparse, parse_qs
 
 import simhash
+import simhash_index
+import simhash_store
 import robots
 import scraper
 import summary
+import page_analysis
+import url_validator
+import content_sniffer
+import ingestion_budget
+import frontier_store
+import seen_filter
+import url_priority
+import spill_queue
+import host_health
+import crawler.frontier
+import crawler.sharded
+import crawler.async_crawler
+import crawler.pipeline
+import utils.download
 from crawler.frontier import Frontier
+from utils import canonicalize, get_urlhash
+from utils.fingerprint import url_fingerprint, fingerprint_key
 from crawler.worker import Worker
+from utils.response import Response
 
 class MockConfig: 
     def __init__(self, seeds):
         self.user_agent = "IR UW25 47642149"
         self.cache_server = ("localhost", 8000)
         self.save_file = "test_crawler"
+        self.frontier_backend = "shelve"
+        self.max_resident_urls = 0
+        self.spill_compress = False
+        self.seen_filter = "exact"
+        self.seen_filter_error = 0.001
         self.seed_urls = seeds
         self.time_delay = 0.5
+        self.frontier_order = "lifo"
+        self.priority_weights = ""
+        self.max_retries = 3
+        self.retry_delay = 2.0
+        self.breaker_failures = 5
+        self.breaker_cooldown = 300.0
         self.thread_count = 1
         self.cache_server = None
 
@@ -30,6 +77,17 @@ class MockResponse:
             self.headers = {}
             self.content = content
 
+class FakeClock:
+    """Stands in for time.monotonic / time.sleep, sleeping advances the clock instantly."""
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
 class MockRawResponse: 
     def __init__(self, content):
         self.content = content
@@ -38,11 +96,245 @@ class TestCrawler(unittest.TestCase):
     def setUp(self): 
         pass
 
+class TestAsyncCrawler(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.config = MockConfig(["https://www.ics.uci.edu/0"])
+        self.config.save_file = os.path.join(tmp_dir.name, "frontier.shelve")
+        self.config.time_delay = 0.01
+        self.config.threads_count = 2
+        self.config.async_fetches = 4
+
+    def test_crawls_every_page_with_concurrent_downloads(self):
+        in_flight = []
+        most_in_flight = []
+
+        async def download_async(url, config, logger=None):
+            in_flight.append(url)
+            most_in_flight.append(len(in_flight))
+            await asyncio.sleep(0.05)
+            in_flight.remove(url)
+            return MockResponse(url, 200, b"")
+
+        hosts = ["www.ics.uci.edu", "www.cs.uci.edu", "www.stat.uci.edu", "www.informatics.uci.edu"]
+        def scrape(url, resp):
+            page = int(url.rsplit("/", 1)[1])
+            return [f"https://{host}/{page + 1}" for host in hosts] if page < 2 else []
+
+        with patch("utils.download.download_async", side_effect=download_async), \
+                patch("scraper.scraper", side_effect=scrape), \
+                patch("crawler.frontier.seed_frontier_from_sitemap", return_value=[]):
+            async_crawler = crawler.async_crawler.AsyncCrawler(self.config, restart=True)
+            self.addCleanup(async_crawler.frontier.save.close)
+            async_crawler.start()
+
+        save = async_crawler.frontier.save
+        self.assertEqual(len(save), 9)
+        self.assertTrue(all(completed for url, completed in save.values()))
+        self.assertLessEqual(max(most_in_flight), 4)
+        self.assertGreater(max(most_in_flight), 1)
+
+    def test_download_async(self):
+        payload = cbor.dumps({"url": "https://www.ics.uci.edu/", "status": 200})
+        requests_seen = []
+
+        async def handle(reader, writer):
+            requests_seen.append((await reader.readline()).decode())
+            while (await reader.readline()).strip():
+                pass
+            # A chunked body split in two chunks
+            half = len(payload) // 2
+            writer.write(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n")
+            for chunk in (payload[:half], payload[half:]):
+                writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+            writer.close()
+
+        async def fetch():
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            async with server:
+                self.config.cache_server = ("127.0.0.1", server.sockets[0].getsockname()[1])
+                resp = await utils.download.download_async("https://www.ics.uci.edu/", self.config, MagicMock())
+                utils.download.close_async_pool()
+                return resp
+
+        resp = asyncio.run(fetch())
+        self.assertEqual((resp.url, resp.status), ("https://www.ics.uci.edu/", 200))
+        self.assertIn("q=https%3A%2F%2Fwww.ics.uci.edu%2F", requests_seen[0])
+
+    def test_download_async_reuses_connections(self):
+        connections = []
+
+        async def handle(reader, writer):
+            connections.append(writer)
+            # Serves requests on the connection until the client closes it
+            while (request_line := await reader.readline()):
+                while (await reader.readline()).strip():
+                    pass
+                url = parse_qs(urlparse(request_line.split()[1].decode()).query)["q"][0]
+                body = cbor.dumps({"url": url, "status": 200})
+                writer.write(f"HTTP/1.1 200 OK\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+                await writer.drain()
+            writer.close()
+
+        async def fetch():
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            async with server:
+                self.config.cache_server = ("127.0.0.1", server.sockets[0].getsockname()[1])
+                responses = [await utils.download.download_async(f"https://www.ics.uci.edu/{page}", self.config, MagicMock())
+                             for page in range(3)]
+                # An idle connection the server dropped is replaced
+                connections[0].close()
+                await asyncio.sleep(0.05)
+                responses.append(await utils.download.download_async("https://www.ics.uci.edu/3", self.config, MagicMock()))
+                stats = utils.download.async_pool().stats()
+                utils.download.close_async_pool()
+                return responses, stats
+
+        responses, stats = asyncio.run(fetch())
+        self.assertEqual([resp.url for resp in responses], [f"https://www.ics.uci.edu/{page}" for page in range(4)])
+        self.assertEqual(len(connections), 2)
+        self.assertEqual((stats["opened"], stats["reused"]), (2, 2))
+
+class TestPipelineCrawler(unittest.TestCase):
+    HOSTS = ["www.ics.uci.edu", "www.cs.uci.edu", "www.stat.uci.edu"]
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.config = MockConfig(["https://www.ics.uci.edu/0"])
+        self.config.save_file = os.path.join(tmp_dir.name, "frontier.shelve")
+        self.config.time_delay = 0.01
+        self.config.threads_count = 2
+        self.config.parse_processes = 2
+        self.config.pipeline_queue_size = 2
+        self.config.token_hasher = "md5"
+        self.config.token_hash_cache_size = 1000
+        self.config.page_parser = "soup"
+        self.config.max_page_bytes = 2000000
+        self.config.skip_page_bytes = 10000000
+        self.config.max_page_tokens = 100000
+        self.config.max_page_links = 1000
+
+    def _download(self, url, config, logger=None):
+        page = int(url.rsplit("/", 1)[1])
+        links = "".join(f'<a href="https://{host}/{page + 1}">next</a>' for host in self.HOSTS) if page < 2 else ""
+        # Every page has its own words so none is a near duplicate of another
+        words = " ".join(f"{urlparse(url).netloc.split('.')[1]}{page}word{i}" for i in range(30))
+        raw_response = types.SimpleNamespace(
+            url=url, headers={"Content-Type": "text/html"},
+            content=f"<html><body><p>{words}</p>{links}</body></html>".encode())
+        return Response({"url": url, "status": 200, "response": pickle.dumps(raw_response)})
+
+    def test_crawls_every_page_through_the_stages(self):
+        # Each page has 30 words, so the token limit is hit in the parsing processes
+        self.config.max_page_tokens = 20
+        with patch("utils.download.download", side_effect=self._download), \
+                patch("scraper.is_valid", return_value=True), \
+                patch("scraper.visited_content_simhashes", simhash_index.SimHashIndex()), \
+                patch("scraper.summary_save_path", os.path.join(self.tmp_dir, "summary.shelve")), \
+                patch("crawler.frontier.seed_frontier_from_sitemap", return_value=[]):
+            pipeline = crawler.pipeline.PipelineCrawler(self.config, restart=True)
+            self.addCleanup(pipeline.frontier.save.close)
+            with patch.object(pipeline.frontier, "get_tbd_url", wraps=pipeline.frontier.get_tbd_url) as get_tbd_url:
+                pipeline.start()
+
+        # Fetchers wait for pages still in the pipeline instead of polling the empty frontier
+        self.assertLess(get_tbd_url.call_count, 100)
+        save = pipeline.frontier.save
+        self.assertEqual(len(save), 7)
+        self.assertTrue(all(completed for url, completed in save.values()))
+        with shelve.open(os.path.join(self.tmp_dir, "summary.shelve")) as db:
+            self.assertEqual(len(db["page_lengths"]), 7)
+
+        stats = pipeline.stats()
+        self.assertEqual(stats["pending"], 0)
+        self.assertEqual((stats["responses"]["depth"], stats["parsed"]["depth"]), (0, 0))
+        self.assertLessEqual(stats["responses"]["high_water"], 2)
+        self.assertLessEqual(stats["parsed"]["high_water"], 2)
+
+        # Counted in the parsing processes and added up by the writer
+        parse_stats = pipeline.parse_stats()
+        self.assertEqual(parse_stats["ingestion_budget"], {ingestion_budget.TRUNCATED_TOKENS: 7})
+        self.assertGreater(parse_stats["token_hash_cache"]["misses"], 0)
+
+    def test_stage_queue_records_backpressure(self):
+        stage_queue = crawler.pipeline.StageQueue(1)
+        stage_queue.put("first")
+        threading.Timer(0.05, stage_queue.get).start()
+        stage_queue.put("second")
+        stats = stage_queue.stats()
+        self.assertEqual((stats["depth"], stats["high_water"]), (1, 1))
+        self.assertGreater(stats["blocked_seconds"], 0)
+
+class TestDownloadClient(unittest.TestCase):
+    def setUp(self):
+        self.connections = set()
+        self.delay = 0
+        test = self
+
+        class CacheHandler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                test.connections.add(self.client_address)
+                time.sleep(test.delay)
+                query = parse_qs(urlparse(self.path).query)
+                body = cbor.dumps({"url": query["q"][0], "status": 200})
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client timed out
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), CacheHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        self.config = MockConfig([])
+        self.config.cache_server = server.server_address
+        self.addCleanup(utils.download.configure_client, 1)
+
+    def test_connections_are_kept_alive(self):
+        utils.download.configure_client(2)
+        for i in range(5):
+            resp = utils.download.download(f"https://www.ics.uci.edu/{i}", self.config, MagicMock())
+            self.assertEqual((resp.url, resp.status), (f"https://www.ics.uci.edu/{i}", 200))
+        self.assertEqual(len(self.connections), 1)
+
+        stats = utils.download.client.stats()
+        self.assertEqual((stats["requests"], stats["failures"]), (5, 0))
+        self.assertLessEqual(stats["p50_seconds"], stats["max_seconds"])
+
+    def test_read_timeout_fails_the_download(self):
+        utils.download.configure_client(1, connect_timeout=1, read_timeout=0.05)
+        self.delay = 0.5
+        logger = MagicMock()
+        resp = utils.download.download("https://www.ics.uci.edu/", self.config, logger)
+        self.assertEqual(resp.status, utils.download.NO_RESPONSE_STATUS)
+        self.assertIsNotNone(resp.error)
+        logger.error.assert_called_once()
+        self.assertEqual(utils.download.client.stats()["failures"], 1)
+
 class TestWorker(unittest.TestCase):
     def setUp(self): 
         self.config = MockConfig([])
         self.frontier = Frontier(self.config, restart=True)
 
+        # Pages from other tests must not be detected as duplicate content
+        simhashes_patch = patch("scraper.visited_content_simhashes", simhash_index.SimHashIndex())
+        simhashes_patch.start()
+        self.addCleanup(simhashes_patch.stop)
+
     @patch("utils.download.download")
     def test_worker_run(self, mock_download):
         """Tests that Worker.run() correctly processes URLs and marks them complete."""
@@ -59,8 +351,9 @@ class TestWorker(unittest.TestCase):
         # Mock the Frontier methods
         mock_frontier = MagicMock(spec=Frontier)
         mock_frontier.get_tbd_url.side_effect = [url, None]
-        mock_frontier.add_url = MagicMock()
+        mock_frontier.add_urls = MagicMock()
         mock_frontier.mark_url_complete = MagicMock()
+        mock_frontier.retry_later.return_value = False
 
         mock_download.return_value = resp
 
@@ -72,7 +365,7 @@ class TestWorker(unittest.TestCase):
 
         # Assertions
         self.assertEqual(mock_download.call_count, 1)
-        mock_frontier.add_url.assert_called_with("https://www.ics.uci.edu/page2")  # Link extraction check
+        mock_frontier.add_urls.assert_called_with(["https://www.ics.uci.edu/page2"], parent=url)  # Link extraction check
         mock_frontier.mark_url_complete.assert_called_with("https://www.ics.uci.edu/page1")  # URL processed check
 
     @patch("utils.download.download")
@@ -108,11 +401,71 @@ class TestWorker(unittest.TestCase):
         worker = Worker(worker_id=1, config=self.config, frontier=frontier)
 
         # Run the worker in the main thread (not as a daemon)
-        worker.run()
+        clock = FakeClock()
+        mock_sleep.side_effect = clock.sleep
+        with patch("time.monotonic", side_effect=clock.monotonic):
+            worker.run()
 
         # Assertions
         mock_sleep.assert_called_with(self.config.time_delay) 
 
+    @patch("utils.download.download")
+    @patch("time.sleep")
+    def test_worker_retries_failed_download(self, mock_sleep, mock_download):
+        url = "https://www.ics.uci.edu/flaky"
+        mock_download.side_effect = [
+            MockResponse(url, 503, b""),
+            MockResponse(url, 200, "<html><body><p>Back up</p></body></html>")]
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.config.save_file = os.path.join(tmp_dir.name, "frontier.shelve")
+        frontier = Frontier(self.config, restart=True)
+        self.addCleanup(frontier.save.close)
+        frontier.add_url(url)
+
+        clock = FakeClock()
+        mock_sleep.side_effect = clock.sleep
+        with patch("time.monotonic", side_effect=clock.monotonic), \
+                patch("scraper.visited_content_simhashes", simhash_index.SimHashIndex()), \
+                patch("summary.update_token_frequency"), patch("summary.update_page_lengths"):
+            Worker(worker_id=1, config=self.config, frontier=frontier).run()
+
+        self.assertEqual(mock_download.call_count, 2)
+        # The host was held back RETRYDELAY seconds before the retry
+        mock_sleep.assert_called_once_with(self.config.retry_delay)
+        self.assertEqual(frontier.save[url_fingerprint(url)], (url, True))
+        self.assertEqual(frontier.host_health.stats()["retries"], 1)
+
+    @patch("utils.download.download")
+    @patch("time.sleep")
+    def test_worker_gives_up_after_max_retries(self, mock_sleep, mock_download):
+        url = "https://www.ics.uci.edu/down"
+        mock_download.return_value = MockResponse(url, 503, b"")
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.config.save_file = os.path.join(tmp_dir.name, "frontier.shelve")
+        frontier = Frontier(self.config, restart=True)
+        self.addCleanup(frontier.save.close)
+        frontier.add_url(url)
+
+        clock = FakeClock()
+        mock_sleep.side_effect = clock.sleep
+        with patch("time.monotonic", side_effect=clock.monotonic), \
+                patch.object(frontier, "mark_url_complete", wraps=frontier.mark_url_complete) as mark_url_complete, \
+                patch.object(frontier.to_be_downloaded, "append", wraps=frontier.to_be_downloaded.append) as append:
+            Worker(worker_id=1, config=self.config, frontier=frontier).run()
+
+        # The first download and one per retry, then the url is completed once and never queued again
+        self.assertEqual(mock_download.call_count, self.config.max_retries + 1)
+        self.assertEqual(append.call_count, self.config.max_retries)
+        mark_url_complete.assert_called_once_with(url)
+        self.assertEqual(len(frontier.to_be_downloaded), 0)
+        self.assertEqual(frontier.in_flight_count(), 0)
+        self.assertEqual(frontier.save[url_fingerprint(url)], (url, True))
+        self.assertEqual(frontier.host_health.stats()["gave_up"], 1)
+
     @patch("utils.download.download")
     def test_circular_link_trap_detection(self, mock_download):
         html_content_1 = '''
@@ -188,6 +541,782 @@ class TestFrontier(unittest.TestCase):
     def test_seed_with_site_map(self):
         self.assertTrue(False)
 
+    def test_frontier_canonicalizes_urls(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.config.save_file = os.path.join(tmp_dir.name, "frontier.shelve")
+        frontier = Frontier(self.config, restart=True)
+
+        frontier.add_url("https://www.ics.uci.edu/~thornton/index.html")
+        frontier.add_url("HTTP://WWW.ICS.UCI.EDU:80//%7Ethornton/")
+        frontier.add_url("https://www.ics.uci.edu/~thornton/./inf45/../")
+
+        self.assertEqual(frontier.get_tbd_url(), "https://www.ics.uci.edu/~thornton")
+        self.assertIsNone(frontier.get_tbd_url())
+        frontier.save.close()
+
+    def _temp_frontier(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.config.save_file = os.path.join(tmp_dir.name, "frontier.shelve")
+        frontier = Frontier(self.config, restart=True)
+        self.addCleanup(frontier.save.close)
+        return frontier
+
+    def test_waiting_get_stops_when_last_url_completes(self):
+        frontier = self._temp_frontier()
+        frontier.add_url("https://www.ics.uci.edu/parent")
+        self.assertEqual(frontier.get_tbd_url(), "https://www.ics.uci.edu/parent")
+
+        received = []
+        waiter = threading.Thread(target=lambda: received.append(frontier.get_tbd_url(timeout=5)))
+        waiter.start()
+        waiter.join(0.1)
+        self.assertTrue(waiter.is_alive())
+
+        # The parent page had no new links: the queue is empty and nothing is in flight
+        frontier.mark_url_complete("https://www.ics.uci.edu/parent")
+        waiter.join(5)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(received, [None])
+
+    def test_get_returns_url_added_while_waiting(self):
+        frontier = self._temp_frontier()
+        frontier.add_url("https://www.ics.uci.edu/parent")
+        self.assertEqual(frontier.get_tbd_url(), "https://www.ics.uci.edu/parent")
+
+        received = []
+        waiter = threading.Thread(target=lambda: received.append(frontier.get_tbd_url(timeout=5)))
+        waiter.start()
+
+        # While the main thread's url is in flight the waiter blocks instead of stopping
+        waiter.join(0.1)
+        self.assertTrue(waiter.is_alive())
+
+        frontier.add_url("https://www.ics.uci.edu/child")
+        waiter.join(5)
+        self.assertEqual(received, ["https://www.ics.uci.edu/child"])
+
+        frontier.mark_url_complete("https://www.ics.uci.edu/parent")
+        self.assertEqual(frontier.in_flight_count(), 1)
+
+    def test_get_times_out(self):
+        frontier = self._temp_frontier()
+        frontier.add_url("https://www.ics.uci.edu/parent")
+        self.assertEqual(frontier.get_tbd_url(), "https://www.ics.uci.edu/parent")
+
+        # Another thread's url stays in flight, so only the timeout ends the wait
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(frontier.get_tbd_url(timeout=0.05)))
+        waiter.start()
+        waiter.join(5)
+        self.assertEqual(results, [None])
+        self.assertEqual(frontier.in_flight_count(), 1)
+
+    @patch("time.sleep")
+    def test_get_waiting_for_parked_host_times_out(self, mock_sleep):
+        frontier = self._temp_frontier()
+        frontier.add_url("https://www.ics.uci.edu/page")
+        clock = FakeClock()
+        with patch("time.monotonic", side_effect=clock.monotonic):
+            frontier.to_be_downloaded.defer("www.ics.uci.edu", clock.now + self.config.breaker_cooldown)
+
+            def sleep(seconds):
+                # Nothing counts as dispatching while the url's host is parked
+                self.assertEqual(frontier.in_flight_count(), 0)
+                clock.sleep(seconds)
+            mock_sleep.side_effect = sleep
+
+            self.assertIsNone(frontier.get_tbd_url(timeout=0.5))
+        mock_sleep.assert_called_once_with(0.5)
+        self.assertEqual(len(frontier.to_be_downloaded), 1)
+
+    def test_add_urls_returns_new_count(self):
+        frontier = self._temp_frontier()
+        frontier.add_url("https://www.ics.uci.edu/parent")
+        parent = frontier.get_tbd_url()
+
+        with patch.object(frontier.save, "add_many", wraps=frontier.save.add_many) as mock_add_many:
+            added = frontier.add_urls([
+                "https://www.ics.uci.edu/a",
+                "https://www.ics.uci.edu/a/index.html",  # same page as the one above
+                "https://www.ics.uci.edu/b",
+                "https://www.ics.uci.edu/parent",        # already seen
+            ], parent=parent)
+        self.assertEqual(added, 2)
+        mock_add_many.assert_called_once()
+        self.assertEqual(len(frontier.to_be_downloaded), 2)
+
+        self.assertEqual(frontier.add_urls(["https://www.ics.uci.edu/b"], parent=parent), 0)
+        self.assertEqual(frontier.add_urls([], parent=parent), 0)
+
+    def test_add_urls_depth_below_parent(self):
+        self.config.frontier_backend = "sqlite"
+        frontier = self._temp_frontier()
+        frontier.add_url("https://www.ics.uci.edu/parent")
+        parent = frontier.get_tbd_url()
+
+        frontier.add_urls(["https://www.ics.uci.edu/child"], parent=parent)
+        frontier.add_urls(["https://www.ics.uci.edu/grandchild"], parent="https://www.ics.uci.edu/child")
+        self.assertEqual(frontier.save.depth(url_fingerprint("https://www.ics.uci.edu/child")), 1)
+        self.assertEqual(frontier.save.depth(url_fingerprint("https://www.ics.uci.edu/grandchild")), 2)
+
+    def test_completed_url_is_no_longer_in_flight(self):
+        frontier = self._temp_frontier()
+        frontier.add_url("https://www.ics.uci.edu/page")
+        url = frontier.get_tbd_url()
+        self.assertEqual(frontier.in_flight_count(), 1)
+        frontier.mark_url_complete(url)
+        self.assertEqual(frontier.in_flight_count(), 0)
+        self.assertIsNone(frontier.get_tbd_url(timeout=5))
+
+    def test_try_get_url_tracks_urls_in_flight(self):
+        self.config.frontier_backend = "sqlite"
+        frontier = self._temp_frontier()
+        frontier.add_urls(["https://www.ics.uci.edu/a", "https://www.cs.uci.edu/b"])
+        first, second = frontier.try_get_url(), frontier.try_get_url()
+        self.assertEqual({first, second}, {"https://www.ics.uci.edu/a", "https://www.cs.uci.edu/b"})
+        self.assertIsNone(frontier.try_get_url())
+        self.assertEqual(frontier.in_flight_count(), 2)
+
+        # Completed from another thread, urls found on it are one level deeper
+        completer = threading.Thread(target=lambda: (
+            frontier.add_urls(["https://www.ics.uci.edu/c"], parent=first), frontier.mark_url_complete(first)))
+        completer.start()
+        completer.join(5)
+        self.assertEqual(frontier.save.depth(url_fingerprint("https://www.ics.uci.edu/c")), 1)
+        self.assertEqual(frontier.in_flight_count(), 1)
+
+        frontier.release_url(second)
+        self.assertEqual(frontier.in_flight_count(), 0)
+        self.assertFalse(frontier.save[url_fingerprint(second)][1])
+
+    def test_try_get_url_skips_invalid_resumed_url(self):
+        frontier = self._temp_frontier()
+        frontier.add_urls(["https://www.ics.uci.edu/a"])
+        frontier.unvalidated.add(url_fingerprint("https://www.ics.uci.edu/a"))
+        with patch("crawler.frontier.is_valid", return_value=False):
+            self.assertIsNone(frontier.try_get_url())
+        self.assertEqual(frontier.in_flight_count(), 0)
+
+class TestShardedFrontier(unittest.TestCase):
+    # www.ics.uci.edu hashes to shard 0 and www.informatics.uci.edu to shard 1 of 2
+    ICS = "https://www.ics.uci.edu"
+    INFORMATICS = "https://www.informatics.uci.edu"
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.inboxes = [queue.Queue(), queue.Queue()]
+        self.work = multiprocessing.Value("q", 0)
+
+    def _shard_frontier(self, shard):
+        config = MockConfig([])
+        config.save_file = os.path.join(self.tmp_dir, "frontier.shelve")
+        config.simhash_save_file = os.path.join(self.tmp_dir, "simhash.store")
+        config = crawler.sharded.shard_config(config, shard, len(self.inboxes))
+        frontier = crawler.sharded.ShardFrontier(config, True, shard, self.inboxes, self.work)
+        self.addCleanup(frontier.save.close)
+        return frontier
+
+    def test_shard_of_partitions_by_host(self):
+        self.assertEqual(crawler.sharded.shard_of(f"{self.ICS}/a", 2), 0)
+        self.assertEqual(crawler.sharded.shard_of(f"{self.ICS}/b/c?d=1", 2), 0)
+        self.assertEqual(crawler.sharded.shard_of(f"{self.INFORMATICS}/a", 2), 1)
+        # Canonical variants of a url belong to the same shard
+        self.assertEqual(crawler.sharded.shard_of("HTTP://WWW.INFORMATICS.UCI.EDU:80/a#top", 2), 1)
+
+    def test_shard_config(self):
+        config = MockConfig([f"{self.ICS}/", f"{self.INFORMATICS}/"])
+        config.simhash_save_file = "simhash.store"
+        shard_config = crawler.sharded.shard_config(config, 1, 2)
+        self.assertEqual(shard_config.seed_urls, [f"{self.INFORMATICS}/"])
+        self.assertEqual(shard_config.save_file, "test_crawler.shard1")
+        self.assertEqual(shard_config.simhash_save_file, "simhash.store.shard1")
+        self.assertEqual(config.save_file, "test_crawler")
+
+    def test_links_to_other_shards_are_routed(self):
+        frontier = self._shard_frontier(0)
+        added = frontier.add_urls([f"{self.ICS}/a", f"{self.INFORMATICS}/a", f"{self.INFORMATICS}/b"])
+        self.assertEqual(added, 1)
+        self.assertEqual(len(frontier.to_be_downloaded), 1)
+        self.assertTrue(self.inboxes[0].empty())
+        self.assertEqual(self.inboxes[1].get_nowait(), [f"{self.INFORMATICS}/a", f"{self.INFORMATICS}/b"])
+        # One queued url and one batch in transit
+        self.assertEqual(self.work.value, 2)
+
+    def test_crawl_ends_when_no_shard_has_work(self):
+        sender = self._shard_frontier(0)
+        receiver = self._shard_frontier(1)
+        sender.add_urls([f"{self.INFORMATICS}/a"])
+        self.assertEqual(receiver.receive(self.inboxes[1].get_nowait()), 1)
+        self.assertEqual(self.work.value, 1)
+
+        # The sender has nothing queued, but keeps waiting while the receiver has work
+        received = []
+        waiter = threading.Thread(target=lambda: received.append(sender.get_tbd_url()))
+        waiter.start()
+        waiter.join(0.1)
+        self.assertTrue(waiter.is_alive())
+
+        url = receiver.get_tbd_url()
+        self.assertEqual(url, f"{self.INFORMATICS}/a")
+        receiver.mark_url_complete(url)
+        self.assertEqual(self.work.value, 0)
+        waiter.join(5)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(received, [None])
+        self.assertIsNone(receiver.get_tbd_url())
+
+class TestFrontierResume(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.config = MockConfig([])
+        self.config.save_file = os.path.join(tmp_dir.name, "frontier.shelve")
+
+    def _crawl_one_of_three(self):
+        frontier = Frontier(self.config, restart=True)
+        for page in ["a", "b", "c"]:
+            frontier.add_url(f"https://www.ics.uci.edu/{page}")
+        frontier.mark_url_complete("https://www.ics.uci.edu/a")
+        frontier.save.close()
+
+    def test_restart_removes_a_dumb_dbm_save_file(self):
+        with patch.object(dbm, "_defaultmod", dbm.dumb):
+            self._crawl_one_of_three()
+            self.assertFalse(os.path.exists(self.config.save_file))
+            self.assertTrue(os.path.exists(self.config.save_file + ".dat"))
+            self.assertTrue(os.path.exists(self.config.save_file + frontier_store.PENDING_JOURNAL_SUFFIX))
+
+            frontier = Frontier(self.config, restart=True)
+            self.addCleanup(frontier.save.close)
+        self.assertEqual(len(frontier.save), 0)
+        self.assertEqual(len(frontier.to_be_downloaded), 0)
+        self.assertEqual(list(frontier.save.pending()), [])
+
+    @patch("crawler.frontier.is_valid", return_value=True)
+    def test_resume_defers_validation_to_dispatch(self, mock_is_valid):
+        self._crawl_one_of_three()
+
+        frontier = Frontier(self.config, restart=False)
+        self.addCleanup(frontier.save.close)
+        self.assertEqual(len(frontier.to_be_downloaded), 2)
+        mock_is_valid.assert_not_called()
+
+        frontier.get_tbd_url()
+        mock_is_valid.assert_called_once()
+
+    @patch("crawler.frontier.is_valid", side_effect=lambda url: not url.endswith("/c"))
+    def test_invalid_resumed_url_is_skipped_at_dispatch(self, mock_is_valid):
+        self._crawl_one_of_three()
+
+        frontier = Frontier(self.config, restart=False)
+        self.addCleanup(frontier.save.close)
+        self.assertEqual(frontier.get_tbd_url(), "https://www.ics.uci.edu/b")
+        self.assertIsNone(frontier.get_tbd_url())
+
+    @patch("crawler.frontier.is_valid", side_effect=lambda url: not url.endswith("/c"))
+    def test_invalid_resumed_url_is_not_resumed_again(self, mock_is_valid):
+        self._crawl_one_of_three()
+
+        frontier = Frontier(self.config, restart=False)
+        self.assertEqual(frontier.get_tbd_url(), "https://www.ics.uci.edu/b")
+        self.assertIsNone(frontier.get_tbd_url(timeout=0))
+        frontier.save.close()
+
+        frontier = Frontier(self.config, restart=False)
+        self.addCleanup(frontier.save.close)
+        self.assertEqual([url for fingerprint, url in frontier.save.pending()], ["https://www.ics.uci.edu/b"])
+        self.assertEqual(len(frontier.to_be_downloaded), 1)
+
+    def test_resume_reads_pending_journal_without_scanning_shelve(self):
+        self._crawl_one_of_three()
+
+        with patch.object(frontier_store.ShelveFrontierStore, "items", side_effect=AssertionError("scanned")):
+            store = frontier_store.ShelveFrontierStore(self.config.save_file)
+            self.addCleanup(store.close)
+            self.assertEqual(sorted(url for fingerprint, url in store.pending()),
+                             ["https://www.ics.uci.edu/b", "https://www.ics.uci.edu/c"])
+
+    def test_resume_without_journal_scans_shelve_once(self):
+        with shelve.open(self.config.save_file) as db:
+            db[fingerprint_key(url_fingerprint("https://www.ics.uci.edu/a"))] = ("https://www.ics.uci.edu/a", True)
+            db[fingerprint_key(url_fingerprint("https://www.ics.uci.edu/b"))] = ("https://www.ics.uci.edu/b", False)
+
+        store = frontier_store.ShelveFrontierStore(self.config.save_file)
+        self.assertEqual([url for fingerprint, url in store.pending()], ["https://www.ics.uci.edu/b"])
+        store.close()
+
+        with open(self.config.save_file + frontier_store.PENDING_JOURNAL_SUFFIX) as f:
+            self.assertEqual(f.read(), f"+{fingerprint_key(url_fingerprint('https://www.ics.uci.edu/b'))} https://www.ics.uci.edu/b\n")
+
+    def test_resume_rekeys_sha256_save_file(self):
+        with shelve.open(self.config.save_file) as db:
+            db[get_urlhash("https://www.ics.uci.edu/a")] = ("https://www.ics.uci.edu/a", True)
+            db[get_urlhash("https://www.ics.uci.edu/b")] = ("https://www.ics.uci.edu/b", False)
+
+        frontier = Frontier(self.config, restart=False)
+        self.addCleanup(frontier.save.close)
+        self.assertEqual(sorted(frontier.save.keys()),
+                         sorted(url_fingerprint(url) for url in ["https://www.ics.uci.edu/a", "https://www.ics.uci.edu/b"]))
+        self.assertEqual(len(frontier.to_be_downloaded), 1)
+        frontier.add_url("https://www.ics.uci.edu/a")
+        self.assertEqual(len(frontier.to_be_downloaded), 1, "Completed url saved under its sha256 hash is still known")
+
+    def test_read_only_shelve_store(self):
+        self._crawl_one_of_three()
+        journal_path = self.config.save_file + frontier_store.PENDING_JOURNAL_SUFFIX
+        with open(journal_path) as f:
+            journal = f.read()
+
+        store = frontier_store.open_frontier_store(self.config.save_file, readonly=True)
+        self.addCleanup(store.close)
+        self.assertEqual(sorted(url for fingerprint, url in store.pending()),
+                         ["https://www.ics.uci.edu/b", "https://www.ics.uci.edu/c"])
+        self.assertEqual(store.upgrade_legacy_keys(), 0)
+        with open(journal_path) as f:
+            self.assertEqual(f.read(), journal, "A read-only store leaves the journal as it is")
+
+    def test_read_only_shelve_store_can_not_rekey(self):
+        with shelve.open(self.config.save_file) as db:
+            db[get_urlhash("https://www.ics.uci.edu/a")] = ("https://www.ics.uci.edu/a", False)
+
+        store = frontier_store.open_frontier_store(self.config.save_file, readonly=True)
+        self.addCleanup(store.close)
+        with self.assertRaisesRegex(ValueError, "read-only"):
+            store.upgrade_legacy_keys()
+
+class TestFrontierStore(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_path = tmp_dir.name
+        self.config = MockConfig([])
+        self.config.frontier_backend = "sqlite"
+        self.config.save_file = os.path.join(self.tmp_path, "frontier.sqlite")
+
+    def test_sqlite_store_behaves_like_shelve(self):
+        store = frontier_store.SQLiteFrontierStore(self.config.save_file)
+        self.addCleanup(store.close)
+        # Fingerprints at both ends of the unsigned 64-bit range
+        h1, h2, h3 = (1 << 64) - 1, 0, 5
+
+        self.assertTrue(store.add(h1, "https://www.ics.uci.edu/a", depth=2))
+        self.assertFalse(store.add(h1, "https://www.ics.uci.edu/a", depth=5))
+        store[h2] = ("https://www.cs.uci.edu/b", False)
+        store[h1] = ("https://www.ics.uci.edu/a", True)
+
+        self.assertEqual(len(store), 2)
+        self.assertIn(h1, store)
+        self.assertNotIn(h3, store)
+        self.assertEqual(store[h1], ("https://www.ics.uci.edu/a", True))
+        self.assertEqual(store.depth(h1), 2, "Completing a url keeps its depth")
+        self.assertEqual(sorted(store.values()), [("https://www.cs.uci.edu/b", False), ("https://www.ics.uci.edu/a", True)])
+        with self.assertRaises(KeyError):
+            store[h3]
+
+    def test_sqlite_frontier_commits_once_per_page(self):
+        frontier = Frontier(self.config, restart=True)
+        self.addCleanup(frontier.save.close)
+        frontier.add_url("https://www.ics.uci.edu/parent")
+        frontier.save.sync()
+        parent = frontier.get_tbd_url()
+
+        frontier.add_url("https://www.ics.uci.edu/child")
+        reader = frontier_store.SQLiteFrontierStore(self.config.save_file, readonly=True)
+        self.addCleanup(reader.close)
+        self.assertEqual(len(reader), 1, "Discovered urls are not committed before their page completes")
+
+        frontier.mark_url_complete(parent)
+        self.assertEqual(len(reader), 2)
+        self.assertEqual(reader.depth(url_fingerprint("https://www.ics.uci.edu/child")), 1)
+        self.assertEqual(summary.unique_pages(self.config.save_file), 1)
+
+    def test_migrate_shelve_to_sqlite(self):
+        shelve_path = os.path.join(self.tmp_path, "frontier.shelve")
+        with shelve.open(shelve_path) as db:
+            db[get_urlhash("https://www.ics.uci.edu/a")] = ("https://www.ics.uci.edu/a", True)
+            db[get_urlhash("https://www.ics.uci.edu/b")] = ("https://www.ics.uci.edu/b", False)
+
+        self.assertEqual(frontier_store.migrate_shelve_to_sqlite(shelve_path, self.config.save_file), 2)
+        self.assertEqual(frontier_store.detect_backend(self.config.save_file), frontier_store.SQLITE)
+        self.assertEqual(frontier_store.detect_backend(shelve_path), frontier_store.SHELVE)
+
+        frontier = Frontier(self.config, restart=False)
+        self.addCleanup(frontier.save.close)
+        self.assertEqual(frontier.get_tbd_url(), "https://www.ics.uci.edu/b")
+        self.assertIsNone(frontier.get_tbd_url())
+
+class TestSeenURLFilter(unittest.TestCase):
+    def setUp(self):
+        self.fingerprints = [url_fingerprint(f"https://www.ics.uci.edu/page{i}") for i in range(2000)]
+
+    def test_exact_filter_never_reads_store(self):
+        seen = seen_filter.SeenURLFilter(seen_filter.EXACT)
+        seen.update(self.fingerprints[:1000])
+        store = MagicMock()
+
+        self.assertTrue(seen.is_seen(self.fingerprints[10], store))
+        self.assertFalse(seen.is_seen(self.fingerprints[1500], store))
+        store.__contains__.assert_not_called()
+        self.assertEqual(seen.stats(), {"filter_hits": 2, "disk_fallbacks": 0, "false_positives": 0, "size": 1000})
+
+    def test_bloom_filter_falls_back_to_store_for_possible_repeats(self):
+        seen = seen_filter.SeenURLFilter(seen_filter.BLOOM)
+        seen.update(self.fingerprints[:1000])
+        store = set(self.fingerprints[:1000])
+
+        self.assertTrue(all(seen.is_seen(fingerprint, store) for fingerprint in self.fingerprints[:1000]))
+        self.assertFalse(any(seen.is_seen(fingerprint, store) for fingerprint in self.fingerprints[1000:]))
+
+        stats = seen.stats()
+        self.assertEqual(stats["disk_fallbacks"], 1000 + stats["false_positives"])
+        self.assertEqual(stats["filter_hits"], 1000 - stats["false_positives"])
+
+    def test_scalable_bloom_filter_grows_and_keeps_its_error_rate(self):
+        bloom = seen_filter.ScalableBloomFilter(false_positive_rate=0.01, initial_capacity=100)
+        for fingerprint in self.fingerprints[:1000]:
+            bloom.add(fingerprint)
+
+        self.assertGreater(len(bloom.slices), 1)
+        self.assertTrue(all(fingerprint in bloom for fingerprint in self.fingerprints[:1000]))
+        false_positives = sum(fingerprint in bloom for fingerprint in self.fingerprints[1000:])
+        self.assertLess(false_positives, 30)
+
+    def test_frontier_rebuilds_filter_from_save_file(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        config = MockConfig([])
+        config.save_file = os.path.join(tmp_dir.name, "frontier.shelve")
+
+        frontier = Frontier(config, restart=True)
+        frontier.add_url("https://www.ics.uci.edu/a")
+        frontier.mark_url_complete("https://www.ics.uci.edu/a")
+        frontier.save.close()
+
+        frontier = Frontier(config, restart=False)
+        self.addCleanup(frontier.save.close)
+        self.assertEqual(len(frontier.seen_urls), 1)
+        frontier.add_url("https://www.ics.uci.edu/a")
+        self.assertEqual(len(frontier.to_be_downloaded), 0)
+        self.assertEqual(frontier.seen_urls.stats()["filter_hits"], 1)
+
+class TestHostScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        monotonic_patch = patch("time.monotonic", side_effect=self.clock.monotonic)
+        sleep_patch = patch("time.sleep", side_effect=self.clock.sleep)
+        monotonic_patch.start()
+        self.mock_sleep = sleep_patch.start()
+        self.addCleanup(monotonic_patch.stop)
+        self.addCleanup(sleep_patch.stop)
+
+        self.scheduler = crawler.frontier.HostScheduler(politeness_delay=0.5)
+
+    def test_interleaves_hosts_without_waiting(self):
+        for url in ["https://ics.uci.edu/a", "https://ics.uci.edu/b", "https://cs.uci.edu/a", "https://stat.uci.edu/a"]:
+            self.scheduler.append(url)
+        self.assertEqual(len(self.scheduler), 4)
+
+        hosts = [urlparse(self.scheduler.pop()).netloc for _ in range(3)]
+        self.assertEqual(sorted(hosts), ["cs.uci.edu", "ics.uci.edu", "stat.uci.edu"])
+        self.mock_sleep.assert_not_called()
+
+        # Only the second ics.uci.edu url is left and its host was just fetched
+        self.assertEqual(self.scheduler.pop(), "https://ics.uci.edu/a")
+        self.mock_sleep.assert_called_once_with(0.5)
+
+        with self.assertRaises(IndexError):
+            self.scheduler.pop()
+
+    def test_same_host_requests_are_spaced(self):
+        fetch_times = []
+        for i in range(4):
+            self.scheduler.append(f"https://ics.uci.edu/page{i}")
+        for _ in range(4):
+            self.scheduler.pop()
+            fetch_times.append(self.clock.now)
+
+        gaps = [later - earlier for earlier, later in zip(fetch_times, fetch_times[1:])]
+        self.assertEqual(gaps, [0.5, 0.5, 0.5])
+
+    def test_host_remembers_last_fetch_after_draining(self):
+        self.scheduler.append("https://ics.uci.edu/a")
+        self.scheduler.pop()
+
+        self.clock.now += 0.2
+        self.scheduler.append("https://ics.uci.edu/b")
+        self.scheduler.pop()
+        self.mock_sleep.assert_called_once()
+        self.assertAlmostEqual(self.mock_sleep.call_args.args[0], 0.3)
+
+    def test_pop_ready_does_not_wait(self):
+        self.assertIsNone(self.scheduler.pop_ready())
+        self.assertIsNone(self.scheduler.seconds_until_ready())
+        self.scheduler.append("https://ics.uci.edu/a")
+        self.scheduler.append("https://ics.uci.edu/b")
+        self.assertEqual(self.scheduler.seconds_until_ready(), 0.0)
+        self.assertEqual(self.scheduler.pop_ready(), "https://ics.uci.edu/b")
+
+        self.assertIsNone(self.scheduler.pop_ready())
+        self.assertEqual(self.scheduler.seconds_until_ready(), 0.5)
+        self.clock.now += 0.5
+        self.assertEqual(self.scheduler.pop_ready(), "https://ics.uci.edu/a")
+        self.mock_sleep.assert_not_called()
+
+    def test_defer_parks_a_host(self):
+        for url in ["https://ics.uci.edu/a", "https://ics.uci.edu/b", "https://cs.uci.edu/a"]:
+            self.scheduler.append(url)
+        self.scheduler.defer("ics.uci.edu", self.clock.now + 10)
+        self.assertEqual(self.scheduler.pop_ready(), "https://cs.uci.edu/a")
+        self.assertIsNone(self.scheduler.pop_ready())
+        self.assertEqual(self.scheduler.seconds_until_ready(), 10)
+
+        # An earlier time does not shorten the deferral
+        self.scheduler.defer("ics.uci.edu", self.clock.now + 1)
+        self.assertEqual(self.scheduler.pop(), "https://ics.uci.edu/b")
+        self.mock_sleep.assert_called_once_with(10)
+
+class TestHostHealth(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        monotonic_patch = patch("time.monotonic", side_effect=self.clock.monotonic)
+        monotonic_patch.start()
+        self.addCleanup(monotonic_patch.stop)
+        self.health = host_health.HostHealth(max_retries=3, retry_delay=2, breaker_failures=5, breaker_cooldown=60)
+
+    def test_transient_failures(self):
+        self.assertTrue(host_health.is_transient_failure(0))
+        self.assertTrue(host_health.is_transient_failure(503))
+        self.assertFalse(host_health.is_transient_failure(200))
+        self.assertFalse(host_health.is_transient_failure(404))
+        self.assertFalse(host_health.is_transient_failure(608))
+
+    def test_exponential_backoff_then_give_up(self):
+        url = "https://ics.uci.edu/a"
+        results = [self.health.record_failure("ics.uci.edu", url) for _ in range(4)]
+        self.assertEqual(results, [(True, 2, False), (True, 4, False), (True, 8, False), (False, 0.0, False)])
+        self.assertEqual(self.health.stats()["gave_up"], 1)
+
+        # A success resets the url's attempts
+        self.health.record_success("ics.uci.edu", url)
+        self.assertEqual(self.health.record_failure("ics.uci.edu", url), (True, 2, False))
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        for i in range(4):
+            retry, hold, opened = self.health.record_failure("ics.uci.edu", f"https://ics.uci.edu/{i}")
+            self.assertFalse(opened)
+        self.assertEqual(self.health.record_failure("ics.uci.edu", "https://ics.uci.edu/4"), (True, 60, True))
+        self.assertEqual(self.health.stats()["open_circuits"], 1)
+        self.assertEqual(list(self.health.open_until), ["ics.uci.edu"])
+
+        self.clock.now += 60
+        self.assertEqual(self.health.stats()["open_circuits"], 0)
+        # The probe after the cooldown succeeds and closes the circuit
+        self.health.record_success("ics.uci.edu", "https://ics.uci.edu/4")
+        stats = self.health.stats()
+        self.assertEqual((stats["opened_circuits"], stats["closed_circuits"], stats["open_circuits"]), (1, 1, 0))
+        self.assertFalse(self.health.record_failure("ics.uci.edu", "https://ics.uci.edu/5")[2])
+
+class TestURLPriority(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        monotonic_patch = patch("time.monotonic", side_effect=self.clock.monotonic)
+        sleep_patch = patch("time.sleep", side_effect=self.clock.sleep)
+        monotonic_patch.start()
+        sleep_patch.start()
+        self.addCleanup(monotonic_patch.stop)
+        self.addCleanup(sleep_patch.stop)
+
+    def _scheduler(self, **weights):
+        scorer = url_priority.URLScorer(weights)
+        return crawler.frontier.HostScheduler(politeness_delay=0.0, scorer=scorer)
+
+    def test_scorer_features(self):
+        scorer = url_priority.URLScorer({"depth": 1})
+        self.assertEqual(scorer.score("https://ics.uci.edu/a/b/c?x=1"), 4)
+        self.assertEqual(url_priority.parse_weights("depth=1, inlinks=0.5"), {"depth": 1.0, "inlinks": 0.5})
+        self.assertLess(url_priority.URLScorer({"sitemap": 1}).score("https://ics.uci.edu/a", sitemap_priority=0.9),
+                        url_priority.URLScorer({"sitemap": 1}).score("https://ics.uci.edu/a"))
+        with self.assertRaises(ValueError):
+            url_priority.URLScorer({"pagerank": 1})
+
+    def test_shallow_urls_first(self):
+        scheduler = self._scheduler(depth=1)
+        for url in ["https://ics.uci.edu/a/b/c", "https://ics.uci.edu/a", "https://ics.uci.edu/a/b"]:
+            scheduler.append(url)
+        self.assertEqual([scheduler.pop() for _ in range(3)],
+                         ["https://ics.uci.edu/a", "https://ics.uci.edu/a/b", "https://ics.uci.edu/a/b/c"])
+
+    def test_inlinks_reprioritize_queued_url(self):
+        scheduler = self._scheduler(inlinks=1)
+        for url in ["https://ics.uci.edu/a", "https://ics.uci.edu/b", "https://ics.uci.edu/c"]:
+            scheduler.append(url)
+
+        self.assertTrue(scheduler.add_inlink("https://ics.uci.edu/a"))
+        self.assertFalse(scheduler.add_inlink("https://ics.uci.edu/unknown"))
+        self.assertEqual(len(scheduler), 3)
+
+        # a gained a link, b and c keep their last in, first out order
+        self.assertEqual([scheduler.pop() for _ in range(3)],
+                         ["https://ics.uci.edu/a", "https://ics.uci.edu/c", "https://ics.uci.edu/b"])
+        with self.assertRaises(IndexError):
+            scheduler.pop()
+
+    def test_sitemap_priority(self):
+        scheduler = self._scheduler(sitemap=1)
+        scheduler.append("https://ics.uci.edu/low", sitemap_priority=0.1)
+        scheduler.append("https://ics.uci.edu/high", sitemap_priority=1.0)
+        scheduler.append("https://ics.uci.edu/unlisted")
+        self.assertEqual([scheduler.pop() for _ in range(3)],
+                         ["https://ics.uci.edu/high", "https://ics.uci.edu/unlisted", "https://ics.uci.edu/low"])
+
+    def test_host_diversity(self):
+        scheduler = self._scheduler(depth=1, diversity=10)
+        for i in range(3):
+            scheduler.append(f"https://ics.uci.edu/{i}")
+        scheduler.append("https://cs.uci.edu/deep/er/page")
+
+        # The deeper cs page wins once ics was fetched from
+        hosts = [urlparse(scheduler.pop()).netloc for _ in range(2)]
+        self.assertEqual(hosts, ["ics.uci.edu", "cs.uci.edu"])
+
+    def test_record_sitemap_priorities(self):
+        tree = scraper.ET.fromstring(
+            '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            '<url><loc>https://www.ics.uci.edu/about/</loc><priority>0.8</priority></url>'
+            '<url><loc>https://www.ics.uci.edu/news</loc></url>'
+            '</urlset>')
+        with patch.dict(scraper.sitemap_priorities, clear=True):
+            scraper.record_sitemap_priorities(tree)
+            self.assertEqual(scraper.sitemap_priorities, {"https://www.ics.uci.edu/about": 0.8})
+
+class TestSegmentedQueue(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.directory = os.path.join(tmp_dir.name, "spill")
+
+    def test_fifo_order_across_segments(self):
+        for compress in (False, True):
+            queue = spill_queue.SegmentedQueue(self.directory, segment_size=4, compress=compress)
+            items = [f"https://www.ics.uci.edu/\u00e9t\u00e9/{i}" for i in range(19)]
+            for item in items:
+                queue.append(item)
+
+            self.assertEqual(len(queue), 19)
+            self.assertEqual(queue.stats(), {"resident": 7, "spilled": 12, "segments": 3})
+            self.assertEqual(len(os.listdir(self.directory)), 3)
+
+            self.assertEqual([queue.popleft() for _ in range(19)], items)
+            self.assertEqual(os.listdir(self.directory), [])
+            with self.assertRaises(IndexError):
+                queue.popleft()
+
+    def test_segment_encoding(self):
+        items = ["a", "", "b\tc"]
+        for compress in (False, True):
+            data = spill_queue.encode_segment(items, compress)
+            self.assertEqual(spill_queue.decode_segment(data, compress), items)
+        self.assertEqual(spill_queue.encode_segment(["ab"]), b"\x00\x00\x00\x02ab")
+
+    def test_host_scheduler_bounds_resident_urls(self):
+        spill = spill_queue.SegmentedQueue(self.directory, segment_size=2)
+        scheduler = crawler.frontier.HostScheduler(politeness_delay=0.0, spill=spill, max_resident=3)
+        urls = [f"https://host{i}.uci.edu/page" for i in range(10)]
+        scheduler.append(urls[0], sitemap_priority=0.5)
+        for url in urls[1:]:
+            scheduler.append(url)
+
+        self.assertEqual(len(scheduler), 10)
+        self.assertEqual(scheduler.stats(), {"resident": 6, "spilled": 4})
+        self.assertEqual(len(scheduler.entries), 3)
+
+        popped = [scheduler.pop() for _ in range(10)]
+        self.assertEqual(sorted(popped), sorted(urls))
+        self.assertLessEqual(len(scheduler.entries), 3)
+        self.assertEqual(len(scheduler), 0)
+
+class TestCanonicalize(unittest.TestCase):
+    def test_canonicalize(self):
+        cases = {
+            "HTTP://WWW.ICS.UCI.EDU/": "http://www.ics.uci.edu",
+            "https://ics.uci.edu:443/people/": "https://ics.uci.edu/people",
+            "http://ics.uci.edu:80/people": "http://ics.uci.edu/people",
+            "http://ics.uci.edu:8080/people": "http://ics.uci.edu:8080/people",
+            "https://ics.uci.edu./people": "https://ics.uci.edu/people",
+            "https://www.stat.uci.edu/covid19/index.html": "https://www.stat.uci.edu/covid19",
+            "https://ics.uci.edu//a///b": "https://ics.uci.edu/a/b",
+            "https://ics.uci.edu/a/./b/../c": "https://ics.uci.edu/a/c",
+            "https://ics.uci.edu/../../a": "https://ics.uci.edu/a",
+            "https://ics.uci.edu/%7ekay/%e2%82%ac": "https://ics.uci.edu/~kay/%E2%82%AC",
+            "https://ics.uci.edu/a?b=%2f#frag": "https://ics.uci.edu/a?b=%2F",
+            "mailto:someone@ics.uci.edu": "mailto:someone@ics.uci.edu",
+            "/relative/path/": "/relative/path",
+        }
+        for url, expected in cases.items():
+            self.assertEqual(canonicalize(url), expected, url)
+            self.assertEqual(canonicalize(expected), expected, expected)
+
+    def test_url_fingerprint(self):
+        fingerprint = url_fingerprint("https://www.stat.uci.edu/covid19/index.html")
+        self.assertEqual(fingerprint, url_fingerprint("http://WWW.STAT.UCI.EDU:80/covid19/"))
+        self.assertEqual(fingerprint, url_fingerprint(canonicalize("https://www.stat.uci.edu/covid19/"), canonical=True))
+        self.assertLess(fingerprint, 1 << 64)
+        self.assertEqual(len(fingerprint_key(fingerprint)), 16)
+        self.assertEqual(len(fingerprint_key(0)), 16)
+
+        # Urls of one host share the high bits
+        a, b = url_fingerprint("https://ics.uci.edu/a"), url_fingerprint("https://ics.uci.edu/b")
+        self.assertNotEqual(a, b)
+        self.assertEqual(a >> 48, b >> 48)
+        self.assertNotEqual(a >> 48, url_fingerprint("https://cs.uci.edu/a") >> 48)
+
+    def test_urlhash_uses_canonical_url(self):
+        self.assertEqual(
+            get_urlhash("https://www.stat.uci.edu/covid19/index.html"),
+            get_urlhash("http://WWW.STAT.UCI.EDU:80/covid19/"))
+        self.assertNotEqual(get_urlhash("https://ics.uci.edu/a"), get_urlhash("https://ics.uci.edu/b"))
+
+    def test_canonical_collapse_report(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        save_path = os.path.join(tmp_dir.name, "frontier.shelve")
+
+        # Keys as written by the previous sha256 of the raw url
+        with shelve.open(save_path) as db:
+            for i, url in enumerate([
+                    "https://www.stat.uci.edu/covid19",
+                    "https://www.stat.uci.edu/covid19/index.html",
+                    "http://WWW.STAT.UCI.EDU:80/covid19",
+                    "https://ics.uci.edu/about"]):
+                db[str(i)] = (url, i % 2 == 0)
+
+        self.assertEqual(
+            summary.canonical_collapse_report(save_path),
+            {"entries": 4, "canonical_urls": 2, "collapsed": 2})
+
+    def test_reports_read_every_shard(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        save_path = os.path.join(tmp_dir.name, "frontier.shelve")
+
+        # A multi-process crawl leaves one save file per shard and none at save_path
+        shards = [["https://www.ics.uci.edu/a", "https://vision.ics.uci.edu/b"], ["https://www.ics.uci.edu/a/index.html"]]
+        for shard, urls in enumerate(shards):
+            store = frontier_store.open_frontier_store(utils.shard_path(save_path, shard))
+            for url in urls:
+                store[url_fingerprint(url)] = (url, True)
+            store.close()
+
+        self.assertEqual(summary.unique_pages(save_path), 2)
+        self.assertEqual(
+            summary.canonical_collapse_report(save_path), {"entries": 3, "canonical_urls": 2, "collapsed": 1})
+        self.assertEqual(summary.ics_subdomains(save_path), {"ics.uci.edu": 2, "vision.ics.uci.edu": 1})
+        self.assertIsNone(summary.ics_subdomains(os.path.join(tmp_dir.name, "missing.shelve")))
+
 class TestScraper(unittest.TestCase):
     def test_extract_basic_links(self):
         html_content = '''
@@ -733,6 +1862,302 @@ class TestScraper(unittest.TestCase):
 
         self.assertEqual(links, expected_links)
 
+class TestPageAnalysis(unittest.TestCase):
+    html_content = b'''
+        <html>
+            <head>
+                <title>Informatics 45</title>
+                <meta name="Description" content="Course page">
+                <style>p { color: red; }</style>
+                <script>var x = "<a href='/script'>no</a>";</script>
+            </head>
+            <body>
+                <p>Hello World</p>
+                <a href="/page1#top">Page 1</a>
+                <noscript><a href="/page2">Page 2</a> enable javascript</noscript>
+                <a name="anchor-without-href">Bookmark</a>
+            </body>
+        </html>
+        '''
+
+    def test_analyze_page(self):
+        page = page_analysis.analyze_page(self.html_content)
+
+        # Same text as parsing the page and removing the non-text markup
+        soup = BeautifulSoup(self.html_content, 'html.parser')
+        for markup in soup.find_all(["style", "script", "meta", "noscript", "iframe"]):
+            markup.decompose()
+        self.assertEqual(page.text, soup.get_text(separator=" ", strip=True))
+
+        # Same anchors as a separate parse of the page
+        soup = BeautifulSoup(self.html_content, 'html.parser')
+        self.assertEqual(page.hrefs, [anchor.get('href') for anchor in soup.find_all('a', href=True)])
+
+        self.assertEqual(page.title, "Informatics 45")
+        self.assertEqual(page.meta, {"description": "Course page"})
+
+    def test_stream_engine_matches_soup_engine(self):
+        pages = [
+            self.html_content,
+            b"<p>Unclosed <a href='http://ics.uci.edu/page1'>link<iframe>frame text",
+            "<p>caf\u00e9 &amp; cr\u00e8me</p><a href>empty</a><br/><!-- comment -->".encode("latin-1"),
+            "",
+        ]
+        for content in pages:
+            soup_page = page_analysis.soup_analyze_page(content)
+            stream_page = page_analysis.stream_analyze_page(content)
+            self.assertEqual(stream_page.text, soup_page.text)
+            self.assertEqual(stream_page.hrefs, soup_page.hrefs)
+            self.assertEqual(stream_page.title, soup_page.title)
+            self.assertEqual(stream_page.meta, soup_page.meta)
+
+    def test_configure_engine(self):
+        self.addCleanup(page_analysis.configure_engine)
+        page_analysis.configure_engine("stream")
+        with patch("page_analysis.BeautifulSoup") as mock_soup:
+            page = page_analysis.analyze_page(self.html_content)
+        mock_soup.assert_not_called()
+        self.assertEqual(page.hrefs, ["/page1#top", "/page2"])
+
+        with self.assertRaises(ValueError):
+            page_analysis.configure_engine("lxml")
+
+    def test_extract_next_links_reuses_analysis(self):
+        resp = MockResponse("http://ics.uci.edu", 200, self.html_content)
+        page = page_analysis.analyze_page(self.html_content)
+
+        with patch("scraper.analyze_page") as mock_analyze:
+            links = scraper.extract_next_links("http://ics.uci.edu", resp, page)
+
+        mock_analyze.assert_not_called()
+        self.assertEqual(links, ["http://ics.uci.edu/page1", "http://ics.uci.edu/page2"])
+        self.assertEqual(links, scraper.extract_next_links("http://ics.uci.edu", resp))
+
+class TestURLValidator(unittest.TestCase):
+    urls = [
+        "http://ics.uci.edu/page1",
+        "https://www.ics.uci.edu/~thornton/inf45",
+        "https://vision.ics.uci.edu/papers",
+        "https://xics.uci.edu/page1",
+        "https://ics.uci.edu.evil.com/page1",
+        "https://ics.uci.edu:8080/page1",
+        "http://www.physics.uci.edu",
+        "https://www.cs.ucla.edu/history/",
+        "ftp://ics.uci.edu/page1",
+        "https://ics.uci.edu/page1?id=2",
+        "https://ics.uci.edu/a/b/c/d/e/f/g/h/i",
+        "https://ics.uci.edu/events/aaaaaaaaaaaaaaaaaaaaaaaaa",
+        "https://archive.ics.uci.edu/dataset/53/iris",
+        "https://ics.uci.edu/calendar/2024",
+        "https://gitlab.ics.uci.edu/group/project/-/commit/abc",
+        "https://ics.uci.edu/files/brochure.PDF",
+        "https://ics.uci.edu/files/slides.pptx",
+        "https://ics.uci.edu/files/notes.txt",
+        "/relative/path",
+        "",
+    ]
+
+    @patch("robots.can_fetch", return_value=True)
+    def test_validator_rules(self, mock_can_fetch):
+        validator = url_validator.URLValidator()
+        expected = [
+            True, True, True, False, False, False, False, False, False, False,
+            False, False, False, False, False, False, False, True, False, False,
+        ]
+        self.assertEqual([validator(url) for url in self.urls], expected)
+
+    @patch("robots.can_fetch", return_value=True)
+    def test_validator_memoizes_by_url(self, mock_can_fetch):
+        validator = url_validator.URLValidator()
+        for _ in range(3):
+            self.assertTrue(validator("https://www.stat.uci.edu/people"))
+        self.assertEqual(mock_can_fetch.call_count, 1)
+
+        stats = validator.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["size"]), (2, 1, 1))
+        self.assertAlmostEqual(stats["hit_rate"], 2 / 3)
+
+        validator.clear()
+        self.assertEqual(validator.stats()["size"], 0)
+
+    @patch("robots.can_fetch", return_value=False)
+    def test_validator_respects_robots(self, mock_can_fetch):
+        self.assertFalse(url_validator.URLValidator()("https://ics.uci.edu/people"))
+
+class TestContentSniffer(unittest.TestCase):
+    def test_magic_bytes_override_header(self):
+        sniff = content_sniffer.sniff_content_kind
+        self.assertEqual(sniff("text/html", b"%PDF-1.7\n%..."), content_sniffer.PDF)
+        self.assertEqual(sniff("text/html; charset=utf-8", b"PK\x03\x04\x14\x00"), content_sniffer.ZIP)
+        self.assertEqual(sniff("", b"\x89PNG\r\n\x1a\n\x00\x00"), content_sniffer.IMAGE)
+        self.assertEqual(sniff("", b"RIFF\x00\x00\x00\x00WEBPVP8 "), content_sniffer.IMAGE)
+        self.assertEqual(sniff("text/plain", b"\x1f\x8b\x08\x00"), content_sniffer.BINARY)
+
+    def test_data_bodies_are_not_text(self):
+        sniff = content_sniffer.sniff_content_kind
+        self.assertEqual(sniff("application/json", b'{"words": "a b c"}'), content_sniffer.DATA)
+        self.assertEqual(sniff("text/css", b"body { color: red }"), content_sniffer.DATA)
+        self.assertEqual(sniff("application/atom+xml", b"<feed>"), content_sniffer.DATA)
+
+    def test_only_html_reaches_the_parser(self):
+        def response(content_type, content):
+            raw_response = types.SimpleNamespace(
+                url="https://www.ics.uci.edu/", headers={"Content-Type": content_type}, content=content)
+            return Response({"url": "https://www.ics.uci.edu/", "status": 200, "response": pickle.dumps(raw_response)})
+
+        with patch("scraper.analyze_page", wraps=scraper.analyze_page) as analyze_page:
+            parsed = scraper.parse_response(
+                "https://www.ics.uci.edu/", response("application/json", b'{"href": "<a href=\'/x\'>x</a>"}'))
+            self.assertEqual((parsed.links, parsed.tokens), ([], None))
+            analyze_page.assert_not_called()
+
+            # Plain text is tokenized without the parser and has no links
+            parsed = scraper.parse_response("https://www.ics.uci.edu/", response("text/plain", b"plain words <a href='/x'>"))
+            self.assertEqual(parsed.links, [])
+            self.assertIn("plain", parsed.tokens)
+            analyze_page.assert_not_called()
+
+            scraper.parse_response("https://www.ics.uci.edu/", response("text/html", b"<html><body>words</body></html>"))
+            analyze_page.assert_called_once()
+
+    def test_short_magic_numbers_need_a_generic_header(self):
+        sniff = content_sniffer.sniff_content_kind
+        self.assertEqual(sniff("text/html", b"MZ Lab research group"), content_sniffer.HTML)
+        self.assertEqual(sniff("text/plain", b"BZh... notes"), content_sniffer.TEXT)
+        self.assertEqual(sniff("", b"MZ\x90\x00\x03\x00"), content_sniffer.BINARY)
+        self.assertEqual(sniff("application/octet-stream", b"BZh91AY&SY"), content_sniffer.BINARY)
+
+    def test_content_type_header(self):
+        sniff = content_sniffer.sniff_content_kind
+        self.assertEqual(sniff("Text/HTML; charset=utf-8", b"hello"), content_sniffer.HTML)
+        self.assertEqual(sniff("application/pdf", b""), content_sniffer.PDF)
+        self.assertEqual(sniff("application/zip", b""), content_sniffer.ZIP)
+        self.assertEqual(sniff("image/svg+xml", b"<svg>"), content_sniffer.IMAGE)
+        self.assertEqual(sniff("text/plain", b"word list"), content_sniffer.TEXT)
+        self.assertEqual(sniff("video/mp4", b"\x00\x00\x00\x18ftypmp42"), content_sniffer.BINARY)
+
+    def test_sniff_without_header(self):
+        sniff = content_sniffer.sniff_content_kind
+        self.assertEqual(sniff("", b"\xef\xbb\xbf\n  <!DOCTYPE html><html>"), content_sniffer.HTML)
+        self.assertEqual(sniff("application/octet-stream", b"<html><body>"), content_sniffer.HTML)
+        self.assertEqual(sniff("", b"Plain words only"), content_sniffer.TEXT)
+        self.assertEqual(sniff("", b"\x00\x01\x02\x03binary"), content_sniffer.BINARY)
+
+    def test_scraper_skips_non_html_without_parsing(self):
+        resp = MockResponse("https://ics.uci.edu/files/brochure", 200, b"%PDF-1.4\n" + b"\x00" * 4096)
+        resp.raw_response.headers = {"Content-Type": "text/html"}
+
+        with patch("scraper.analyze_page") as mock_analyze:
+            self.assertEqual(scraper.scraper(resp.url, resp), [])
+        mock_analyze.assert_not_called()
+
+        self.assertTrue(scraper.is_pdf_resp(resp.url, resp))
+        self.assertFalse(scraper.is_zip_resp(resp.url, resp))
+        self.assertFalse(scraper.is_html_resp(resp.url, resp))
+
+        html_resp = MockResponse("https://ics.uci.edu", 200, "<html><body>Hi</body></html>")
+        self.assertTrue(scraper.is_html_resp(html_resp.url, html_resp))
+        self.assertFalse(scraper.is_pdf_resp(html_resp.url, html_resp))
+
+class TestResponse(unittest.TestCase):
+    def setUp(self):
+        raw_response = types.SimpleNamespace(
+            url="https://www.ics.uci.edu/", headers={"Content-Type": "text/html"},
+            content=b"<html><body><a href='/about'>About</a></body></html>")
+        self.pickled = pickle.dumps(raw_response)
+
+    def test_raw_response_is_decoded_once_on_access(self):
+        with patch("utils.response.pickle.loads", wraps=pickle.loads) as loads:
+            resp = Response({"url": "https://www.ics.uci.edu/", "status": 200, "response": self.pickled})
+            self.assertEqual(resp.status, 200)
+            loads.assert_not_called()
+
+            self.assertEqual(resp.raw_response.headers["Content-Type"], "text/html")
+            self.assertEqual(resp.raw_response.url, "https://www.ics.uci.edu/")
+            loads.assert_called_once()
+
+    def test_error_response_is_never_decoded(self):
+        with patch("utils.response.pickle.loads", wraps=pickle.loads) as loads:
+            resp = Response({"url": "https://www.ics.uci.edu/", "status": 404, "response": self.pickled})
+            self.assertEqual(scraper.scraper("https://www.ics.uci.edu/", resp), [])
+            loads.assert_not_called()
+
+    def test_truncated_raw_response_is_a_bad_response(self):
+        for status in (200, 301):
+            resp = Response({"url": "https://www.ics.uci.edu/", "status": status, "response": self.pickled[:-10]})
+            self.assertIsNone(resp.raw_response)
+            self.assertEqual(scraper.scraper("https://www.ics.uci.edu/", resp), [])
+
+    @patch("utils.download.download")
+    def test_worker_completes_url_with_truncated_raw_response(self, mock_download):
+        url = "https://www.ics.uci.edu/"
+        mock_download.return_value = Response({"url": url, "status": 200, "response": self.pickled[:-10]})
+        mock_frontier = MagicMock(spec=Frontier)
+        mock_frontier.get_tbd_url.side_effect = [url, None]
+        mock_frontier.retry_later.return_value = False
+
+        Worker(worker_id=1, config=MockConfig([]), frontier=mock_frontier).run()
+
+        mock_frontier.add_urls.assert_called_once_with([], parent=url)
+        mock_frontier.mark_url_complete.assert_called_once_with(url)
+
+    def test_response_without_body(self):
+        resp = Response({"url": "https://www.ics.uci.edu/", "status": 608, "error": "blocked"})
+        self.assertIsNone(resp.raw_response)
+        self.assertEqual(resp.error, "blocked")
+
+class TestIngestionBudget(unittest.TestCase):
+    def test_budget_limits_and_counters(self):
+        budget = ingestion_budget.IngestionBudget(max_bytes=10, skip_bytes=100, max_tokens=3, max_links=2)
+
+        self.assertEqual(budget.limit_content("u", b"0123456789abc"), b"0123456789")
+        self.assertEqual(budget.limit_content("u", b"short"), b"short")
+        self.assertEqual(budget.limit_tokens("u", ["a", "b", "c", "d"]), ["a", "b", "c"])
+        self.assertEqual(budget.limit_links("u", ["l1", "l2", "l3"]), ["l1", "l2"])
+        self.assertEqual(budget.limit_links("u", ["l1", "l2", "l3"]), ["l1", "l2"])
+        self.assertTrue(budget.exceeds_skip_size("u", 101))
+        self.assertFalse(budget.exceeds_skip_size("u", 100))
+
+        self.assertEqual(budget.stats(), {
+            ingestion_budget.TRUNCATED_BYTES: 1,
+            ingestion_budget.TRUNCATED_TOKENS: 1,
+            ingestion_budget.TRUNCATED_LINKS: 2,
+            ingestion_budget.SKIPPED_SIZE: 1,
+        })
+
+    def test_truncated_content_is_a_view(self):
+        content = b"<html><body><p>caf\xc3\xa9 text</p></body></html>" + b" " * 100
+        budget = ingestion_budget.IngestionBudget(max_bytes=content.index(b"</body>"))
+        limited = budget.limit_content("u", content)
+        self.assertIsInstance(limited, memoryview)
+        self.assertIs(limited.obj, content)
+
+        for engine in page_analysis.ANALYSIS_ENGINES.values():
+            self.assertEqual(engine(limited).text, "caf\u00e9 text")
+
+    def test_zero_disables_limits(self):
+        budget = ingestion_budget.IngestionBudget(max_bytes=0, skip_bytes=0, max_tokens=0, max_links=0)
+        self.assertEqual(budget.limit_content("u", b"x" * 1000), b"x" * 1000)
+        self.assertFalse(budget.exceeds_skip_size("u", 10 ** 9))
+        self.assertEqual(budget.stats(), {})
+
+    def test_scraper_applies_budget(self):
+        budget = ingestion_budget.IngestionBudget(max_bytes=80, skip_bytes=200, max_tokens=0, max_links=1)
+        html_content = b"<html><body><a href='/page1'>1</a><a href='/page2'>2</a></body></html>"
+
+        with patch("scraper.ingestion_budget", budget):
+            resp = MockResponse("http://ics.uci.edu", 200, html_content + b"<!--" + b"x" * 50)
+            self.assertEqual(scraper.extract_next_links("http://ics.uci.edu", resp), ["http://ics.uci.edu/page1"])
+
+            large_resp = MockResponse("http://ics.uci.edu/dump", 200, html_content * 10)
+            with patch("scraper.analyze_page") as mock_analyze:
+                self.assertEqual(scraper.scraper(large_resp.url, large_resp), [])
+            mock_analyze.assert_not_called()
+
+        self.assertEqual(budget.stats()[ingestion_budget.TRUNCATED_BYTES], 1)
+        self.assertEqual(budget.stats()[ingestion_budget.TRUNCATED_LINKS], 1)
+        self.assertEqual(budget.stats()[ingestion_budget.SKIPPED_SIZE], 1)
+
 class TestSimHash(unittest.TestCase): 
 
     def test_compute_hash_value(self):
@@ -779,10 +2204,190 @@ class TestSimHash(unittest.TestCase):
         self.assertTrue(dist_2 < simhash.THRESHOLD)
         self.assertTrue(dist_3 > simhash.THRESHOLD)
 
+    def test_compute_simhash_engines_match_reference(self):
+        def reference_simhash(tokens, hashbits=128):
+            token_freq_table = Counter(tokens)
+            token_hashed = simhash.convertToHash(token_freq_table)
+            summed_weights = [0] * hashbits
+            for index in range(len(summed_weights)):
+                for tok, hsh in token_hashed.items():
+                    weight = token_freq_table[tok]
+                    if bin(hsh)[2:].zfill(128)[index] == '0':
+                        summed_weights[index] -= weight
+                    else:
+                        summed_weights[index] += weight
+            return sum((v > 0) << (hashbits - 1 - i) for i, v in enumerate(summed_weights))
+
+        tokens = simhash.tokenize("""The code example from yesterday's lecture, along with a sneak preview
+        of some of the things we'll do tomorrow, is now available. The code example is now available.""")
+
+        for hashbits in (128, 64, 13):
+            expected = reference_simhash(tokens, hashbits)
+            self.assertEqual(simhash.compute_simhash(tokens, hashbits), expected)
+            with patch("simhash.np", None):
+                self.assertEqual(simhash.compute_simhash(tokens, hashbits), expected)
+
+        self.assertEqual(simhash.compute_simhash([]), 0)
+
+    def test_token_hashers(self):
+        self.assertEqual(simhash.md5_token_hash("zot"), int(simhash.compute_hash_value("zot"), 16))
+        self.assertNotEqual(simhash.blake2b_token_hash("zot"), simhash.md5_token_hash("zot"))
+        self.assertLess(simhash.blake2b_token_hash("zot"), 1 << simhash.HASH_WIDTH)
+
+        with self.assertRaises(ValueError):
+            simhash.configure_token_hasher("sha1")
+
+    def test_token_hash_cache(self):
+        self.addCleanup(simhash.configure_token_hasher)
+        simhash.configure_token_hasher("md5", cache_size=2)
+
+        simhash.compute_simhash(["uci", "ics", "uci"])
+        simhash.compute_simhash(["uci", "ics"])
+        stats = simhash.token_hash_cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["size"], stats["capacity"]), (2, 2, 2, 2))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+        # Least recently used token is evicted once the cache is full
+        simhash.compute_simhash(["cs"])
+        simhash.compute_simhash(["uci"])
+        self.assertEqual(simhash.token_hash_cache_stats()["misses"], 4)
+
+class TestSimHashIndex(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(121)
+        self.stored = [rng.getrandbits(128) for _ in range(300)]
+
+        # Plant near duplicates of a few stored fingerprints
+        self.queries = [rng.getrandbits(128) for _ in range(50)]
+        for base in self.stored[:20]:
+            flipped = base
+            for bit in rng.sample(range(128), rng.randint(0, 4)):
+                flipped ^= 1 << bit
+            self.queries.append(flipped)
+
+        self.index = simhash_index.SimHashIndex()
+        for hsh in self.stored:
+            self.index.add(hsh)
+
+    def test_query_within_matches_linear_scan(self):
+        for k in range(simhash.THRESHOLD + 2):
+            for query in self.queries:
+                expected = sorted(
+                    (simhash.calculate_hash_distance(query, hsh), hsh) for hsh in self.stored
+                    if simhash.calculate_hash_distance(query, hsh) <= k)
+                self.assertEqual(self.index.query_within(query, k), expected)
+
+    def test_nearest_matches_linear_scan(self):
+        for query in self.queries:
+            expected = min((simhash.calculate_hash_distance(query, hsh), hsh) for hsh in self.stored)
+            self.assertEqual(self.index.nearest(query), expected)
+
+        self.assertIsNone(simhash_index.SimHashIndex().nearest(0))
+
+    def test_add_is_idempotent(self):
+        self.index.add(self.stored[0])
+        self.assertEqual(len(self.index), len(self.stored))
+        self.assertIn(self.stored[0], self.index)
+
+def admitted_concurrently(index, hashes) -> list[int]:
+    """
+    Calls index.add_unless_within for every hash in its own thread, with each query
+    slowed down so the threads overlap, and returns the hashes that were added
+    """
+    query_within = simhash_index.SimHashIndex.query_within
+    def slow_query_within(self, hsh, k):
+        matches = query_within(self, hsh, k)
+        time.sleep(0.05)
+        return matches
+
+    admitted = []
+    def admit(hsh):
+        if not index.add_unless_within(hsh, simhash.THRESHOLD - 1):
+            admitted.append(hsh)
+
+    with patch.object(simhash_index.SimHashIndex, "query_within", slow_query_within):
+        threads = [threading.Thread(target=admit, args=(hsh,)) for hsh in hashes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return admitted
+
+class TestSimHashStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.save_path = os.path.join(self.tmp_dir.name, "simhash.store")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_only_one_of_concurrent_near_duplicates_is_added(self):
+        near_duplicates = [0x0123456789abcdef0123456789abcdef ^ (1 << bit) for bit in range(4)]
+
+        index = simhash_index.SimHashIndex()
+        self.assertEqual(len(admitted_concurrently(index, near_duplicates)), 1)
+        self.assertEqual(len(index), 1)
+
+        store = simhash_store.SimHashStore(self.save_path)
+        self.addCleanup(store.close)
+        self.assertEqual(len(admitted_concurrently(store, near_duplicates)), 1)
+        self.assertEqual(store.size_bytes, simhash_store.RECORD_SIZE)
+
+    def test_store_survives_reopen(self):
+        hashes = [0, 1, (1 << 128) - 1, 0x0123456789abcdef0123456789abcdef]
+
+        store = simhash_store.SimHashStore(self.save_path)
+        for hsh in hashes:
+            store.add(hsh)
+        store.add(hashes[0])
+        store.close()
+
+        self.assertEqual(os.path.getsize(self.save_path), len(hashes) * simhash_store.RECORD_SIZE)
+
+        reopened = simhash_store.SimHashStore(self.save_path)
+        self.assertEqual(set(reopened), set(hashes))
+        self.assertEqual(reopened.size_bytes, len(hashes) * simhash_store.RECORD_SIZE)
+        self.assertEqual(reopened.query_within(hashes[3] ^ 0b11, simhash.THRESHOLD - 1), [(2, hashes[3])])
+        reopened.close()
+
+    def test_store_restart_and_partial_record(self):
+        store = simhash_store.SimHashStore(self.save_path)
+        store.add(42)
+        store.close()
+
+        # Simulate a crash in the middle of writing a record
+        with open(self.save_path, "ab") as f:
+            f.write(b"\x01\x02\x03")
+
+        reopened = simhash_store.SimHashStore(self.save_path)
+        self.assertEqual(list(reopened), [42])
+        self.assertEqual(reopened.size_bytes, simhash_store.RECORD_SIZE)
+        reopened.close()
+
+        restarted = simhash_store.SimHashStore(self.save_path, restart=True)
+        self.assertEqual(len(restarted), 0)
+        restarted.close()
+
 class TestSummaryStatistics(unittest.TestCase): 
     def test_unique_pages(self):
         self.assertTrue(False)
 
+    def test_merge_summaries(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            shards = [os.path.join(tmp_dir, f"summary.shelve.shard{shard}") for shard in range(2)]
+            summary.update_page_lengths(shards[0], "https://www.ics.uci.edu/a", ["crawler", "index"])
+            summary.update_token_frequency(shards[0], ["crawler", "index"])
+            summary.update_page_lengths(shards[1], "https://www.informatics.uci.edu/b", ["crawler"])
+            summary.update_token_frequency(shards[1], ["crawler"])
+
+            merged = os.path.join(tmp_dir, "summary.shelve")
+            summary.update_page_lengths(merged, "https://www.stat.uci.edu/stale", ["stale"])
+            summary.merge_summaries(shards, merged)
+            with shelve.open(merged) as db:
+                self.assertEqual(db["page_lengths"], {
+                    "https://www.ics.uci.edu/a": 2, "https://www.informatics.uci.edu/b": 1})
+                self.assertEqual(db["token_frequencies"], Counter({"crawler": 2, "index": 1}))
+
     def test_longest_page(self):
 
         html_content_1 = '''
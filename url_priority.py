@@ -0,0 +1,75 @@
+import math
+from urllib.parse import urlparse
+
+# Priority a sitemap gives urls that do not set <priority>
+DEFAULT_SITEMAP_PRIORITY = 0.5
+
+def path_depth(url: str, inlinks: int, sitemap_priority: float | None) -> float:
+    """
+    Number of path segments, a query string counts as one more
+    """
+    parsed = urlparse(url)
+    depth = sum(1 for segment in parsed.path.split("/") if segment)
+    return depth + (1 if parsed.query else 0)
+
+def sitemap_rank(url: str, inlinks: int, sitemap_priority: float | None) -> float:
+    """
+    0 for urls a sitemap lists with priority 1.0, 1 for priority 0.0
+    """
+    if sitemap_priority is None:
+        sitemap_priority = DEFAULT_SITEMAP_PRIORITY
+    return 1.0 - min(max(sitemap_priority, 0.0), 1.0)
+
+def inlink_rank(url: str, inlinks: int, sitemap_priority: float | None) -> float:
+    """
+    Lower for urls linked from more crawled pages
+    """
+    return -math.log2(1 + inlinks)
+
+# Features of a single url, each maps (url, inlinks, sitemap priority) to a score
+URL_FEATURES = {
+    "depth": path_depth,
+    "sitemap": sitemap_rank,
+    "inlinks": inlink_rank,
+}
+
+# Weight of the host diversity term, which depends on the host rather than the url
+DIVERSITY = "diversity"
+
+DEFAULT_WEIGHTS = {"depth": 1.0, "diversity": 1.0, "sitemap": 1.0, "inlinks": 1.0}
+
+def parse_weights(spec: str) -> dict[str, float]:
+    """
+    Parses "depth=1,inlinks=0.5,..." into a weight per feature
+    """
+    weights = dict()
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = float(weight)
+    return weights
+
+class URLScorer(object):
+    """
+    Weighted sum of url features, lower scores are crawled first.
+
+    features maps a name to a function of (url, inlinks, sitemap priority), so new
+    signals can be plugged in alongside the default ones. The diversity weight scales
+    a per-host penalty that grows with the number of pages already fetched from the host.
+    """
+
+    def __init__(self, weights: dict[str, float] = None, features: dict = None):
+        self.weights = dict(DEFAULT_WEIGHTS if weights is None else weights)
+        self.features = dict(URL_FEATURES if features is None else features)
+        unknown = set(self.weights) - set(self.features) - {DIVERSITY}
+        if unknown:
+            raise ValueError(f"Unknown url priority features {sorted(unknown)}")
+
+    def score(self, url: str, inlinks: int = 0, sitemap_priority: float | None = None) -> float:
+        return sum(
+            weight * self.features[name](url, inlinks, sitemap_priority)
+            for name, weight in self.weights.items() if name != DIVERSITY and weight)
+
+    def host_score(self, fetched: int) -> float:
+        return self.weights.get(DIVERSITY, 0.0) * math.log2(1 + fetched)
@@ -0,0 +1,128 @@
+import re
+from functools import lru_cache
+from urllib.parse import urlparse
+
+import robots
+
+ALLOWED_DOMAINS = frozenset({"ics.uci.edu", "cs.uci.edu", "informatics.uci.edu", "stat.uci.edu"})
+ALLOWED_SCHEMES = frozenset({"http", "https"})
+
+# Avoid infinite trap pattern
+MAX_DEPTH = 8
+
+# If segment is alphanumeric and beyond a cut off length
+# it is highly likely to be an ID and should be ignored.
+MAX_SEGMENT_LENGTH = 20
+
+# Number of validated urls remembered by the validator
+VALIDATION_CACHE_SIZE = 200000
+
+NON_HTML_EXTENSIONS = re.compile(
+    r".*\.(css|js|bmp|gif|jpe?g|ico"
+    + r"|png|tiff?|mid|mp2|mp3|mp4"
+    + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
+    + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
+    + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
+    + r"|epub|dll|cnf|tgz|sha1"
+    + r"|thmx|mso|arff|rtf|jar|csv"
+    + r"|rm|smil|wmv|swf|wma|zip|rar|gz"
+    + r"|img|java|war|sql|mpg|ff|sh|ppsx|py|apk|svg|conf|cpp|fig|cls|ipynb|bam|odp|odc|tsv|nb|bib|z|rpm|ma)$")
+
+class URLValidator(object):
+    """
+    Decides whether a url should be crawled. The rules are built once and every
+    decision is memoized by url, so links seen again on other pages cost one lookup.
+    """
+
+    def __init__(self, allowed_domains=ALLOWED_DOMAINS, cache_size: int = VALIDATION_CACHE_SIZE):
+        self.allowed_domains = frozenset(allowed_domains)
+        self._cached_validate = lru_cache(maxsize=cache_size)(self.validate)
+
+    def __call__(self, url: str) -> bool:
+        return self._cached_validate(url)
+
+    def is_allowed_domain(self, domain: str) -> bool:
+        """
+        True if domain is an allowed domain or a subdomain of one. Every suffix
+        following a "." is looked up in the allowed set instead of scanning it.
+        """
+        if domain in self.allowed_domains:
+            return True
+        dot = domain.find(".")
+        while dot != -1:
+            if domain[dot + 1:] in self.allowed_domains:
+                return True
+            dot = domain.find(".", dot + 1)
+        return False
+
+    def validate(self, url: str) -> bool:
+        """
+        Uncached validation of url
+        """
+        try:
+            parsed_url = urlparse(url)
+
+            # Check if url scheme is valid
+            if parsed_url.scheme not in ALLOWED_SCHEMES:
+                return False
+
+            # check host is in URL is in allowed domains
+            domain = parsed_url.netloc
+            if domain and not self.is_allowed_domain(domain):
+                return False
+
+            # Avoid query strings (potential duplicate content)
+            if parsed_url.query:
+                return False
+
+            # Avoid infinite trap pattern
+            path_segments = [segment for segment in parsed_url.path.split('/') if segment]
+            if len(path_segments) > MAX_DEPTH:
+                return False
+
+            # Check for unique identifier segment in path
+            for segment in path_segments:
+                if segment.isalnum() and len(segment) > MAX_SEGMENT_LENGTH:
+                    return False
+
+            # Filter out "archieve.ics.uci.edu" domain.
+            # This is the machine learning archieve.
+            if "archive.ics.uci.edu" in parsed_url.netloc:
+                return False
+
+            # Filter out calendar pages which are potentially low-information pages.
+            path = parsed_url.path.lower()
+            if "calendar" in path or "calendar" in parsed_url.netloc.lower():
+                return False
+
+            # Filter out commit pages (gitlab/github) which are potentially low-information pages.
+            if "commit" in path:
+                return False
+
+            # Check robot.txt rules to follow politeness
+            # Do not fetch from paths we are not allowed
+            if not robots.can_fetch(url):
+                return False
+
+            return not NON_HTML_EXTENSIONS.match(path)
+
+        except TypeError:
+            print ("TypeError for ", url)
+            return False
+
+    def stats(self) -> dict[str, float]:
+        """
+        Returns hits, misses, size, capacity and hit rate of the validation cache
+        """
+        info = self._cached_validate.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "capacity": info.maxsize,
+            "hit_rate": info.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self) -> None:
+        self._cached_validate.cache_clear()
@@ -3,6 +3,8 @@ import logging
 from hashlib import sha256
 from urllib.parse import urlparse
 
+from utils.canonicalize import canonicalize
+
 def get_logger(name, filename=None):
     logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
@@ -23,13 +25,17 @@ def get_logger(name, filename=None):
 
 
 def get_urlhash(url):
-    parsed = urlparse(url)
+    parsed = urlparse(canonicalize(url))
     # everything other than scheme.
     return sha256(
         f"{parsed.netloc}/{parsed.path}/{parsed.params}/"
         f"{parsed.query}/{parsed.fragment}".encode("utf-8")).hexdigest()
 
 def normalize(url):
-    if url.endswith("/"):
-        return url.rstrip("/")
-    return url
+    return canonicalize(url)
+
+def shard_path(path: str, shard: int) -> str:
+    """
+    Where shard of a multi-process crawl keeps its copy of the save file at path
+    """
+    return f"{path}.shard{shard}"
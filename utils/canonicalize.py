@@ -0,0 +1,84 @@
+import re
+import string
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Last path segments that serve the same page as their directory
+DIRECTORY_INDEXES = {"index.html", "index.htm", "index.php"}
+
+# Characters that never need to be percent-encoded (RFC 3986 section 2.3)
+UNRESERVED = frozenset(string.ascii_letters + string.digits + "-._~")
+
+PERCENT_ESCAPE = re.compile(r"%([0-9A-Fa-f]{2})")
+
+def _normalize_percent_encoding(component: str) -> str:
+    """
+    Decodes escaped unreserved characters and upper cases the remaining escapes
+    """
+    def fix(match):
+        char = chr(int(match.group(1), 16))
+        if char in UNRESERVED:
+            return char
+        return "%" + match.group(1).upper()
+    return PERCENT_ESCAPE.sub(fix, component)
+
+def _normalize_path(path: str) -> str:
+    """
+    Collapses "//" runs, resolves "." and ".." segments, drops a trailing
+    directory index page and the trailing slash
+    """
+    segments = []
+    for segment in path.split("/"):
+        if segment in ("", "."):
+            continue
+        if segment == "..":
+            if segments:
+                segments.pop()
+            continue
+        segments.append(segment)
+
+    if segments and segments[-1].lower() in DIRECTORY_INDEXES:
+        segments.pop()
+
+    return "/" + "/".join(segments) if segments else ""
+
+def _normalize_netloc(parsed, scheme: str) -> str:
+    host = (parsed.hostname or "").rstrip(".")
+    if ":" in host:  # IPv6 literal
+        host = f"[{host}]"
+
+    port = parsed.port
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+
+    if parsed.username is not None:
+        userinfo = parsed.username
+        if parsed.password is not None:
+            userinfo += f":{parsed.password}"
+        host = f"{userinfo}@{host}"
+
+    return host
+
+def canonicalize(url: str) -> str:
+    """
+    Returns the canonical form of an http(s) url so that urls of the same page compare equal.
+        - lower case scheme and host, no trailing dot on the host, no default port
+        - no "//" runs, dot segments, trailing index.html / index.htm / index.php or trailing slash in the path
+        - unreserved characters unescaped and upper case hex digits in the remaining escapes
+        - no fragment
+    Other urls only have their trailing slash removed.
+    """
+    try:
+        parsed = urlsplit(url)
+        scheme = parsed.scheme.lower()
+        if scheme not in DEFAULT_PORTS or not parsed.netloc:
+            return url.rstrip("/") if url.endswith("/") else url
+
+        netloc = _normalize_netloc(parsed, scheme)
+        path = _normalize_path(_normalize_percent_encoding(parsed.path))
+        query = _normalize_percent_encoding(parsed.query)
+    except ValueError:  # invalid port or IPv6 literal
+        return url.rstrip("/") if url.endswith("/") else url
+
+    return urlunsplit((scheme, netloc, path, query, ""))
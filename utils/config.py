@@ -8,12 +8,38 @@ class Config(object):
         assert self.user_agent != "DEFAULT AGENT", "Set useragent in config.ini"
         assert re.match(r"^[a-zA-Z0-9_ ,]+$", self.user_agent), "User agent should not have any special characters outside '_', ',' and 'space'"
         self.threads_count = int(config["LOCAL PROPERTIES"]["THREADCOUNT"])
+        self.process_count = int(config["LOCAL PROPERTIES"]["PROCESSCOUNT"])
+        self.engine = config["LOCAL PROPERTIES"]["ENGINE"].strip()
+        self.async_fetches = int(config["LOCAL PROPERTIES"]["ASYNCFETCHES"])
+        self.parse_processes = int(config["LOCAL PROPERTIES"]["PARSEPROCESSES"])
+        self.pipeline_queue_size = int(config["LOCAL PROPERTIES"]["PIPELINEQUEUE"])
         self.save_file = config["LOCAL PROPERTIES"]["SAVE"]
+        self.frontier_backend = config["LOCAL PROPERTIES"]["FRONTIERBACKEND"].strip()
+        self.max_resident_urls = int(config["LOCAL PROPERTIES"]["MAXRESIDENTURLS"])
+        self.spill_compress = config.getboolean("LOCAL PROPERTIES", "SPILLCOMPRESS")
+        self.simhash_save_file = config["LOCAL PROPERTIES"]["SIMHASHSAVE"]
 
         self.host = config["CONNECTION"]["HOST"]
         self.port = int(config["CONNECTION"]["PORT"])
+        self.connect_timeout = float(config["CONNECTION"]["CONNECTTIMEOUT"])
+        self.read_timeout = float(config["CONNECTION"]["READTIMEOUT"])
 
         self.seed_urls = config["CRAWLER"]["SEEDURL"].split(",")
         self.time_delay = float(config["CRAWLER"]["POLITENESS"])
+        self.frontier_order = config["CRAWLER"]["FRONTIERORDER"].strip()
+        self.priority_weights = config["CRAWLER"]["PRIORITYWEIGHTS"].strip()
+        self.token_hasher = config["CRAWLER"]["TOKENHASH"].strip()
+        self.token_hash_cache_size = int(config["CRAWLER"]["TOKENHASHCACHE"])
+        self.page_parser = config["CRAWLER"]["PARSER"].strip()
+        self.max_page_bytes = int(config["CRAWLER"]["MAXPAGEBYTES"])
+        self.skip_page_bytes = int(config["CRAWLER"]["SKIPPAGEBYTES"])
+        self.max_page_tokens = int(config["CRAWLER"]["MAXPAGETOKENS"])
+        self.max_page_links = int(config["CRAWLER"]["MAXPAGELINKS"])
+        self.seen_filter = config["CRAWLER"]["SEENFILTER"].strip()
+        self.seen_filter_error = float(config["CRAWLER"]["SEENFILTERERROR"])
+        self.max_retries = int(config["CRAWLER"]["MAXRETRIES"])
+        self.retry_delay = float(config["CRAWLER"]["RETRYDELAY"])
+        self.breaker_failures = int(config["CRAWLER"]["BREAKERFAILURES"])
+        self.breaker_cooldown = float(config["CRAWLER"]["BREAKERCOOLDOWN"])
 
         self.cache_server = None
\ No newline at end of file
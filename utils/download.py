@@ -1,14 +1,102 @@
+import asyncio
 import requests
 import cbor
 import time
+import weakref
+from collections import deque
+from threading import Lock
+from urllib.parse import urlencode
+from requests.adapters import HTTPAdapter
 
 from utils.response import Response
 
+# Seconds to wait for the cache server to accept a connection, and then for each read of its response
+CONNECT_TIMEOUT = 10.0
+READ_TIMEOUT = 60.0
+
+# Latencies of the most recent requests kept for percentiles
+LATENCY_SAMPLES = 10000
+
+# Status of a download that got no response from the cache server
+NO_RESPONSE_STATUS = 0
+
+class DownloadClient(object):
+    """
+    Keep-alive session to the cache server shared by every worker thread. Its pool
+    holds up to pool_size connections, so each worker reuses one instead of opening a
+    connection per url, and a worker waits for a free connection rather than opening
+    an extra one. Records the latency of every request.
+    """
+
+    def __init__(self, pool_size: int = 1, connect_timeout: float = CONNECT_TIMEOUT, read_timeout: float = READ_TIMEOUT):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True))
+        self.latencies: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.requests = 0
+        self.failures = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self._lock = Lock()
+
+    def record(self, seconds: float, failed: bool = False) -> None:
+        with self._lock:
+            self.latencies.append(seconds)
+            self.requests += 1
+            self.failures += failed
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def get(self, url: str, params) -> requests.Response:
+        start = time.perf_counter()
+        try:
+            resp = self.session.get(url, params=params, timeout=self.timeout)
+        except requests.RequestException:
+            self.record(time.perf_counter() - start, failed=True)
+            raise
+        self.record(time.perf_counter() - start)
+        return resp
+
+    def stats(self) -> dict:
+        """
+        Request count, failures and latency in seconds: mean, median, 95th percentile and max
+        """
+        with self._lock:
+            latencies = sorted(self.latencies)
+            stats = {"requests": self.requests, "failures": self.failures}
+            if latencies:
+                stats.update({
+                    "mean_seconds": round(self.total_seconds / self.requests, 4),
+                    "p50_seconds": round(latencies[len(latencies) // 2], 4),
+                    "p95_seconds": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 4),
+                    "max_seconds": round(self.max_seconds, 4),
+                })
+            return stats
+
+    def close(self) -> None:
+        self.session.close()
+
+client = DownloadClient()
+
+def configure_client(pool_size: int, connect_timeout: float = CONNECT_TIMEOUT, read_timeout: float = READ_TIMEOUT) -> None:
+    global client
+    client.close()
+    client = DownloadClient(pool_size, connect_timeout, read_timeout)
+
 def download(url, config, logger=None):
     host, port = config.cache_server
-    resp = requests.get(
-        f"http://{host}:{port}/",
-        params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
+    try:
+        resp = client.get(
+            f"http://{host}:{port}/",
+            params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
+    except requests.RequestException as e:
+        # Timeouts and refused connections fail this url instead of the worker
+        logger.error(f"Spacetime request error {e!r} with url {url}.")
+        return Response({
+            "error": f"Spacetime request error {e!r} with url {url}.",
+            "status": NO_RESPONSE_STATUS,
+            "url": url})
     try:
         if resp and resp.content:
             return Response(cbor.loads(resp.content))
@@ -19,3 +107,150 @@ def download(url, config, logger=None):
         "error": f"Spacetime Response error {resp} with url {url}.",
         "status": resp.status_code,
         "url": url})
+
+async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+    chunks = []
+    while True:
+        size = int((await reader.readline()).split(b";", 1)[0], 16)
+        if not size:
+            # Skip trailers up to the blank line ending the body
+            while (await reader.readline()).strip():
+                pass
+            return b"".join(chunks)
+        chunks.append(await reader.readexactly(size))
+        await reader.readline()
+
+async def _exchange(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                    host: str, port: int, target: str) -> tuple[int, bytes, bool]:
+    """
+    Minimal HTTP/1.1 GET over an open connection, returns the status code, the body
+    and whether the connection may be reused
+    """
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}:{port}\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    headers = dict()
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    keep_alive = headers.get("connection", "").lower() != "close"
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        body = await _read_chunked(reader)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    else:
+        # The body ends when the server closes the connection
+        body = await reader.read()
+        keep_alive = False
+    return status, body, keep_alive
+
+class AsyncConnectionPool(object):
+    """
+    Keep-alive connections of one event loop to the cache server, what DownloadClient's
+    session is for the threaded engines. A request reuses an idle connection to its
+    host:port when there is one, and a connection whose response was read in full is
+    kept for the next request, up to max_idle per host:port.
+
+    Streams belong to the loop that opened them, so every event loop has its own pool.
+    """
+
+    def __init__(self):
+        self.idle: dict[tuple[str, int], list] = dict()  # (host, port) -> [(reader, writer), ...]
+        self.opened = 0
+        self.reused = 0
+
+    async def get(self, host: str, port: int, target: str, max_idle: int) -> tuple[int, bytes]:
+        idle = self.idle.setdefault((host, port), list())
+        while True:
+            reused = bool(idle)
+            if reused:
+                reader, writer = idle.pop()
+            else:
+                reader, writer = await asyncio.open_connection(host, port)
+                self.opened += 1
+            try:
+                status, body, keep_alive = await _exchange(reader, writer, host, port, target)
+            except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    # The server may have closed the idle connection, the request is sent on another one
+                    continue
+                raise
+            except BaseException:
+                # Cancelled by the timeout, the rest of the response would still be on the connection
+                writer.close()
+                raise
+            self.reused += reused
+            if keep_alive and len(idle) < max_idle:
+                idle.append((reader, writer))
+            else:
+                writer.close()
+            return status, body
+
+    def stats(self) -> dict:
+        return {"opened": self.opened, "reused": self.reused,
+                "idle": sum(len(connections) for connections in self.idle.values())}
+
+    def close(self) -> None:
+        for connections in self.idle.values():
+            for reader, writer in connections:
+                writer.close()
+        self.idle.clear()
+
+_async_pools = weakref.WeakKeyDictionary()  # event loop -> AsyncConnectionPool
+
+def async_pool() -> AsyncConnectionPool:
+    """
+    Connection pool of the running event loop
+    """
+    loop = asyncio.get_running_loop()
+    pool = _async_pools.get(loop)
+    if pool is None:
+        pool = _async_pools[loop] = AsyncConnectionPool()
+    return pool
+
+def close_async_pool() -> None:
+    """
+    Closes the idle connections of the running event loop, called before the loop ends
+    """
+    pool = _async_pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        pool.close()
+
+async def download_async(url, config, logger=None):
+    """
+    download for the asyncio crawler, the cache server request does not block the event loop
+    and reuses a keep-alive connection of the loop's AsyncConnectionPool
+    """
+    host, port = config.cache_server
+    start = time.perf_counter()
+    try:
+        # The whole exchange may take as long as connecting and reading together
+        status, content = await asyncio.wait_for(
+            async_pool().get(
+                host, port, "/?" + urlencode([("q", f"{url}"), ("u", f"{config.user_agent}")]), config.async_fetches),
+            sum(client.timeout))
+    except (OSError, asyncio.TimeoutError, ValueError, IndexError, asyncio.IncompleteReadError) as e:
+        client.record(time.perf_counter() - start, failed=True)
+        logger.error(f"Spacetime request error {e!r} with url {url}.")
+        return Response({
+            "error": f"Spacetime request error {e!r} with url {url}.",
+            "status": NO_RESPONSE_STATUS,
+            "url": url})
+    client.record(time.perf_counter() - start)
+    try:
+        # Like requests, an error status counts as a failed response
+        if status < 400 and content:
+            return Response(cbor.loads(content))
+    except (EOFError, ValueError) as e:
+        pass
+    logger.error(f"Spacetime Response error <{status}> with url {url}.")
+    return Response({
+        "error": f"Spacetime Response error <{status}> with url {url}.",
+        "status": status,
+        "url": url})
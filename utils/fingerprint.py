@@ -0,0 +1,94 @@
+import sys
+import time
+from functools import lru_cache
+from hashlib import blake2b
+from urllib.parse import urlparse
+
+from utils.canonicalize import canonicalize
+
+# A fingerprint is HOST_BITS of a hash of the host followed by PATH_BITS of a hash of
+# the rest of the url, so sorted fingerprints cluster the urls of a host together.
+HOST_BITS = 16
+PATH_BITS = 48
+FINGERPRINT_BITS = HOST_BITS + PATH_BITS
+
+@lru_cache(maxsize=4096)
+def _host_prefix(host: str) -> int:
+    # A crawl sees few hosts, so each is hashed once
+    return int.from_bytes(blake2b(host.encode("utf-8"), digest_size=HOST_BITS // 8).digest(), "big") << PATH_BITS
+
+def url_fingerprint(url: str, canonical: bool = False) -> int:
+    """
+    Host-prefixed 64-bit fingerprint of the canonical form of url, ignoring the scheme.
+    Pass canonical=True for a url that was already canonicalized to skip doing it again.
+    """
+    parsed = urlparse(url if canonical else canonicalize(url))
+    rest = blake2b(
+        f"{parsed.path}/{parsed.params}/{parsed.query}/{parsed.fragment}".encode("utf-8"),
+        digest_size=PATH_BITS // 8).digest()
+    return _host_prefix(parsed.netloc) | int.from_bytes(rest, "big")
+
+def fingerprint_host(fingerprint: int) -> int:
+    return fingerprint >> PATH_BITS
+
+def fingerprint_key(fingerprint: int) -> str:
+    """
+    Fixed width hex form of a fingerprint, for stores that need string keys
+    """
+    return f"{fingerprint:016x}"
+
+def fingerprint_bytes(fingerprint: int) -> bytes:
+    return fingerprint.to_bytes(FINGERPRINT_BITS // 8, "big")
+
+def benchmark_keys(urls: list[str], repeat: int = 3) -> dict[str, dict[str, float]]:
+    """
+    Compares sha256 hex url hashes with fingerprints as shelve keys: bytes held by the
+    keys of urls, the best time to key every canonical url and the best time to look
+    every key up in a shelve holding them all
+    """
+    import shelve
+    import tempfile
+    from utils import get_urlhash
+
+    key_functions = {
+        "sha256 hex": get_urlhash,
+        "fingerprint hex": lambda url: fingerprint_key(url_fingerprint(url, canonical=True)),
+    }
+    canonical_urls = [canonicalize(url) for url in urls]
+    results = dict()
+    for name, key_function in key_functions.items():
+        keys = [key_function(url) for url in canonical_urls]
+        key_seconds = lookup_seconds = None
+        with tempfile.TemporaryDirectory() as tmp_dir, shelve.open(f"{tmp_dir}/keys") as db:
+            for key in keys:
+                db[key] = True
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for url in canonical_urls:
+                    key_function(url)
+                elapsed = time.perf_counter() - start
+                key_seconds = elapsed if key_seconds is None else min(key_seconds, elapsed)
+
+                start = time.perf_counter()
+                for key in keys:
+                    key in db
+                elapsed = time.perf_counter() - start
+                lookup_seconds = elapsed if lookup_seconds is None else min(lookup_seconds, elapsed)
+        results[name] = {
+            "key_bytes": sum(sys.getsizeof(key) for key in set(keys)),
+            "key_seconds": key_seconds,
+            "lookup_seconds": lookup_seconds,
+        }
+    # Fingerprints held as ints, as the seen url filter and in-flight bookkeeping do
+    results["fingerprint int"] = {
+        "key_bytes": sum(sys.getsizeof(url_fingerprint(url, canonical=True)) for url in set(canonical_urls)),
+    }
+    return results
+
+if __name__ == "__main__":
+    # Usage: python -m utils.fingerprint urls.txt
+    with open(sys.argv[1], encoding="utf-8") as f:
+        urls = [line.strip() for line in f if line.strip()]
+    for name, result in benchmark_keys(urls).items():
+        print(f"{name}: " + ", ".join(f"{metric} {value:.4f}" if isinstance(value, float) else f"{metric} {value}"
+                                      for metric, value in result.items()))
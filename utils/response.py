@@ -1,14 +1,31 @@
 import pickle
 
 class Response(object):
+    """
+    Response of the cache server. The url, status and error come straight from the
+    cbor body, the embedded raw response is only unpickled the first time
+    raw_response is read, so responses rejected by their status never pay for it.
+    """
     def __init__(self, resp_dict):
         self.url = resp_dict["url"]
         self.status = resp_dict["status"]
         self.error = resp_dict["error"] if "error" in resp_dict else None
-        try:
-            self.raw_response = (
-                pickle.loads(resp_dict["response"])
-                if "response" in resp_dict else
-                None)
-        except TypeError:
-            self.raw_response = None
+        self._pickled_response = resp_dict.get("response")
+        self._raw_response = None
+
+    @property
+    def raw_response(self):
+        if self._pickled_response is not None:
+            try:
+                self._raw_response = pickle.loads(self._pickled_response)
+            except (TypeError, EOFError, ValueError, pickle.UnpicklingError):
+                # A truncated or corrupt body counts as a response without a page
+                self._raw_response = None
+            # Only one copy of the page is kept
+            self._pickled_response = None
+        return self._raw_response
+
+    @raw_response.setter
+    def raw_response(self, raw_response):
+        self._pickled_response = None
+        self._raw_response = raw_response